@@ -18,7 +18,9 @@ along with this program.  If not, see https://www.gnu.org/licenses/.
 """
 from abc import ABC, abstractmethod  # Creating abstract class
 import tkinter as tk  # GUI creation tools
+from tkinter import ttk  # Progress bar widget
 import os  # Working with paths
+import collections  # Keeping the selection states in the order of their use
 
 
 class Uniformly_Spaced_Points_Selector_GUI(tk.Frame, ABC):
@@ -49,6 +51,16 @@ class Uniformly_Spaced_Points_Selector_GUI(tk.Frame, ABC):
         # Defining additional object parameters/properties used primarily in validating user actions/input ("global" variables)
         self.path_to_excel_file = None
         self.is_chosen_file_valid = False
+        self.dataset = None
+        self.number_of_loaded_points = None
+        # Points with invalid coordinates are left out once the user agreed to it
+        self.skip_invalid_points = False
+        # Selection states of the recently selected files, so that selecting a different count reuses the previous work
+        self.selection_states = collections.OrderedDict()
+        # Background selection - its thread, the queue of its messages and the event cancelling it
+        self.selection_thread = None
+        self.selection_queue = None
+        self.cancel_event = None
 
         # Defining button font and size
         button_font = ("Segoe UI", 18, "bold")
@@ -65,7 +77,7 @@ class Uniformly_Spaced_Points_Selector_GUI(tk.Frame, ABC):
 
         self.load_button = tk.Button(
             self,
-            text="Load Excel File",
+            text="Load Input File",
             font=button_font,
             width=button_width,
             command=self.load_button_event,
@@ -78,6 +90,15 @@ class Uniformly_Spaced_Points_Selector_GUI(tk.Frame, ABC):
             command=self.execute_button_event,
         )
 
+        self.cancel_button = tk.Button(
+            self,
+            text="Cancel",
+            font=button_font,
+            width=button_width,
+            command=self.cancel_button_event,
+            state="disabled",
+        )
+
         self.quit_button = tk.Button(
             self,
             text="Exit Application",
@@ -88,28 +109,52 @@ class Uniformly_Spaced_Points_Selector_GUI(tk.Frame, ABC):
 
         # Defining input field font and size
         input_menu_font = ("Segoe UI", 11, "bold")
-        input_menu_width = 2
+        input_menu_width = 5
+
+        # Creating selection mode menu for user
+        # Displayed names of the selection modes and the largest count allowed by each of them
+        # (the uniform spacing gets slow and starts to cluster points for larger counts)
+        self.selection_mode_names = {
+            "Uniform spacing": "uniform_spacing",
+            "Furthest point": "furthest_point",
+        }
+        self.maximal_acceptable_values = {
+            "uniform_spacing": 15,
+            "furthest_point": 2000,
+        }
+        self.mode_menu_control_variable = tk.StringVar(self, value="Uniform spacing")
+        self.mode_menu = tk.OptionMenu(
+            self, self.mode_menu_control_variable, *self.selection_mode_names
+        )
+        self.mode_menu.config(font=input_menu_font)
+        # Set the dropdown menu's font (so that when the menu is opened, all options have the same font)
+        self.nametowidget(self.mode_menu.menuname).config(font=input_menu_font)
+        # The allowed range of the count depends on the mode
+        self.mode_menu_control_variable.trace_add(
+            "write", lambda *_: self.update_count_range()
+        )
+        # Add mode menu label
+        self.mode_menu_label = tk.Label(self, text="Mode", font=input_menu_font)
 
-        # Creating input menu for user
+        # Creating count input field for user
         # Define StringVar control variable with initial value
-        self.input_menu_control_variable = tk.StringVar(self, value="2")
-        # Define possible options for the menu
-        self.maximal_acceptable_value = 15
-        input_menu_options = [
-            str(number) for number in range(2, self.maximal_acceptable_value + 1)
-        ]
-        # Create menu widget and configure it
-        self.input_menu = tk.OptionMenu(
-            self, self.input_menu_control_variable, *input_menu_options
+        self.count_control_variable = tk.StringVar(self, value="2")
+        # The range is updated for the number of points of the loaded file
+        self.count_spinbox = tk.Spinbox(
+            self,
+            from_=2,
+            to=self.maximal_acceptable_values["uniform_spacing"],
+            textvariable=self.count_control_variable,
+            font=input_menu_font,
+            width=input_menu_width,
         )
-        self.input_menu.config(font=input_menu_font, width=input_menu_width)
-        # Change the font of all options, including the not selected ones (so that when the menu is opened, all of them have the same font)
-        input_menu_options_handle = self.nametowidget(self.input_menu.menuname)
-        # Set the dropdown menu's font
-        input_menu_options_handle.config(font=input_menu_font)
 
-        # Add input menu label
-        self.input_menu_label = tk.Label(self, text="Count", font=input_menu_font)
+        # Add count input label
+        self.count_label = tk.Label(self, text="Count", font=input_menu_font)
+
+        # Creating progress bar and the description of the running step
+        self.progress_bar = ttk.Progressbar(self, orient="horizontal", maximum=100)
+        self.progress_label = tk.Label(self, text="", font=("Segoe UI", 10))
 
         # Set initial state of execute button to disabled
         self.set_execution_button_state("disabled")
@@ -121,8 +166,12 @@ class Uniformly_Spaced_Points_Selector_GUI(tk.Frame, ABC):
         # Placing and positioning the widgets on the window using grid
         self.info_button.grid(row=0, columnspan=2, padx=x_padding, pady=(y_padding, 0))
         self.load_button.grid(row=1, columnspan=2, padx=x_padding, pady=(y_padding, 0))
+        self.mode_menu_label.grid(row=2, column=0, padx=x_padding - 2, pady=(y_padding, 0))
+        self.mode_menu.grid(
+            row=2, column=1, sticky="EW", padx=(0, x_padding), pady=(y_padding, 0)
+        )
         self.execute_button.grid(
-            row=2,
+            row=3,
             column=1,
             columnspan=1,
             rowspan=2,
@@ -130,17 +179,27 @@ class Uniformly_Spaced_Points_Selector_GUI(tk.Frame, ABC):
             padx=(0, x_padding),
             pady=(y_padding, 0),
         )
-        self.input_menu_label.grid(row=2, column=0, sticky="S", padx=x_padding - 2)
-        self.input_menu.grid(
-            row=3, column=0, columnspan=1, sticky="NSEW", padx=x_padding - 2
+        self.count_label.grid(row=3, column=0, sticky="S", padx=x_padding - 2)
+        self.count_spinbox.grid(
+            row=4, column=0, columnspan=1, sticky="NSEW", padx=x_padding - 2
+        )
+        self.progress_bar.grid(
+            row=5, columnspan=2, sticky="EW", padx=x_padding, pady=(y_padding, 0)
         )
-        self.quit_button.grid(row=4, columnspan=2, padx=x_padding, pady=y_padding)
+        self.progress_label.grid(row=6, columnspan=2, padx=x_padding)
+        self.cancel_button.grid(row=7, columnspan=2, padx=x_padding)
+        self.quit_button.grid(row=8, columnspan=2, padx=x_padding, pady=y_padding)
 
     # Modify the state of execute and input fields
     @abstractmethod
     def set_execution_button_state(self, state):
         pass
 
+    # Limit the count to the chosen mode and the loaded file
+    @abstractmethod
+    def update_count_range(self):
+        pass
+
     # Reset the help window position
     @abstractmethod
     def reset_info_window_position(self):
@@ -165,3 +224,8 @@ class Uniformly_Spaced_Points_Selector_GUI(tk.Frame, ABC):
     @abstractmethod
     def execute_button_event(self):
         pass
+
+    # Define cancel button actions
+    @abstractmethod
+    def cancel_button_event(self):
+        pass
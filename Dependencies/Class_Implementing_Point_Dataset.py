@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Class holding the points loaded from a file, cached per file until the file changes.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import os  # Reading the file modification time and size
+import threading  # Guarding the cache when used from more threads
+import collections  # Keeping the datasets in the order of their use
+import numpy  # Storing the names and coordinates as arrays
+
+from Dependencies.Subroutine_Read_The_Input_File import Read_The_Input_File
+
+
+class Point_Dataset:
+    # Only the listed attributes are stored (no per-instance dictionary)
+    __slots__ = (
+        "path_to_file",
+        "file_signature",
+        "number_of_rows",
+        "number_of_columns",
+        "are_coordinates_valid",
+        "names",
+        "latitudes",
+        "longitudes",
+        "validation_report",
+    )
+
+    def __init__(
+        self,
+        path_to_file,
+        file_signature,
+        number_of_rows,
+        number_of_columns,
+        are_coordinates_valid,
+        names,
+        latitudes,
+        longitudes,
+        validation_report=None,
+    ):
+        self.path_to_file = path_to_file
+        # Modification time and size of the file at the moment it was loaded
+        self.file_signature = file_signature
+        self.number_of_rows = number_of_rows
+        self.number_of_columns = number_of_columns
+        self.are_coordinates_valid = are_coordinates_valid
+        # Names are kept as they were (text, numbers or empty), coordinates as float64 arrays
+        self.names = numpy.array(names, dtype=object)
+        # Coordinates that are missing or not numbers are NaN (see the validation report)
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        # Points of every coordinate issue found (None if the coordinate columns were not found)
+        self.validation_report = validation_report
+
+    # Number of points (rows without the header)
+    @property
+    def number_of_points(self):
+        return len(self.names)
+
+    # Indexes of the points with valid coordinates
+    @property
+    def valid_point_indexes(self):
+        if self.validation_report is None:
+            return numpy.zeros(0, dtype=numpy.int64)
+        return numpy.setdiff1d(
+            numpy.arange(self.number_of_points),
+            self.validation_report["invalid_indexes"],
+            assume_unique=True,
+        )
+
+    # Check whether the file was not modified since it was loaded
+    def is_up_to_date(self):
+        try:
+            return Get_File_Signature(self.path_to_file) == self.file_signature
+        except OSError:
+            return False
+
+
+# Recently loaded datasets, one per file path, the least recently used one first
+# (only a few are kept, so that processes loading many files do not keep all of them)
+MAXIMAL_NUMBER_OF_LOADED_DATASETS = 4
+loaded_datasets = collections.OrderedDict()
+loaded_datasets_lock = threading.Lock()
+
+
+def Get_File_Signature(path_to_file):
+    # Modification time (in ns) and size of the file identify its version
+    file_status = os.stat(path_to_file)
+    return (file_status.st_mtime_ns, file_status.st_size)
+
+
+def Load_The_Point_Dataset(path_to_file, use_cache=True):
+    # Return the cached dataset of the file, or parse the file if it is new or was modified
+    # (without the cache the file is always parsed and its dataset is not kept)
+    path_to_file = os.path.abspath(path_to_file)
+    if use_cache:
+        with loaded_datasets_lock:
+            dataset = loaded_datasets.get(path_to_file)
+            if dataset is not None:
+                loaded_datasets.move_to_end(path_to_file)
+        if dataset is not None and dataset.is_up_to_date():
+            return dataset
+    # Take the signature before parsing, so that a change during parsing is noticed next time
+    file_signature = Get_File_Signature(path_to_file)
+    loaded_input_file = Read_The_Input_File(path_to_file)
+    dataset = Point_Dataset(
+        path_to_file,
+        file_signature,
+        loaded_input_file["number_of_rows"],
+        loaded_input_file["number_of_columns"],
+        loaded_input_file["are_coordinates_valid"],
+        loaded_input_file["names"],
+        loaded_input_file["latitudes"],
+        loaded_input_file["longitudes"],
+        loaded_input_file["validation_report"],
+    )
+    if use_cache:
+        with loaded_datasets_lock:
+            loaded_datasets[path_to_file] = dataset
+            loaded_datasets.move_to_end(path_to_file)
+            while len(loaded_datasets) > MAXIMAL_NUMBER_OF_LOADED_DATASETS:
+                loaded_datasets.popitem(last=False)
+    return dataset
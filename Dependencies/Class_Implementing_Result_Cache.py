@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Class implementing a thread-safe cache of the most recently used selection results.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import threading  # Guarding the cache when used from more threads
+import collections  # Keeping the results in the order of their use
+
+
+class Result_Cache:
+    # Only the listed attributes are stored (no per-instance dictionary)
+    __slots__ = ("maximal_number_of_results", "results", "lock", "hits", "misses")
+
+    def __init__(self, maximal_number_of_results):
+        self.maximal_number_of_results = maximal_number_of_results
+        # Results by their keys, the least recently used one first
+        self.results = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Return the result of the key (None if it is not cached) and mark it as recently used
+    def get(self, key):
+        with self.lock:
+            result = self.results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.results.move_to_end(key)
+            return result
+
+    # Store the result of the key, the least recently used results make room for it
+    def put(self, key, result):
+        if self.maximal_number_of_results <= 0:
+            return
+        with self.lock:
+            self.results[key] = result
+            self.results.move_to_end(key)
+            while len(self.results) > self.maximal_number_of_results:
+                self.results.popitem(last=False)
+
+    # Number of cached results with the numbers of hits and misses
+    def describe(self):
+        with self.lock:
+            return {
+                "size": len(self.results),
+                "maximal_size": self.maximal_number_of_results,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Class implementing the optional metrics (stage timers, counters, peak memory) of a selection.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import time  # Wall and CPU clocks
+import json  # Writing the metrics file
+import contextlib  # Stages measured as context managers
+import contextvars  # Metrics of the selection running in the current thread
+import tracemalloc  # Peak memory of the stages
+
+# The metrics are collected only while a selection started them (opt-in). The counting
+# functions are called from deep within the calculations, so the collecting metrics are
+# looked up in a context variable - each thread (e.g. the background selection of the GUI)
+# sees only its own ones and without them every call returns immediately.
+# Stages may be nested (the seed pair is a part of the selection), the time and memory of
+# an inner stage are included in its outer stage as well. The CPU time is the time of the
+# whole process (worker processes of a pool are not included).
+
+# Names of the counters
+COUNTER_NAMES = (
+    "distance_evaluations",
+    "candidate_rows_scored",
+    "cells_written",
+    "bytes_saved",
+)
+
+collecting_metrics = contextvars.ContextVar("collecting_metrics", default=None)
+
+
+class Selection_Metrics:
+    # Only the listed attributes are stored (no per-instance dictionary)
+    __slots__ = (
+        "stages",
+        "counters",
+        "open_stages",
+        "is_tracing_memory",
+        "has_started_tracing",
+        "peak_memory_bytes",
+    )
+
+    def __init__(self, is_tracing_memory=False):
+        # Wall and CPU seconds (and peak memory) of each stage, in the order they started
+        self.stages = {}
+        self.counters = dict.fromkeys(COUNTER_NAMES, 0)
+        # Names of the stages being measured, the innermost one last
+        self.open_stages = []
+        self.is_tracing_memory = is_tracing_memory
+        # The tracing is only stopped at the end if it was not running before
+        self.has_started_tracing = False
+        self.peak_memory_bytes = None
+
+    # Add the amount to the counter
+    def count(self, counter_name, amount=1):
+        self.counters[counter_name] = self.counters.get(counter_name, 0) + amount
+
+    # Fold the peak memory since the last check into all open stages and start a new period
+    def update_peak_memory(self):
+        if not self.is_tracing_memory:
+            return
+        peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+        self.peak_memory_bytes = max(self.peak_memory_bytes or 0, peak_memory_bytes)
+        for stage_name in self.open_stages:
+            stage = self.stages[stage_name]
+            stage["peak_memory_bytes"] = max(
+                stage["peak_memory_bytes"] or 0, peak_memory_bytes
+            )
+        tracemalloc.reset_peak()
+
+    # Measure the time (and memory) spent within the block, repeated stages are summed up
+    @contextlib.contextmanager
+    def stage(self, stage_name):
+        self.update_peak_memory()
+        stage = self.stages.setdefault(
+            stage_name,
+            {"wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_memory_bytes": None},
+        )
+        self.open_stages.append(stage_name)
+        wall_start_time = time.perf_counter()
+        cpu_start_time = time.process_time()
+        try:
+            yield
+        finally:
+            stage["wall_seconds"] += time.perf_counter() - wall_start_time
+            stage["cpu_seconds"] += time.process_time() - cpu_start_time
+            self.update_peak_memory()
+            self.open_stages.remove(stage_name)
+
+    # Start the memory tracing (if requested) and collect the metrics in the current context
+    def start(self):
+        if self.is_tracing_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.has_started_tracing = True
+            tracemalloc.reset_peak()
+        return collecting_metrics.set(self)
+
+    # Stop collecting the metrics (given the token returned by start)
+    def stop(self, context_token):
+        collecting_metrics.reset(context_token)
+        self.update_peak_memory()
+        if self.has_started_tracing:
+            tracemalloc.stop()
+            self.has_started_tracing = False
+
+    # Plain dictionary of the metrics (to be returned or stored as JSON)
+    def as_dictionary(self):
+        return {
+            "stages": {
+                stage_name: dict(stage) for stage_name, stage in self.stages.items()
+            },
+            "counters": dict(self.counters),
+            "peak_memory_bytes": self.peak_memory_bytes,
+        }
+
+
+def Count_The_Event(counter_name, amount=1):
+    # Add the amount to the counter of the collecting metrics (if there are any)
+    metrics = collecting_metrics.get()
+    if metrics is not None:
+        metrics.count(counter_name, amount)
+
+
+@contextlib.contextmanager
+def Measure_The_Stage(stage_name):
+    # Measure the block as a stage of the collecting metrics (if there are any)
+    metrics = collecting_metrics.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.stage(stage_name):
+        yield
+
+
+def Write_The_Metrics_File(path_to_metrics_file, metrics_dictionary):
+    # Store the metrics as JSON
+    with open(path_to_metrics_file, "w", encoding="utf-8") as metrics_file:
+        json.dump(metrics_dictionary, metrics_file, indent=2)
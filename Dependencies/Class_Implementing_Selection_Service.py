@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""
+Class implementing the local HTTP/JSON selection service with its worker pool and result cache.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import os  # Temporary files of the uploaded inputs
+import json  # Requests and responses
+import time  # Measuring the latency of the requests
+import hashlib  # Keys of identical requests
+import tempfile  # Storing the uploaded inputs for their readers
+import threading  # Guarding the counters of the service
+import collections  # Latencies of the recent requests
+import http.server  # Serving the requests (each one on its own thread)
+import urllib.parse  # Reading the paths and query parameters
+import concurrent.futures  # Pool of worker processes
+import multiprocessing  # Starting the workers apart from the server
+import numpy  # Coordinate arrays and latency percentiles
+
+from Dependencies.Class_Implementing_Result_Cache import Result_Cache
+from Dependencies.Class_Implementing_Service_Busy import Service_Busy
+from Dependencies.Subroutine_Calculate_Distances import DISTANCE_MODELS
+from Dependencies.Subroutine_Extend_The_Selection import SELECTION_MODES
+from Dependencies.Subroutine_Find_The_Furthest_Pair import FURTHEST_PAIR_METHODS
+from Dependencies.Subroutine_Find_The_Input_File_Type import (
+    INPUT_FILE_EXTENSIONS,
+    Find_The_Input_File_Type,
+)
+from Dependencies.Subroutine_Optimize_The_Route import DEFAULT_ROUTE_TIME_BUDGET
+from Dependencies.Subroutine_Read_The_Input_File import Read_The_Input_File
+from Dependencies.Subroutine_Select_The_Points import Select_The_Point_Indexes
+from Dependencies.Subroutine_Validate_Coordinate_Values import (
+    Describe_The_Validation_Report,
+    Validate_Coordinate_Columns,
+)
+
+# POST /select takes either a JSON object with the "latitudes" and "longitudes" arrays and
+# the options, or an uploaded input file as the whole body (its format and the options are
+# then given as query parameters). GET /health describes the state of the service.
+# The selections run in a pool of worker processes, the request threads only wait for them.
+# At most the given number of requests waits for a free worker, further ones are rejected
+# (503) instead of piling up. Results are cached by a hash of the coordinates and options -
+# an identical request is answered from the cache, or joins the running one.
+
+# Number of cached results, of requests waiting for a worker and of measured latencies
+DEFAULT_CACHE_SIZE = 128
+DEFAULT_QUEUE_SIZE = 32
+NUMBER_OF_MEASURED_LATENCIES = 1000
+# Longest wait for a result [s] and largest accepted request [bytes]
+DEFAULT_REQUEST_TIMEOUT = 300
+MAXIMAL_REQUEST_SIZE = 256 * 1024 * 1024
+# Longest accepted time budget of the route [s]
+MAXIMAL_ROUTE_TIME_BUDGET = 60.0
+# Content types of the uploaded files (the "format" query parameter takes precedence)
+UPLOAD_CONTENT_TYPES = {
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "excel",
+    "application/vnd.ms-excel.sheet.macroenabled.12": "excel",
+    "text/csv": "csv",
+    "application/vnd.apache.parquet": "parquet",
+    "application/geo+json": "geojson",
+}
+
+
+def Read_The_Option(options, option_name, default_value, allowed_values=None):
+    # Value of the option (the default one if not given), ValueError if it is not allowed
+    option_value = options.get(option_name, default_value)
+    if allowed_values is not None and option_value not in allowed_values:
+        raise ValueError(
+            f"Unknown {option_name} '{option_value}'. Expected one of {allowed_values}."
+        )
+    return option_value
+
+
+def Read_The_Selection_Options(options):
+    # Options of the selection given in the request (ValueError if some is not valid)
+    try:
+        how_many_points_to_find = int(options["count"])
+        route_time_budget = float(
+            options.get("route_time_budget", DEFAULT_ROUTE_TIME_BUDGET)
+        )
+    except KeyError:
+        raise ValueError("The number of points to select (count) is missing.") from None
+    except (TypeError, ValueError):
+        raise ValueError("The count and route_time_budget have to be numbers.") from None
+    if how_many_points_to_find < 2:
+        raise ValueError("At least 2 points have to be selected.")
+    if not 0 <= route_time_budget <= MAXIMAL_ROUTE_TIME_BUDGET:
+        raise ValueError(
+            f"The route_time_budget has to be between 0 and {MAXIMAL_ROUTE_TIME_BUDGET} s."
+        )
+    return {
+        "how_many_points_to_find": how_many_points_to_find,
+        "distance_model": Read_The_Option(
+            options, "distance_model", "ellipsoidal", DISTANCE_MODELS
+        ),
+        "furthest_pair_method": Read_The_Option(
+            options, "furthest_pair_method", "convex_hull", FURTHEST_PAIR_METHODS
+        ),
+        "selection_mode": Read_The_Option(
+            options, "selection_mode", "uniform_spacing", SELECTION_MODES
+        ),
+        "route_time_budget": route_time_budget,
+    }
+
+
+def Read_The_Uploaded_File(body, file_type):
+    # Read the uploaded input file by the reader of its type (from a temporary file)
+    file_handle, path_to_file = tempfile.mkstemp(
+        suffix=INPUT_FILE_EXTENSIONS[file_type][0]
+    )
+    try:
+        with os.fdopen(file_handle, "wb") as uploaded_file:
+            uploaded_file.write(body)
+        return Read_The_Input_File(path_to_file)
+    finally:
+        os.remove(path_to_file)
+
+
+def Parse_The_Selection_Request(query_parameters, content_type, body):
+    # Coordinates, names (None for JSON requests) and options of the selection request
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type == "application/json":
+        try:
+            options = json.loads(body)
+            latitude_values = options["latitudes"]
+            longitude_values = options["longitudes"]
+        except (TypeError, KeyError):
+            raise ValueError(
+                'The JSON object has to contain the "latitudes" and "longitudes" arrays.'
+            ) from None
+        if not isinstance(latitude_values, list) or not isinstance(
+            longitude_values, list
+        ):
+            raise ValueError("The latitudes and longitudes have to be arrays.")
+        if len(latitude_values) != len(longitude_values):
+            raise ValueError("The latitudes and longitudes have to be of the same length.")
+        names = None
+        latitudes, longitudes, validation_report = Validate_Coordinate_Columns(
+            latitude_values, longitude_values
+        )
+    else:
+        # Options of the uploaded files are the query parameters (their last values)
+        options = {name: values[-1] for name, values in query_parameters.items()}
+        if "format" in options:
+            file_type = Find_The_Input_File_Type(
+                "upload." + options["format"].lstrip(".")
+            )
+        elif content_type in UPLOAD_CONTENT_TYPES:
+            file_type = UPLOAD_CONTENT_TYPES[content_type]
+        else:
+            raise ValueError(
+                "The format of the uploaded file is not known, give it by the format"
+                " query parameter (e.g. ?format=xlsx)."
+            )
+        loaded_input_file = Read_The_Uploaded_File(body, file_type)
+        validation_report = loaded_input_file["validation_report"]
+        if validation_report is None:
+            raise ValueError("The coordinate columns were not found in the file.")
+        names = loaded_input_file["names"]
+        latitudes = loaded_input_file["latitudes"]
+        longitudes = loaded_input_file["longitudes"]
+    selection_options = Read_The_Selection_Options(options)
+    # Invalid points are only left out if allowed (the selection works with the valid ones)
+    point_indexes = None
+    if len(validation_report["invalid_indexes"]):
+        if str(options.get("skip_invalid_points", "")).lower() not in ("true", "1"):
+            raise ValueError(
+                "The coordinates of some points are not valid.\n"
+                + Describe_The_Validation_Report(validation_report)
+            )
+        point_indexes = numpy.setdiff1d(
+            numpy.arange(len(latitudes)),
+            validation_report["invalid_indexes"],
+            assume_unique=True,
+        )
+        latitudes = latitudes[point_indexes]
+        longitudes = longitudes[point_indexes]
+    if selection_options["how_many_points_to_find"] > len(latitudes):
+        raise ValueError(
+            f"Only {len(latitudes)} valid points were given,"
+            f" {selection_options['how_many_points_to_find']} can not be selected."
+        )
+    return {
+        "latitudes": latitudes,
+        "longitudes": longitudes,
+        "names": names,
+        "point_indexes": point_indexes,
+        "options": selection_options,
+    }
+
+
+def Find_The_Request_Key(selection_request):
+    # Hash of the coordinates and options - identical requests have the same key
+    request_hash = hashlib.sha256()
+    request_hash.update(numpy.ascontiguousarray(selection_request["latitudes"]).tobytes())
+    request_hash.update(numpy.ascontiguousarray(selection_request["longitudes"]).tobytes())
+    request_hash.update(
+        json.dumps(selection_request["options"], sort_keys=True).encode("utf-8")
+    )
+    return request_hash.hexdigest()
+
+
+class Selection_Service:
+    # Only the listed attributes are stored (no per-instance dictionary)
+    __slots__ = (
+        "number_of_workers",
+        "executor",
+        "result_cache",
+        "maximal_queue_depth",
+        "request_timeout",
+        "running_selections",
+        "lock",
+        "latencies",
+        "request_counts",
+        "start_time",
+    )
+
+    def __init__(
+        self,
+        number_of_workers=None,
+        cache_size=DEFAULT_CACHE_SIZE,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        request_timeout=DEFAULT_REQUEST_TIMEOUT,
+    ):
+        self.number_of_workers = number_of_workers or os.cpu_count() or 1
+        # Workers are spawned, not forked - they would inherit the listening socket and
+        # the locks held by the request threads otherwise
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            self.number_of_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self.result_cache = Result_Cache(cache_size)
+        # Requests beyond the busy workers and the waiting ones are rejected
+        self.maximal_queue_depth = self.number_of_workers + queue_size
+        self.request_timeout = request_timeout
+        # Futures of the selections being calculated by their request keys
+        self.running_selections = {}
+        self.lock = threading.Lock()
+        self.latencies = collections.deque(maxlen=NUMBER_OF_MEASURED_LATENCIES)
+        self.request_counts = dict.fromkeys(
+            ("total", "cached", "joined", "rejected", "failed"), 0
+        )
+        self.start_time = time.monotonic()
+
+    # Add one to the request counter
+    def count_request(self, counter_name):
+        with self.lock:
+            self.request_counts[counter_name] += 1
+
+    # Forget the finished selection and cache its result (if it did not fail)
+    def finish_selection(self, request_key, future):
+        with self.lock:
+            self.running_selections.pop(request_key, None)
+        if not future.cancelled() and future.exception() is None:
+            self.result_cache.put(request_key, future.result())
+
+    # Future of the selection of the request - a running identical one is joined, a new one
+    # is only started if the queue is not full (Service_Busy otherwise)
+    def start_selection(self, request_key, selection_request):
+        with self.lock:
+            future = self.running_selections.get(request_key)
+            if future is not None:
+                self.request_counts["joined"] += 1
+                return future
+            if len(self.running_selections) >= self.maximal_queue_depth:
+                self.request_counts["rejected"] += 1
+                raise Service_Busy(
+                    f"All {self.number_of_workers} workers are busy and"
+                    f" {self.maximal_queue_depth - self.number_of_workers} requests wait."
+                )
+            future = self.executor.submit(
+                Select_The_Point_Indexes,
+                selection_request["latitudes"],
+                selection_request["longitudes"],
+                **selection_request["options"],
+            )
+            self.running_selections[request_key] = future
+        future.add_done_callback(
+            lambda future: self.finish_selection(request_key, future)
+        )
+        return future
+
+    # Answer the parsed selection request (from the cache if possible)
+    def select(self, selection_request):
+        start_time = time.perf_counter()
+        self.count_request("total")
+        request_key = Find_The_Request_Key(selection_request)
+        selection_result = self.result_cache.get(request_key)
+        is_cached = selection_result is not None
+        try:
+            if is_cached:
+                self.count_request("cached")
+            else:
+                selection_result = self.start_selection(
+                    request_key, selection_request
+                ).result(timeout=self.request_timeout)
+        except Service_Busy:
+            raise
+        except BaseException:
+            self.count_request("failed")
+            raise
+        # Indexes of the selection among all given points (if the invalid ones were skipped)
+        point_indexes = selection_request["point_indexes"]
+        if point_indexes is None:
+            selected_indexes = selection_result["selected_indexes"]
+            route = selection_result["route"]
+        else:
+            selected_indexes = point_indexes[selection_result["selected_indexes"]].tolist()
+            route = point_indexes[selection_result["route"]].tolist()
+        response = {
+            "selected_indexes": selected_indexes,
+            "route": route,
+            "route_length": selection_result["route_length"],
+            "initial_route_length": selection_result["initial_route_length"],
+            "cached": is_cached,
+        }
+        if selection_request["names"] is not None:
+            response["route_names"] = [selection_request["names"][i] for i in route]
+        latency = time.perf_counter() - start_time
+        with self.lock:
+            self.latencies.append(latency)
+        response["seconds"] = latency
+        return response
+
+    # State of the service - the queue, the counts of requests, the latencies and the cache
+    def describe_health(self):
+        with self.lock:
+            queue_depth = len(self.running_selections)
+            request_counts = dict(self.request_counts)
+            latencies = numpy.array(self.latencies)
+        latency_description = {"count": len(latencies)}
+        if len(latencies):
+            latency_description.update(
+                mean=float(latencies.mean()),
+                p50=float(numpy.percentile(latencies, 50)),
+                p95=float(numpy.percentile(latencies, 95)),
+                max=float(latencies.max()),
+            )
+        return {
+            "status": "ok",
+            "uptime_seconds": time.monotonic() - self.start_time,
+            "workers": self.number_of_workers,
+            "queue_depth": queue_depth,
+            "maximal_queue_depth": self.maximal_queue_depth,
+            "requests": request_counts,
+            "latency_seconds": latency_description,
+            "cache": self.result_cache.describe(),
+        }
+
+    # Stop the worker pool (the running selections are finished first)
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class Selection_Request_Handler(http.server.BaseHTTPRequestHandler):
+    # Requests are answered by the selection service of the server
+    server_version = "UniformlySpacedPointsSelector/1.0"
+
+    # Send the content as a JSON response
+    def send_json(self, status, content, headers=()):
+        response_body = json.dumps(content, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response_body)))
+        for header_name, header_value in headers:
+            self.send_header(header_name, header_value)
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    # Describe the state of the service
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path == "/health":
+            self.send_json(200, self.server.selection_service.describe_health())
+        else:
+            self.send_json(404, {"error": "Unknown path, use /health or POST /select."})
+
+    # Select the points of the request
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/select":
+            self.send_json(404, {"error": "Unknown path, use POST /select."})
+            return
+        try:
+            request_size = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            request_size = -1
+        if not 0 < request_size <= MAXIMAL_REQUEST_SIZE:
+            self.send_json(
+                413 if request_size > 0 else 411,
+                {"error": f"A body of 1 to {MAXIMAL_REQUEST_SIZE} bytes is expected."},
+            )
+            return
+        body = self.rfile.read(request_size)
+        try:
+            response = self.server.selection_service.select(
+                Parse_The_Selection_Request(
+                    urllib.parse.parse_qs(url.query),
+                    self.headers.get("Content-Type", ""),
+                    body,
+                )
+            )
+        except ValueError as error:
+            self.send_json(400, {"error": str(error)})
+        except Service_Busy as error:
+            self.send_json(503, {"error": str(error)}, (("Retry-After", "1"),))
+        except concurrent.futures.TimeoutError:
+            self.send_json(504, {"error": "The selection took too long."})
+        except Exception as error:
+            self.send_json(500, {"error": f"{type(error).__name__}: {error}"})
+        else:
+            self.send_json(200, response)
+
+
+def Create_The_Selection_Server(host, port, selection_service):
+    # HTTP server answering every request on its own thread by the given service
+    selection_server = http.server.ThreadingHTTPServer(
+        (host, port), Selection_Request_Handler
+    )
+    selection_server.selection_service = selection_service
+    return selection_server
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Class implementing a spatial index (k-d tree) of geographical points for neighbour queries.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import heapq  # Visiting the tree nodes from the most promising one
+import math  # Conversions between chords and distances
+import numpy  # Storing the points and the node boxes as arrays
+
+from Dependencies.Subroutine_Calculate_Distances import EARTH_RADIUS_KM
+
+# The points are converted to 3D unit vectors, so the straight (chord) distance between two
+# vectors grows with the great-circle distance between the points and there are no problems
+# with the antimeridian or the poles. The tree splits the points along the widest axis of
+# their bounding box until at most LEAF_SIZE points are left, so a query only visits the few
+# boxes that can hold the answer. All returned distances are great-circle distances in km.
+# The ellipsoidal distances differ from them by less than DISTANCE_MODEL_TOLERANCE, which
+# gives the margin to widen a query by when the exact distances of another model are needed.
+
+LEAF_SIZE = 16
+DISTANCE_MODEL_TOLERANCE = 0.01  # Relative difference of the ellipsoidal and spherical distances
+SEARCH_RADIUS_MARGIN_KM = 1e-6  # Covers the rounding of the chords of very close points
+
+
+def Convert_To_Unit_Vectors(latitudes, longitudes):
+    # Points on the unit sphere, one row of (x, y, z) per point
+    latitudes = numpy.radians(numpy.asarray(latitudes, dtype=numpy.float64))
+    longitudes = numpy.radians(numpy.asarray(longitudes, dtype=numpy.float64))
+    cosines_of_latitudes = numpy.cos(latitudes)
+    return numpy.column_stack(
+        (
+            cosines_of_latitudes * numpy.cos(longitudes),
+            cosines_of_latitudes * numpy.sin(longitudes),
+            numpy.sin(latitudes),
+        )
+    )
+
+
+def Convert_Chords_To_Distances(chords):
+    # Great-circle distances in km of the given chords of the unit sphere
+    return 2 * EARTH_RADIUS_KM * numpy.arcsin(numpy.clip(chords / 2, 0, 1))
+
+
+def Convert_Distance_To_Chord(distance):
+    # Chord of the unit sphere for the given great-circle distance in km (at most the diameter)
+    return 2 * math.sin(min(distance / (2 * EARTH_RADIUS_KM), math.pi / 2))
+
+
+def Get_The_Search_Radius(distance, distance_model="ellipsoidal"):
+    # Great-circle radius holding all points up to the given distance of the distance model
+    if distance_model == "haversine":
+        return distance + SEARCH_RADIUS_MARGIN_KM
+    return distance / (1 - DISTANCE_MODEL_TOLERANCE) + SEARCH_RADIUS_MARGIN_KM
+
+
+class Spatial_Index:
+    # Only the listed attributes are stored (no per-instance dictionary)
+    __slots__ = (
+        "latitudes",
+        "longitudes",
+        "number_of_points",
+        "ordered_vectors",
+        "ordered_indexes",
+        "node_lower_corners",
+        "node_upper_corners",
+        "node_starts",
+        "node_ends",
+        "node_children",
+    )
+
+    def __init__(self, latitudes, longitudes):
+        # Coordinates are kept to query the neighbours of the indexed points themselves
+        self.latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+        self.longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+        vectors = Convert_To_Unit_Vectors(self.latitudes, self.longitudes)
+        self.number_of_points = len(vectors)
+        # Points are reordered so that every node holds a contiguous range of them
+        ordered_indexes = numpy.arange(self.number_of_points)
+        node_lower_corners = []
+        node_upper_corners = []
+        node_starts = []
+        node_ends = []
+        node_children = []
+        # Nodes are created from the root down (start, end and parent of each node to create)
+        nodes_to_create = [(0, self.number_of_points, -1)]
+        while nodes_to_create:
+            start, end, parent = nodes_to_create.pop()
+            node = len(node_starts)
+            if parent >= 0:
+                node_children[parent].append(node)
+            node_vectors = vectors[ordered_indexes[start:end]]
+            lower_corner = node_vectors.min(axis=0) if end > start else numpy.zeros(3)
+            upper_corner = node_vectors.max(axis=0) if end > start else numpy.zeros(3)
+            node_lower_corners.append(lower_corner)
+            node_upper_corners.append(upper_corner)
+            node_starts.append(start)
+            node_ends.append(end)
+            node_children.append([])
+            if end - start <= LEAF_SIZE:
+                continue
+            # Split at the median along the widest axis of the box
+            split_axis = int(numpy.argmax(upper_corner - lower_corner))
+            middle = (start + end) // 2
+            ordered_indexes[start:end] = ordered_indexes[start:end][
+                numpy.argpartition(node_vectors[:, split_axis], middle - start)
+            ]
+            nodes_to_create.append((middle, end, node))
+            nodes_to_create.append((start, middle, node))
+        self.ordered_indexes = ordered_indexes
+        self.ordered_vectors = vectors[ordered_indexes]
+        # Boxes are read one value at a time during the queries, which is faster with lists
+        self.node_lower_corners = numpy.array(node_lower_corners).tolist()
+        self.node_upper_corners = numpy.array(node_upper_corners).tolist()
+        self.node_starts = node_starts
+        self.node_ends = node_ends
+        self.node_children = node_children
+
+    # Squared chord from the vector to the closest point of the box of the node
+    def closest_squared_chord(self, vector, node):
+        squared_chord = 0.0
+        for coordinate, lower, upper in zip(
+            vector, self.node_lower_corners[node], self.node_upper_corners[node]
+        ):
+            if coordinate < lower:
+                squared_chord += (lower - coordinate) ** 2
+            elif coordinate > upper:
+                squared_chord += (coordinate - upper) ** 2
+        return squared_chord
+
+    # Squared chord from the vector to the furthest corner of the box of the node
+    def furthest_squared_chord(self, vector, node):
+        return sum(
+            max(coordinate - lower, upper - coordinate) ** 2
+            for coordinate, lower, upper in zip(
+                vector, self.node_lower_corners[node], self.node_upper_corners[node]
+            )
+        )
+
+    # Positions and squared chords of the points of the node
+    def points_of_node(self, vector, node):
+        positions = numpy.arange(self.node_starts[node], self.node_ends[node])
+        squared_chords = numpy.sum(
+            (self.ordered_vectors[positions] - vector) ** 2, axis=1
+        )
+        return positions, squared_chords
+
+    # Point of the index as a unit vector (list of 3 values)
+    def vector_of_point(self, latitude, longitude):
+        return Convert_To_Unit_Vectors([latitude], [longitude])[0].tolist()
+
+    # Indexes and distances (in km) of up to k closest points, the closest first
+    def query_nearest(self, latitude, longitude, k=1):
+        return self.query_ordered(latitude, longitude, k, is_furthest=False)
+
+    # Indexes and distances (in km) of up to k furthest points, the furthest first
+    def query_furthest(self, latitude, longitude, k=1):
+        return self.query_ordered(latitude, longitude, k, is_furthest=True)
+
+    # Best-first search shared by the nearest and furthest queries
+    def query_ordered(self, latitude, longitude, k, is_furthest):
+        if k < 1:
+            raise ValueError(f"At least one point has to be queried, {k} were requested.")
+        vector = self.vector_of_point(latitude, longitude)
+        vector_array = numpy.array(vector)
+        # Nearest: minimise the squared chords, furthest: minimise their negative values
+        sign = -1.0 if is_furthest else 1.0
+        box_bound = (
+            self.furthest_squared_chord if is_furthest else self.closest_squared_chord
+        )
+        # Heap of (signed squared chord, index) of the best points found so far, worst on top
+        found_points = []
+        nodes_to_visit = []
+        if self.number_of_points:
+            nodes_to_visit.append((sign * box_bound(vector, 0), 0))
+        while nodes_to_visit:
+            node_bound, node = heapq.heappop(nodes_to_visit)
+            # No point of the remaining nodes can replace any of the found points
+            if len(found_points) == k and node_bound > -found_points[0][0]:
+                break
+            if self.node_children[node]:
+                for child in self.node_children[node]:
+                    heapq.heappush(
+                        nodes_to_visit, (sign * box_bound(vector, child), child)
+                    )
+                continue
+            positions, squared_chords = self.points_of_node(vector_array, node)
+            for signed_squared_chord, point_index in zip(
+                (sign * squared_chords).tolist(),
+                self.ordered_indexes[positions].tolist(),
+            ):
+                # Ties are resolved in favour of the lower index (the key is negated on the heap)
+                point_key = (-signed_squared_chord, -point_index)
+                if len(found_points) < k:
+                    heapq.heappush(found_points, point_key)
+                elif point_key > found_points[0]:
+                    heapq.heapreplace(found_points, point_key)
+        found_points.sort(reverse=True)
+        indexes = numpy.array(
+            [-point_index for _, point_index in found_points], dtype=numpy.int64
+        )
+        squared_chords = numpy.array(
+            [-sign * signed_squared_chord for signed_squared_chord, _ in found_points]
+        )
+        return indexes, Convert_Chords_To_Distances(numpy.sqrt(squared_chords))
+
+    # Indexes (ascending) and distances (in km) of all points within the given distance
+    def query_radius(self, latitude, longitude, radius):
+        vector = self.vector_of_point(latitude, longitude)
+        vector_array = numpy.array(vector)
+        squared_radius = Convert_Distance_To_Chord(radius) ** 2
+        found_positions = []
+        found_squared_chords = []
+        nodes_to_visit = [0] if self.number_of_points else []
+        while nodes_to_visit:
+            node = nodes_to_visit.pop()
+            if self.closest_squared_chord(vector, node) > squared_radius:
+                continue
+            if self.furthest_squared_chord(vector, node) <= squared_radius:
+                # The whole box is within the radius, its points are taken without testing
+                positions, squared_chords = self.points_of_node(vector_array, node)
+            elif self.node_children[node]:
+                nodes_to_visit.extend(self.node_children[node])
+                continue
+            else:
+                positions, squared_chords = self.points_of_node(vector_array, node)
+                is_within_radius = squared_chords <= squared_radius
+                positions = positions[is_within_radius]
+                squared_chords = squared_chords[is_within_radius]
+            found_positions.append(positions)
+            found_squared_chords.append(squared_chords)
+        if not found_positions:
+            return numpy.empty(0, dtype=numpy.int64), numpy.empty(0)
+        indexes = self.ordered_indexes[numpy.concatenate(found_positions)]
+        squared_chords = numpy.concatenate(found_squared_chords)
+        index_order = numpy.argsort(indexes)
+        return indexes[index_order], Convert_Chords_To_Distances(
+            numpy.sqrt(squared_chords[index_order])
+        )
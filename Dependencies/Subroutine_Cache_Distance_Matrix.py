@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Functions storing distance matrices of point sets in a persistent memory-mapped cache.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import os  # Working with file paths
+import hashlib  # Hashing the coordinates into cache keys
+import numpy  # Memory-mapped .npy files
+
+from Dependencies.Subroutine_Calculate_Distances import Calculate_Distances
+
+# Only the upper triangle of the matrix (without the diagonal) is stored, row by row
+DEFAULT_CACHE_FOLDER = os.path.join(
+    os.path.expanduser("~"), ".uniformly_spaced_points_selector", "distance_cache"
+)
+DEFAULT_MAXIMAL_CACHE_SIZE = 4 * 1024**3  # Bytes
+
+
+def Get_Cache_Key(latitudes, longitudes, distance_model):
+    # Hash of the exact coordinate values and the distance model
+    hash_object = hashlib.sha256()
+    hash_object.update(distance_model.encode("utf-8"))
+    for coordinates in (latitudes, longitudes):
+        hash_object.update(
+            numpy.ascontiguousarray(coordinates, dtype=numpy.float64).tobytes()
+        )
+    return hash_object.hexdigest()
+
+
+def Get_Condensed_Index(n_of_points, first_point_indexes, second_point_index):
+    # Position of the pairs (first, second) with first < second within the condensed matrix
+    first_point_indexes = numpy.asarray(first_point_indexes, dtype=numpy.int64)
+    return (
+        first_point_indexes * n_of_points
+        - first_point_indexes * (first_point_indexes + 1) // 2
+        + second_point_index
+        - first_point_indexes
+        - 1
+    )
+
+
+def Get_Distances_From_Condensed_Matrix(condensed_matrix, n_of_points, point_index):
+    # Distances from one point to every point of the set (zero for the point itself)
+    distances = numpy.zeros(n_of_points)
+    # Points before the given one are found in the previous rows, one value in each
+    distances[:point_index] = condensed_matrix[
+        Get_Condensed_Index(n_of_points, numpy.arange(point_index), point_index)
+    ]
+    # Points after the given one form a continuous part of its own row
+    row_start = Get_Condensed_Index(n_of_points, point_index, point_index + 1)
+    distances[point_index + 1 :] = condensed_matrix[
+        row_start : row_start + n_of_points - point_index - 1
+    ]
+    return distances
+
+
+def Find_The_Furthest_Pair_In_Condensed_Matrix(condensed_matrix, n_of_points):
+    # The first maximum in the row by row order is the same pair the brute force search finds
+    if len(condensed_matrix) == 0:
+        return (), 0
+    furthest_pair_position = int(numpy.argmax(condensed_matrix))
+    maximal_distance = condensed_matrix[furthest_pair_position]
+    if maximal_distance <= 0:
+        return (), 0
+    first_point_indexes = numpy.arange(n_of_points - 1)
+    row_starts = Get_Condensed_Index(
+        n_of_points, first_point_indexes, first_point_indexes + 1
+    )
+    first_point_index = int(
+        numpy.searchsorted(row_starts, furthest_pair_position, side="right") - 1
+    )
+    second_point_index = (
+        first_point_index
+        + 1
+        + furthest_pair_position
+        - int(row_starts[first_point_index])
+    )
+    return (first_point_index, second_point_index), maximal_distance
+
+
+def Calculate_Condensed_Distance_Matrix(
+    latitudes, longitudes, distance_model, condensed_matrix, progress_callback=None
+):
+    # Fill the (memory-mapped) condensed matrix row by row
+    n_of_points = len(latitudes)
+    progress_step = max(1, n_of_points // 100)
+    for first_point_index in range(n_of_points - 1):
+        # Report the number of filled values about every 1 % of the rows
+        if progress_callback is not None and first_point_index % progress_step == 0:
+            progress_callback(
+                "distance_matrix",
+                Get_Condensed_Index(n_of_points, first_point_index, first_point_index + 1),
+                len(condensed_matrix),
+            )
+        row_start = Get_Condensed_Index(
+            n_of_points, first_point_index, first_point_index + 1
+        )
+        condensed_matrix[
+            row_start : row_start + n_of_points - first_point_index - 1
+        ] = Calculate_Distances(
+            latitudes[first_point_index],
+            longitudes[first_point_index],
+            latitudes[first_point_index + 1 :],
+            longitudes[first_point_index + 1 :],
+            distance_model,
+        )
+
+
+def Evict_Least_Recently_Used(
+    cache_folder, maximal_cache_size, protected_file_name=None
+):
+    # Remove the least recently used matrices until the cache fits into the size limit
+    cached_files = []
+    for file_name in os.listdir(cache_folder):
+        if not file_name.endswith(".npy") or file_name == protected_file_name:
+            continue
+        file_status = os.stat(os.path.join(cache_folder, file_name))
+        cached_files.append((file_status.st_mtime, file_status.st_size, file_name))
+    total_size = sum(file_size for _, file_size, _ in cached_files)
+    if protected_file_name is not None:
+        total_size += os.path.getsize(os.path.join(cache_folder, protected_file_name))
+    for _, file_size, file_name in sorted(cached_files):
+        if total_size <= maximal_cache_size:
+            break
+        try:
+            os.remove(os.path.join(cache_folder, file_name))
+        except OSError:
+            # The file could be used (mapped) by another run - try the next one
+            continue
+        total_size -= file_size
+
+
+def Load_Condensed_Distance_Matrix(
+    latitudes,
+    longitudes,
+    distance_model="ellipsoidal",
+    cache_folder=None,
+    maximal_cache_size=DEFAULT_MAXIMAL_CACHE_SIZE,
+    progress_callback=None,
+):
+    # Map the cached matrix of the point set, or calculate and cache it first
+    if cache_folder is None:
+        cache_folder = DEFAULT_CACHE_FOLDER
+    os.makedirs(cache_folder, exist_ok=True)
+    n_of_points = len(latitudes)
+    file_name = Get_Cache_Key(latitudes, longitudes, distance_model) + ".npy"
+    path_to_matrix = os.path.join(cache_folder, file_name)
+    if not os.path.exists(path_to_matrix):
+        # Write to a temporary file first, so that an interrupted run does not leave a broken matrix
+        path_to_partial_matrix = path_to_matrix + f".{os.getpid()}.partial"
+        condensed_matrix = numpy.lib.format.open_memmap(
+            path_to_partial_matrix,
+            mode="w+",
+            dtype=numpy.float64,
+            shape=(n_of_points * (n_of_points - 1) // 2,),
+        )
+        try:
+            Calculate_Condensed_Distance_Matrix(
+                latitudes, longitudes, distance_model, condensed_matrix, progress_callback
+            )
+            condensed_matrix.flush()
+        except BaseException:
+            # Do not leave the unfinished matrix behind (e.g. when the calculation was cancelled)
+            del condensed_matrix
+            os.remove(path_to_partial_matrix)
+            raise
+        del condensed_matrix
+        os.replace(path_to_partial_matrix, path_to_matrix)
+    else:
+        # Mark the matrix as recently used
+        os.utime(path_to_matrix)
+    Evict_Least_Recently_Used(cache_folder, maximal_cache_size, file_name)
+    return numpy.load(path_to_matrix, mmap_mode="r")
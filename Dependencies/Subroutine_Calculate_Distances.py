@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Functions calculating distances between arrays of geographical points in km.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import numpy  # Vectorized trigonometry over whole coordinate arrays
+from geographiclib.geodesic import Geodesic  # Exact fallback for nearly antipodal pairs
+
+from Dependencies.Class_Implementing_Selection_Metrics import Count_The_Event
+
+# Mean Earth radius used by the spherical (haversine) model
+EARTH_RADIUS_KM = 6371.0088
+# WGS-84 ellipsoid used by the ellipsoidal model (the same one used by geopy)
+WGS84_MAJOR_AXIS_KM = 6378.137
+WGS84_FLATTENING = 1 / 298.257223563
+WGS84_MINOR_AXIS_KM = WGS84_MAJOR_AXIS_KM * (1 - WGS84_FLATTENING)
+WGS84_SQUARED_ECCENTRICITY = WGS84_FLATTENING * (2 - WGS84_FLATTENING)
+
+# Names of the supported distance models
+# (the approximate model measures the straight lines between the points on the ellipsoid,
+# which are shorter than the ellipsoidal distances only by a tiny error within a region)
+DISTANCE_MODELS = ("ellipsoidal", "haversine", "approximate")
+
+
+def Calculate_Haversine_Distances(
+    first_latitudes, first_longitudes, second_latitudes, second_longitudes
+):
+    # Convert the degrees to radians (arrays are broadcast against each other)
+    first_latitudes = numpy.radians(first_latitudes)
+    second_latitudes = numpy.radians(second_latitudes)
+    latitude_differences = second_latitudes - first_latitudes
+    longitude_differences = numpy.radians(second_longitudes) - numpy.radians(
+        first_longitudes
+    )
+    # Haversine of the central angle
+    haversines = (
+        numpy.sin(latitude_differences / 2) ** 2
+        + numpy.cos(first_latitudes)
+        * numpy.cos(second_latitudes)
+        * numpy.sin(longitude_differences / 2) ** 2
+    )
+    # Clip rounding errors so that arcsin stays within its domain
+    central_angles = 2 * numpy.arcsin(numpy.sqrt(numpy.clip(haversines, 0, 1)))
+    return EARTH_RADIUS_KM * central_angles
+
+
+def Convert_To_Earth_Centered_Coordinates(latitudes, longitudes):
+    # Earth-centered, Earth-fixed (x, y, z) coordinates in km of the points on the ellipsoid
+    latitudes = numpy.radians(latitudes)
+    longitudes = numpy.radians(longitudes)
+    sin_latitudes = numpy.sin(latitudes)
+    cos_latitudes = numpy.cos(latitudes)
+    # Radius of curvature in the prime vertical
+    vertical_radii = WGS84_MAJOR_AXIS_KM / numpy.sqrt(
+        1 - WGS84_SQUARED_ECCENTRICITY * sin_latitudes**2
+    )
+    return (
+        vertical_radii * cos_latitudes * numpy.cos(longitudes),
+        vertical_radii * cos_latitudes * numpy.sin(longitudes),
+        vertical_radii * (1 - WGS84_SQUARED_ECCENTRICITY) * sin_latitudes,
+    )
+
+
+def Calculate_Chord_Distances(
+    first_latitudes, first_longitudes, second_latitudes, second_longitudes
+):
+    # Straight (Euclidean) distances through the Earth-centered coordinates of the points
+    first_coordinates = Convert_To_Earth_Centered_Coordinates(
+        first_latitudes, first_longitudes
+    )
+    second_coordinates = Convert_To_Earth_Centered_Coordinates(
+        second_latitudes, second_longitudes
+    )
+    return numpy.sqrt(
+        sum(
+            (second_coordinate - first_coordinate) ** 2
+            for first_coordinate, second_coordinate in zip(
+                first_coordinates, second_coordinates
+            )
+        )
+    )
+
+
+def Calculate_Ellipsoidal_Distances(
+    first_latitudes,
+    first_longitudes,
+    second_latitudes,
+    second_longitudes,
+    maximal_number_of_iterations=200,
+    convergence_threshold=1e-12,
+):
+    # Vincenty's inverse formula evaluated for all pairs at once
+    # Pairs that have already converged are kept fixed while the rest keep iterating
+    broadcast_coordinates = numpy.broadcast_arrays(
+        numpy.asarray(first_latitudes, dtype=numpy.float64),
+        numpy.asarray(first_longitudes, dtype=numpy.float64),
+        numpy.asarray(second_latitudes, dtype=numpy.float64),
+        numpy.asarray(second_longitudes, dtype=numpy.float64),
+    )
+    # Work with flat arrays and restore the broadcast shape at the end
+    output_shape = broadcast_coordinates[0].shape
+    first_latitudes, first_longitudes, second_latitudes, second_longitudes = (
+        coordinates.ravel() for coordinates in broadcast_coordinates
+    )
+    flattening = WGS84_FLATTENING
+    # Reduced latitudes (latitudes on the auxiliary sphere)
+    reduced_first = numpy.arctan(
+        (1 - flattening) * numpy.tan(numpy.radians(first_latitudes))
+    )
+    reduced_second = numpy.arctan(
+        (1 - flattening) * numpy.tan(numpy.radians(second_latitudes))
+    )
+    sin_reduced_first = numpy.sin(reduced_first)
+    cos_reduced_first = numpy.cos(reduced_first)
+    sin_reduced_second = numpy.sin(reduced_second)
+    cos_reduced_second = numpy.cos(reduced_second)
+    # Difference in longitude normalized to the (-pi, pi] interval
+    longitude_difference = numpy.radians(second_longitudes - first_longitudes)
+    longitude_difference = (longitude_difference + numpy.pi) % (
+        2 * numpy.pi
+    ) - numpy.pi
+    auxiliary_longitude = longitude_difference.copy()
+
+    # Variables updated within the iterations
+    sin_sigma = numpy.zeros(auxiliary_longitude.shape)
+    cos_sigma = numpy.ones(auxiliary_longitude.shape)
+    sigma = numpy.zeros(auxiliary_longitude.shape)
+    cos_squared_alpha = numpy.ones(auxiliary_longitude.shape)
+    cos_double_sigma_middle = numpy.zeros(auxiliary_longitude.shape)
+    not_converged = numpy.ones(auxiliary_longitude.shape, dtype=bool)
+
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(maximal_number_of_iterations):
+            sin_auxiliary = numpy.sin(auxiliary_longitude)
+            cos_auxiliary = numpy.cos(auxiliary_longitude)
+            new_sin_sigma = numpy.sqrt(
+                (cos_reduced_second * sin_auxiliary) ** 2
+                + (
+                    cos_reduced_first * sin_reduced_second
+                    - sin_reduced_first * cos_reduced_second * cos_auxiliary
+                )
+                ** 2
+            )
+            new_cos_sigma = (
+                sin_reduced_first * sin_reduced_second
+                + cos_reduced_first * cos_reduced_second * cos_auxiliary
+            )
+            new_sigma = numpy.arctan2(new_sin_sigma, new_cos_sigma)
+            sin_alpha = numpy.where(
+                new_sin_sigma == 0,
+                0.0,
+                cos_reduced_first * cos_reduced_second * sin_auxiliary / new_sin_sigma,
+            )
+            new_cos_squared_alpha = 1 - sin_alpha**2
+            # Points on the equator have cos_squared_alpha equal to 0
+            new_cos_double_sigma_middle = numpy.where(
+                new_cos_squared_alpha == 0,
+                0.0,
+                new_cos_sigma
+                - 2 * sin_reduced_first * sin_reduced_second / new_cos_squared_alpha,
+            )
+            correction = (
+                flattening
+                / 16
+                * new_cos_squared_alpha
+                * (4 + flattening * (4 - 3 * new_cos_squared_alpha))
+            )
+            new_auxiliary_longitude = longitude_difference + (
+                1 - correction
+            ) * flattening * sin_alpha * (
+                new_sigma
+                + correction
+                * new_sin_sigma
+                * (
+                    new_cos_double_sigma_middle
+                    + correction
+                    * new_cos_sigma
+                    * (-1 + 2 * new_cos_double_sigma_middle**2)
+                )
+            )
+            # Update only the pairs which have not converged yet
+            sin_sigma = numpy.where(not_converged, new_sin_sigma, sin_sigma)
+            cos_sigma = numpy.where(not_converged, new_cos_sigma, cos_sigma)
+            sigma = numpy.where(not_converged, new_sigma, sigma)
+            cos_squared_alpha = numpy.where(
+                not_converged, new_cos_squared_alpha, cos_squared_alpha
+            )
+            cos_double_sigma_middle = numpy.where(
+                not_converged, new_cos_double_sigma_middle, cos_double_sigma_middle
+            )
+            step_sizes = numpy.abs(new_auxiliary_longitude - auxiliary_longitude)
+            auxiliary_longitude = numpy.where(
+                not_converged, new_auxiliary_longitude, auxiliary_longitude
+            )
+            not_converged &= step_sizes > convergence_threshold
+            if not not_converged.any():
+                break
+
+        # Evaluate the distance from the converged auxiliary values
+        u_squared = (
+            cos_squared_alpha
+            * (WGS84_MAJOR_AXIS_KM**2 - WGS84_MINOR_AXIS_KM**2)
+            / WGS84_MINOR_AXIS_KM**2
+        )
+        coefficient_a = 1 + u_squared / 16384 * (
+            4096 + u_squared * (-768 + u_squared * (320 - 175 * u_squared))
+        )
+        coefficient_b = u_squared / 1024 * (
+            256 + u_squared * (-128 + u_squared * (74 - 47 * u_squared))
+        )
+        delta_sigma = (
+            coefficient_b
+            * sin_sigma
+            * (
+                cos_double_sigma_middle
+                + coefficient_b
+                / 4
+                * (
+                    cos_sigma * (-1 + 2 * cos_double_sigma_middle**2)
+                    - coefficient_b
+                    / 6
+                    * cos_double_sigma_middle
+                    * (-3 + 4 * sin_sigma**2)
+                    * (-3 + 4 * cos_double_sigma_middle**2)
+                )
+            )
+        )
+        distances = WGS84_MINOR_AXIS_KM * coefficient_a * (sigma - delta_sigma)
+    # Identical points have zero distance
+    distances = numpy.where(sin_sigma == 0, 0.0, distances)
+    # Nearly antipodal pairs do not converge - solve these (rare) few exactly one by one
+    for pair_index in numpy.flatnonzero(not_converged):
+        distances[pair_index] = (
+            Geodesic.WGS84.Inverse(
+                first_latitudes[pair_index],
+                first_longitudes[pair_index],
+                second_latitudes[pair_index],
+                second_longitudes[pair_index],
+            )["s12"]
+            / 1000
+        )
+    return distances.reshape(output_shape)
+
+
+def Calculate_Distances(
+    first_latitudes,
+    first_longitudes,
+    second_latitudes,
+    second_longitudes,
+    distance_model="ellipsoidal",
+):
+    # Element-wise distances in km between two (broadcastable) sets of coordinates
+    if distance_model == "ellipsoidal":
+        distances = Calculate_Ellipsoidal_Distances(
+            first_latitudes, first_longitudes, second_latitudes, second_longitudes
+        )
+    elif distance_model == "haversine":
+        distances = Calculate_Haversine_Distances(
+            first_latitudes, first_longitudes, second_latitudes, second_longitudes
+        )
+    elif distance_model == "approximate":
+        distances = Calculate_Chord_Distances(
+            first_latitudes, first_longitudes, second_latitudes, second_longitudes
+        )
+    else:
+        raise ValueError(
+            f"Unknown distance model '{distance_model}'. Expected one of {DISTANCE_MODELS}."
+        )
+    Count_The_Event("distance_evaluations", numpy.size(distances))
+    return distances
+
+
+def Calculate_Distances_From_Point(
+    latitudes, longitudes, point_index, distance_model="ellipsoidal"
+):
+    # Distances in km from one point of the set to every point of the set
+    return Calculate_Distances(
+        latitudes[point_index],
+        longitudes[point_index],
+        latitudes,
+        longitudes,
+        distance_model,
+    )
+
+
+def Calculate_Distance_Matrix(latitudes, longitudes, distance_model="ellipsoidal"):
+    # Full square matrix of distances in km between every two points of the set
+    latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+    longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+    return Calculate_Distances(
+        latitudes[:, numpy.newaxis],
+        longitudes[:, numpy.newaxis],
+        latitudes[numpy.newaxis, :],
+        longitudes[numpy.newaxis, :],
+        distance_model,
+    )
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Functions calculating distances over shards of points in a pool of worker processes.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import os  # Number of available processors
+import concurrent.futures  # Pool of worker processes
+from multiprocessing import shared_memory  # Arrays shared by processes
+import numpy  # Working with coordinate arrays
+
+from Dependencies.Class_Implementing_Selection_Metrics import Count_The_Event
+from Dependencies.Subroutine_Calculate_Distances import Calculate_Distances
+
+# The coordinates and the output distance vector live in shared memory blocks, which are
+# attached once by every worker - only the shard boundaries are sent with each task.
+# Every worker evaluates exactly the same element-wise operations as the serial code,
+# so the results are identical to the serial mode.
+
+# Arrays attached by the worker process (filled by the pool initializer)
+worker_arrays = {}
+
+
+def Create_Shared_Array(values):
+    # Copy the values into a new shared memory block and return the block with its array view
+    values = numpy.ascontiguousarray(values, dtype=numpy.float64)
+    shared_block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    shared_array = numpy.ndarray(
+        values.shape, dtype=numpy.float64, buffer=shared_block.buf
+    )
+    shared_array[:] = values
+    return shared_block, shared_array
+
+
+def Attach_Shared_Arrays(shared_array_descriptions):
+    # Pool initializer - attach the shared memory blocks created by the main process
+    for array_name, (block_name, n_of_values) in shared_array_descriptions.items():
+        # The block is owned (and removed) by the main process, the worker only attaches to it
+        shared_block = shared_memory.SharedMemory(name=block_name)
+        worker_arrays[array_name] = (
+            shared_block,
+            numpy.ndarray(
+                (n_of_values,), dtype=numpy.float64, buffer=shared_block.buf
+            ),
+        )
+
+
+def Calculate_Shard_Of_Distances(point_index, shard_start, shard_end, distance_model):
+    # Distances from one point to the points of the shard, written into the shared output
+    latitudes = worker_arrays["latitudes"][1]
+    longitudes = worker_arrays["longitudes"][1]
+    worker_arrays["distances"][1][shard_start:shard_end] = Calculate_Distances(
+        latitudes[point_index],
+        longitudes[point_index],
+        latitudes[shard_start:shard_end],
+        longitudes[shard_start:shard_end],
+        distance_model,
+    )
+
+
+def Find_The_Furthest_Pair_In_Rows(first_row, last_row, distance_model):
+    # Brute force search of the furthest pair limited to the given rows (same order as serial search)
+    latitudes = worker_arrays["latitudes"][1]
+    longitudes = worker_arrays["longitudes"][1]
+    maximal_distance = 0
+    furthest_pair_indexes = ()
+    for first_point_index in range(first_row, last_row):
+        point_distances = Calculate_Distances(
+            latitudes[first_point_index],
+            longitudes[first_point_index],
+            latitudes[first_point_index + 1 :],
+            longitudes[first_point_index + 1 :],
+            distance_model,
+        )
+        furthest_point_offset = numpy.argmax(point_distances)
+        if point_distances[furthest_point_offset] > maximal_distance:
+            maximal_distance = float(point_distances[furthest_point_offset])
+            furthest_pair_indexes = (
+                first_point_index,
+                first_point_index + 1 + int(furthest_point_offset),
+            )
+    return furthest_pair_indexes, maximal_distance
+
+
+def Start_The_Worker_Pool(latitudes, longitudes, number_of_workers=None):
+    # Share the coordinates with a new pool of worker processes
+    if number_of_workers is None:
+        number_of_workers = os.cpu_count() or 1
+    n_of_points = len(latitudes)
+    shared_blocks = {}
+    shared_arrays = {}
+    for array_name, values in (
+        ("latitudes", latitudes),
+        ("longitudes", longitudes),
+        ("distances", numpy.zeros(n_of_points)),
+    ):
+        shared_blocks[array_name], shared_arrays[array_name] = Create_Shared_Array(
+            values
+        )
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=number_of_workers,
+        initializer=Attach_Shared_Arrays,
+        initargs=(
+            {
+                array_name: (shared_block.name, n_of_points)
+                for array_name, shared_block in shared_blocks.items()
+            },
+        ),
+    )
+    # Candidates are split into one contiguous shard per worker
+    shard_boundaries = numpy.linspace(
+        0, n_of_points, number_of_workers + 1
+    ).astype(int)
+    # Rows of the furthest pair search get shorter, so they are split by the number of pairs
+    n_of_pairs_before_row = numpy.cumsum(numpy.arange(n_of_points - 1, -1, -1))
+    row_boundaries = numpy.searchsorted(
+        n_of_pairs_before_row,
+        numpy.linspace(0, n_of_pairs_before_row[-1], number_of_workers + 1),
+    )
+    row_boundaries[0], row_boundaries[-1] = 0, max(n_of_points - 1, 0)
+    return {
+        "executor": executor,
+        "shared_blocks": shared_blocks,
+        "shared_arrays": shared_arrays,
+        "shard_boundaries": shard_boundaries.tolist(),
+        "row_boundaries": numpy.maximum.accumulate(row_boundaries).tolist(),
+    }
+
+
+def Stop_The_Worker_Pool(parallel_context):
+    # Shut the workers down and release the shared memory
+    parallel_context["executor"].shutdown()
+    parallel_context["shared_arrays"].clear()
+    for shared_block in parallel_context["shared_blocks"].values():
+        shared_block.close()
+        shared_block.unlink()
+
+
+def Calculate_Distances_From_Point_In_Parallel(
+    parallel_context, point_index, distance_model="ellipsoidal"
+):
+    # Distances in km from one point of the set to every point of the set
+    shard_boundaries = parallel_context["shard_boundaries"]
+    futures = [
+        parallel_context["executor"].submit(
+            Calculate_Shard_Of_Distances,
+            point_index,
+            shard_start,
+            shard_end,
+            distance_model,
+        )
+        for shard_start, shard_end in zip(shard_boundaries, shard_boundaries[1:])
+        if shard_end > shard_start
+    ]
+    for future in futures:
+        future.result()
+    # The workers do not see the metrics of this process, so their distances are counted here
+    distances = parallel_context["shared_arrays"]["distances"].copy()
+    Count_The_Event("distance_evaluations", len(distances))
+    return distances
+
+
+def Find_The_Furthest_Pair_In_Parallel(
+    parallel_context, distance_model="ellipsoidal"
+):
+    # Brute force search of the furthest pair with the rows split among the workers
+    row_boundaries = parallel_context["row_boundaries"]
+    futures = [
+        parallel_context["executor"].submit(
+            Find_The_Furthest_Pair_In_Rows, first_row, last_row, distance_model
+        )
+        for first_row, last_row in zip(row_boundaries, row_boundaries[1:])
+        if last_row > first_row
+    ]
+    # Strictly greater distance is needed to replace the result, as in the serial search
+    maximal_distance = 0
+    furthest_pair_indexes = ()
+    for future in futures:
+        shard_pair_indexes, shard_maximal_distance = future.result()
+        if shard_maximal_distance > maximal_distance:
+            maximal_distance = shard_maximal_distance
+            furthest_pair_indexes = shard_pair_indexes
+    n_of_points = len(parallel_context["shared_arrays"]["latitudes"])
+    Count_The_Event("distance_evaluations", n_of_points * (n_of_points - 1) // 2)
+    return furthest_pair_indexes, maximal_distance
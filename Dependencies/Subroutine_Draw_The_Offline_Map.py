@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+Functions drawing a compact offline map of the points on a canvas (without the Google Maps API).
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import json  # Selected points and level offsets embedded into the page
+import base64  # Packed coordinates embedded into the page
+import string  # Filling the page template
+import numpy  # Projecting, packing and decimating whole coordinate arrays at once
+
+# The gmplot map writes a scatter call for every point, so large point sets give pages of many
+# megabytes that the browser renders for minutes. The offline map embeds all points as one
+# packed payload - their Web Mercator coordinates within the bounding box of the dataset,
+# quantized to two unsigned 16-bit integers each and base64 encoded - and draws them on a
+# canvas with its own panning and zooming (no map tiles, no API key).
+# The points are ordered by the level of detail at which they appear. A level covers the
+# bounding box by a grid (twice as fine as the previous level) and the first point of each
+# occupied cell represents the cell from that level on. The points of the levels whose cells
+# are still large enough on the screen are a prefix of the payload, so each redraw only walks
+# this prefix - a zoomed out view shows one point per cell instead of all of them.
+
+# Renderers of the map, automatic one uses gmplot up to the given number of points
+MAP_RENDERERS = ("auto", "gmplot", "canvas")
+LARGEST_NUMBER_OF_GMPLOT_POINTS = 5000
+# Cells per side of the coarsest level and the finest level possible
+CELLS_PER_SIDE_OF_FIRST_LEVEL = 8
+MAXIMAL_NUMBER_OF_LEVELS = 20
+# Largest value of the quantized coordinates
+QUANTIZATION_STEPS = 65535
+# Colour of the selected points, the selections of the groups cycle through the palette
+# (only colours with a gmplot marker icon, so that both maps look the same)
+SELECTED_POINT_COLOR = "#FF0000"
+GROUP_MARKER_COLORS = (
+    "#FF0000",
+    "#0000FF",
+    "#008000",
+    "#800080",
+    "#FFA500",
+    "#8B4513",
+    "#008080",
+    "#696969",
+)
+
+OFFLINE_MAP_TEMPLATE = string.Template(
+    """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<style>
+html, body { margin: 0; height: 100%; overflow: hidden; font-family: sans-serif; }
+canvas { display: block; background: #f4f4f0; cursor: grab; }
+#status { position: absolute; left: 8px; bottom: 8px; padding: 2px 6px;
+  background: rgba(255, 255, 255, 0.8); font-size: 12px; }
+</style>
+</head>
+<body>
+<canvas id="map"></canvas>
+<div id="status"></div>
+<script>
+"use strict";
+// Bounding box in Web Mercator units, points per level and the selected points
+const BOX = $box;
+const LEVEL_ENDS = $level_ends;
+const FIRST_LEVEL_CELLS_PER_UNIT = $first_level_cells_per_unit;
+const STEPS = $steps;
+const SELECTED = $selected;
+const MIN_CELL_PIXELS = 3;
+const EARTH_CIRCUMFERENCE_M = 40075016.686;
+// Unpack the quantized coordinates (x and y of every point)
+const bytes = Uint8Array.from(atob("$payload"), function (c) { return c.charCodeAt(0); });
+const packed = new Uint16Array(bytes.buffer);
+const canvas = document.getElementById("map");
+const context = canvas.getContext("2d");
+const statusLine = document.getElementById("status");
+let scale = 1, offsetX = 0, offsetY = 0, dragStart = null;
+
+// Fit the bounding box of the points into the window
+function fit() {
+  const extent = Math.max(BOX.width, BOX.height, 1e-9);
+  scale = 0.9 * Math.min(canvas.width, canvas.height) / extent;
+  offsetX = (canvas.width - BOX.width * scale) / 2;
+  offsetY = (canvas.height - BOX.height * scale) / 2;
+}
+
+// Finest level whose cells are still large enough on the screen
+function visibleLevel() {
+  const level = Math.floor(Math.log2(scale / (FIRST_LEVEL_CELLS_PER_UNIT * MIN_CELL_PIXELS)));
+  return Math.max(0, Math.min(LEVEL_ENDS.length - 1, level));
+}
+
+// Length of the scale bar (a round number of metres about 100 pixels long)
+function drawScaleBar() {
+  const middleY = BOX.top + (canvas.height / 2 - offsetY) / scale;
+  const latitude = Math.atan(Math.sinh(Math.PI * (1 - 2 * middleY)));
+  const metresPerPixel = EARTH_CIRCUMFERENCE_M * Math.cos(latitude) / scale;
+  let metres = Math.pow(10, Math.floor(Math.log10(100 * metresPerPixel)));
+  if (5 * metres / metresPerPixel <= 100) { metres *= 5; }
+  else if (2 * metres / metresPerPixel <= 100) { metres *= 2; }
+  const pixels = metres / metresPerPixel;
+  context.fillStyle = "black";
+  context.fillRect(canvas.width - pixels - 10, canvas.height - 14, pixels, 3);
+  context.font = "12px sans-serif";
+  context.textAlign = "right";
+  context.fillText(metres >= 1000 ? metres / 1000 + " km" : metres + " m",
+    canvas.width - 10, canvas.height - 18);
+}
+
+function draw() {
+  context.clearRect(0, 0, canvas.width, canvas.height);
+  // Background points of the visible levels (only those within the window)
+  const end = LEVEL_ENDS[visibleLevel()];
+  const pointScaleX = BOX.width * scale / STEPS;
+  const pointScaleY = BOX.height * scale / STEPS;
+  let shown = 0;
+  context.fillStyle = "magenta";
+  for (let i = 0; i < end; i++) {
+    const x = offsetX + packed[2 * i] * pointScaleX;
+    const y = offsetY + packed[2 * i + 1] * pointScaleY;
+    if (x >= -2 && y >= -2 && x <= canvas.width + 2 && y <= canvas.height + 2) {
+      context.fillRect(x - 2, y - 2, 4, 4);
+      shown++;
+    }
+  }
+  // Numbered markers of the selected points
+  context.font = "bold 11px sans-serif";
+  context.textAlign = "center";
+  context.textBaseline = "middle";
+  SELECTED.forEach(function (point) {
+    const x = offsetX + point[0] * scale, y = offsetY + point[1] * scale;
+    context.fillStyle = point[5];
+    context.beginPath();
+    context.arc(x, y, 9, 0, 2 * Math.PI);
+    context.fill();
+    context.fillStyle = "white";
+    context.fillText(point[4], x, y);
+  });
+  context.textBaseline = "alphabetic";
+  drawScaleBar();
+  statusLine.textContent = shown + " of " + packed.length / 2 + " points shown"
+    + (end < packed.length / 2 ? " (zoom in for more)" : "");
+}
+
+function resize() {
+  canvas.width = window.innerWidth;
+  canvas.height = window.innerHeight;
+}
+
+// Zoom around the cursor, pan by dragging, describe the selected point under the cursor
+canvas.addEventListener("wheel", function (event) {
+  event.preventDefault();
+  const factor = Math.exp(-event.deltaY * 0.002);
+  offsetX = event.offsetX - (event.offsetX - offsetX) * factor;
+  offsetY = event.offsetY - (event.offsetY - offsetY) * factor;
+  scale *= factor;
+  draw();
+}, { passive: false });
+canvas.addEventListener("mousedown", function (event) {
+  dragStart = [event.offsetX - offsetX, event.offsetY - offsetY];
+  canvas.style.cursor = "grabbing";
+});
+window.addEventListener("mouseup", function () {
+  dragStart = null;
+  canvas.style.cursor = "grab";
+});
+canvas.addEventListener("mousemove", function (event) {
+  if (dragStart !== null) {
+    offsetX = event.offsetX - dragStart[0];
+    offsetY = event.offsetY - dragStart[1];
+    draw();
+    return;
+  }
+  canvas.title = "";
+  SELECTED.forEach(function (point) {
+    const x = offsetX + point[0] * scale, y = offsetY + point[1] * scale;
+    if (Math.hypot(event.offsetX - x, event.offsetY - y) <= 9) {
+      canvas.title = (point[6] === null ? "" : "Group: " + point[6] + " ")
+        + "Latitude: " + point[2].toFixed(5) + " Longitude: " + point[3].toFixed(5);
+    }
+  });
+});
+canvas.addEventListener("dblclick", function () { fit(); draw(); });
+window.addEventListener("resize", function () { resize(); draw(); });
+resize();
+fit();
+draw();
+</script>
+</body>
+</html>
+"""
+)
+
+
+def Choose_The_Map_Renderer(map_renderer, number_of_points):
+    # Renderer used for the map of the given number of points
+    if map_renderer not in MAP_RENDERERS:
+        raise ValueError(
+            f"Unknown map renderer '{map_renderer}'. Expected one of {MAP_RENDERERS}."
+        )
+    if map_renderer == "auto":
+        return (
+            "gmplot"
+            if number_of_points <= LARGEST_NUMBER_OF_GMPLOT_POINTS
+            else "canvas"
+        )
+    return map_renderer
+
+
+def Project_To_Web_Mercator(latitudes, longitudes):
+    # Web Mercator coordinates of the points (the whole world is a unit square, y points south)
+    latitudes = numpy.radians(numpy.clip(latitudes, -85.0511, 85.0511))
+    x = (numpy.asarray(longitudes, dtype=numpy.float64) + 180) / 360
+    y = (1 - numpy.arcsinh(numpy.tan(latitudes)) / numpy.pi) / 2
+    return x, y
+
+
+def Interleave_With_Zeros(cell_numbers):
+    # Bits of the (at most 32-bit) numbers spread apart by zero bits
+    cell_numbers = cell_numbers.astype(numpy.uint64)
+    for shift, mask in (
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ):
+        cell_numbers = (cell_numbers | (cell_numbers << numpy.uint64(shift))) & (
+            numpy.uint64(mask)
+        )
+    return cell_numbers
+
+
+def Find_The_Levels_Of_Detail(relative_x, relative_y):
+    # Coarsest level at which each point represents its cell (the coordinates are within [0, 1])
+    n_of_points = len(relative_x)
+    finest_level = MAXIMAL_NUMBER_OF_LEVELS - 1
+    cells_per_side = CELLS_PER_SIDE_OF_FIRST_LEVEL * 2**finest_level
+    cell_columns = numpy.minimum(
+        (relative_x * cells_per_side).astype(numpy.int64), cells_per_side - 1
+    )
+    cell_rows = numpy.minimum(
+        (relative_y * cells_per_side).astype(numpy.int64), cells_per_side - 1
+    )
+    # Cells of the finest level in the Z-order - the cells of every coarser level are then
+    # contiguous runs of the sorted points (dropping two lowest bits gives the coarser cell)
+    cell_codes = (Interleave_With_Zeros(cell_rows) << numpy.uint64(1)) | (
+        Interleave_With_Zeros(cell_columns)
+    )
+    point_order = numpy.argsort(cell_codes, kind="stable")
+    cell_codes = cell_codes[point_order]
+    point_levels = numpy.full(n_of_points, finest_level)
+    number_of_levels = MAXIMAL_NUMBER_OF_LEVELS
+    for level in range(MAXIMAL_NUMBER_OF_LEVELS):
+        level_codes = cell_codes >> numpy.uint64(2 * (finest_level - level))
+        cell_starts = numpy.flatnonzero(level_codes[1:] != level_codes[:-1]) + 1
+        cell_starts = numpy.concatenate(([0], cell_starts))
+        # The first point of a cell is also the first one of its part of the finer cells
+        first_points_of_cells = numpy.minimum.reduceat(point_order, cell_starts)
+        point_levels[first_points_of_cells] = numpy.minimum(
+            point_levels[first_points_of_cells], level
+        )
+        # All points are shown once each of them has its own cell
+        if len(cell_starts) == n_of_points:
+            number_of_levels = level + 1
+            break
+    return numpy.minimum(point_levels, number_of_levels - 1), number_of_levels
+
+
+def Find_The_Marker_Colors(number_of_selected_points, selected_groups=None):
+    # Colour of each selected point - one for all of them, or one per group (in the order
+    # in which the groups first appear)
+    if selected_groups is None:
+        return [SELECTED_POINT_COLOR] * number_of_selected_points
+    group_numbers = {}
+    for group in selected_groups:
+        group_numbers.setdefault(group, len(group_numbers))
+    return [
+        GROUP_MARKER_COLORS[group_numbers[group] % len(GROUP_MARKER_COLORS)]
+        for group in selected_groups
+    ]
+
+
+def Dump_The_Script_Json(value):
+    # JSON of the value that can be put inside a <script> element - the characters that
+    # could end the element (e.g. "</script>" in a name or group) are written as escapes
+    return (
+        json.dumps(value)
+        .replace("<", "\\u003c")
+        .replace(">", "\\u003e")
+        .replace("&", "\\u0026")
+    )
+
+
+def Draw_The_Offline_Map(
+    path_to_map,
+    latitudes,
+    longitudes,
+    selected_latitudes,
+    selected_longitudes,
+    selected_labels=None,
+    selected_groups=None,
+):
+    # Write the page with all points and the numbered selected points (in the route order)
+    # The selected points are labelled by their order unless their labels are given, the points
+    # of each of the optional groups have their own colour
+    x, y = Project_To_Web_Mercator(latitudes, longitudes)
+    left, top = float(x.min()), float(y.min())
+    width, height = float(x.max()) - left, float(y.max()) - top
+    # Coordinates within the bounding box (relative to its longer side for the levels)
+    relative_x = (x - left) / width if width > 0 else numpy.zeros_like(x)
+    relative_y = (y - top) / height if height > 0 else numpy.zeros_like(y)
+    longer_side = max(width, height)
+    point_levels, number_of_levels = Find_The_Levels_Of_Detail(
+        (x - left) / longer_side if longer_side > 0 else relative_x,
+        (y - top) / longer_side if longer_side > 0 else relative_y,
+    )
+    # Points ordered by their levels, the points of each level end where the next one starts
+    point_order = numpy.argsort(point_levels, kind="stable")
+    level_ends = numpy.searchsorted(
+        point_levels[point_order], numpy.arange(number_of_levels), side="right"
+    )
+    packed_points = numpy.column_stack(
+        (relative_x[point_order], relative_y[point_order])
+    )
+    packed_points = numpy.rint(packed_points * QUANTIZATION_STEPS).astype("<u2")
+    selected_x, selected_y = Project_To_Web_Mercator(
+        selected_latitudes, selected_longitudes
+    )
+    if selected_labels is None:
+        selected_labels = [str(number) for number in range(1, len(selected_x) + 1)]
+    selected_points = [
+        [
+            round(float(point_x) - left, 12),
+            round(float(point_y) - top, 12),
+            float(latitude),
+            float(longitude),
+            label,
+            color,
+            None if selected_groups is None else str(selected_groups[index]),
+        ]
+        for index, (point_x, point_y, latitude, longitude, label, color) in enumerate(
+            zip(
+                selected_x,
+                selected_y,
+                selected_latitudes,
+                selected_longitudes,
+                selected_labels,
+                Find_The_Marker_Colors(len(selected_x), selected_groups),
+            )
+        )
+    ]
+    page = OFFLINE_MAP_TEMPLATE.substitute(
+        title="Selected points",
+        box=Dump_The_Script_Json(
+            {"left": left, "top": top, "width": width, "height": height}
+        ),
+        level_ends=Dump_The_Script_Json(level_ends.tolist()),
+        first_level_cells_per_unit=CELLS_PER_SIDE_OF_FIRST_LEVEL
+        / max(longer_side, 1e-12),
+        steps=QUANTIZATION_STEPS,
+        selected=Dump_The_Script_Json(selected_points),
+        payload=base64.b64encode(packed_points.tobytes()).decode("ascii"),
+    )
+    with open(path_to_map, "w", encoding="utf-8") as map_file:
+        map_file.write(page)
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Functions incrementally selecting uniformly spaced points using running distance statistics.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import numpy  # Running sums over whole candidate arrays
+
+from Dependencies.Class_Implementing_Selection_Metrics import Count_The_Event
+
+from Dependencies.Subroutine_Calculate_Distances import (
+    Calculate_Distances,
+    Calculate_Distances_From_Point,
+)
+from Dependencies.Subroutine_Calculate_Distances_In_Parallel import (
+    Calculate_Distances_From_Point_In_Parallel,
+)
+from Dependencies.Subroutine_Cache_Distance_Matrix import (
+    Get_Cache_Key,
+    Get_Distances_From_Condensed_Matrix,
+)
+from Dependencies.Subroutine_Project_To_Local_Frame import (
+    Calculate_Projected_Distances_From_Point,
+)
+
+# A candidate is scored by the standard deviation of all pairwise distances within the
+# already selected points extended by the candidate. Between two steps only the distances
+# from the candidates to the newest selected point are new, so the sums and sums of squares
+# of the distances are kept for every candidate and for the selected points themselves.
+# The distances are shifted by half of the largest distance to reduce the rounding errors
+# of the closed-form variance.
+# The selection is deterministic, so the selection of k points is a prefix of the selection
+# of k+1 points and a (saved) selection state can be extended later on.
+# With the approximate distance model the candidates are scored by the approximate distances.
+# Each distance is off by at most its relative error bound, which moves the score by at most
+# the bound times the largest distance. Only the candidates whose score is that close to the
+# best one are scored again by the ellipsoidal distances (the sums of the ellipsoidal
+# distances between the selected points are kept for that) and the best of them is selected.
+
+# Selection strategies - the uniform spacing of this module and the farthest-point sampling
+SELECTION_MODES = ("uniform_spacing", "furthest_point")
+
+
+def Get_Distances_From_Point(
+    latitudes,
+    longitudes,
+    point_index,
+    distance_model,
+    condensed_distance_matrix=None,
+    parallel_context=None,
+    projected_points=None,
+):
+    # Take the distances from the cached matrix if there is one, otherwise calculate them
+    if condensed_distance_matrix is not None:
+        return Get_Distances_From_Condensed_Matrix(
+            condensed_distance_matrix, len(latitudes), point_index
+        )
+    # Approximate distances are measured between the points projected beforehand
+    if projected_points is not None:
+        return Calculate_Projected_Distances_From_Point(projected_points, point_index)
+    # The calculation can be split among the workers of a pool
+    if parallel_context is not None:
+        return Calculate_Distances_From_Point_In_Parallel(
+            parallel_context, point_index, distance_model
+        )
+    return Calculate_Distances_From_Point(
+        latitudes, longitudes, point_index, distance_model
+    )
+
+
+def Add_Selected_Point(selection_state, point_index, point_distances):
+    # Distances from the new point to the already selected ones become a part of the fixed pairs
+    distance_shift = selection_state["distance_shift"]
+    selection_state["pair_count"] += len(selection_state["selected_indexes"])
+    selection_state["pair_distance_sum"] += selection_state["distance_sums"][point_index]
+    selection_state["pair_squared_distance_sum"] += selection_state[
+        "squared_distance_sums"
+    ][point_index]
+    # Distances from each candidate to the new point are added to the candidate sums
+    shifted_distances = point_distances - distance_shift
+    selection_state["distance_sums"] += shifted_distances
+    selection_state["squared_distance_sums"] += shifted_distances**2
+    # Mark the point as selected
+    selection_state["selected_indexes"].append(int(point_index))
+    selection_state["is_available"][point_index] = False
+
+
+def Add_Exact_Pair_Distances(selection_state, latitudes, longitudes, point_index):
+    # Ellipsoidal distances from the new point to the already selected ones (approximate model)
+    selected_indexes = selection_state["selected_indexes"]
+    shifted_distances = (
+        Calculate_Distances(
+            latitudes[selected_indexes],
+            longitudes[selected_indexes],
+            latitudes[point_index],
+            longitudes[point_index],
+        )
+        - selection_state["distance_shift"]
+    )
+    selection_state["exact_pair_distance_sum"] += float(numpy.sum(shifted_distances))
+    selection_state["exact_pair_squared_distance_sum"] += float(
+        numpy.sum(shifted_distances**2)
+    )
+
+
+def Start_The_Selection(
+    latitudes,
+    longitudes,
+    furthest_pair_indexes,
+    maximal_distance,
+    distance_model="ellipsoidal",
+    condensed_distance_matrix=None,
+    parallel_context=None,
+    projected_points=None,
+    approximation_error=0.0,
+):
+    # Create the selection state holding the running statistics, seeded by the furthest pair
+    n_of_points = len(latitudes)
+    selection_state = {
+        "selected_indexes": [],
+        "is_available": numpy.ones(n_of_points, dtype=bool),
+        "distance_shift": maximal_distance / 2,
+        "distance_sums": numpy.zeros(n_of_points),
+        "squared_distance_sums": numpy.zeros(n_of_points),
+        "pair_count": 0,
+        "pair_distance_sum": 0.0,
+        "pair_squared_distance_sum": 0.0,
+        "distance_model": distance_model,
+        # Identifies the point set, so that the state is not extended over different points
+        "points_key": Get_Cache_Key(latitudes, longitudes, distance_model),
+        "selection_mode": "uniform_spacing",
+    }
+    # Approximate distances are refined by the ellipsoidal ones (within their error bound)
+    if distance_model == "approximate":
+        selection_state.update(
+            approximation_error=approximation_error,
+            exact_pair_distance_sum=0.0,
+            exact_pair_squared_distance_sum=0.0,
+        )
+    for point_index in furthest_pair_indexes:
+        if distance_model == "approximate":
+            Add_Exact_Pair_Distances(selection_state, latitudes, longitudes, point_index)
+        Add_Selected_Point(
+            selection_state,
+            point_index,
+            Get_Distances_From_Point(
+                latitudes,
+                longitudes,
+                point_index,
+                distance_model,
+                condensed_distance_matrix,
+                parallel_context,
+                projected_points,
+            ),
+        )
+    return selection_state
+
+
+def Calculate_Standard_Deviations(selection_state):
+    # Closed-form standard deviation of the pairwise distances for each candidate
+    n_of_distances = selection_state["pair_count"] + len(
+        selection_state["selected_indexes"]
+    )
+    means = (
+        selection_state["pair_distance_sum"] + selection_state["distance_sums"]
+    ) / n_of_distances
+    variances = (
+        selection_state["pair_squared_distance_sum"]
+        + selection_state["squared_distance_sums"]
+    ) / n_of_distances - means**2
+    # Rounding errors could make a zero variance slightly negative
+    return numpy.sqrt(numpy.maximum(variances, 0))
+
+
+def Find_The_Score_Margin(selection_state):
+    # Scores of two candidates differ by at most twice the error of each of them
+    largest_distance = 2 * selection_state["distance_shift"]
+    approximation_error = selection_state["approximation_error"]
+    return 2 * approximation_error * largest_distance * (1 + approximation_error)
+
+
+def Refine_The_Optimal_Point(
+    selection_state, latitudes, longitudes, standard_deviations
+):
+    # Best candidate by the ellipsoidal distances among those the approximation can not tell apart
+    candidate_indexes = numpy.flatnonzero(
+        standard_deviations
+        <= numpy.min(standard_deviations) + Find_The_Score_Margin(selection_state)
+    )
+    return Refine_Among_The_Candidates(
+        selection_state, latitudes, longitudes, candidate_indexes
+    )
+
+
+def Refine_Among_The_Candidates(
+    selection_state, latitudes, longitudes, candidate_indexes
+):
+    # Best of the given candidates by the ellipsoidal distances
+    if len(candidate_indexes) == 1:
+        return int(candidate_indexes[0])
+    selected_indexes = selection_state["selected_indexes"]
+    # (measured from the selected points, like the distances of the exact selection)
+    shifted_distances = (
+        Calculate_Distances(
+            latitudes[selected_indexes, numpy.newaxis],
+            longitudes[selected_indexes, numpy.newaxis],
+            latitudes[numpy.newaxis, candidate_indexes],
+            longitudes[numpy.newaxis, candidate_indexes],
+        )
+        - selection_state["distance_shift"]
+    )
+    n_of_distances = selection_state["pair_count"] + len(selected_indexes)
+    means = (
+        selection_state["exact_pair_distance_sum"] + shifted_distances.sum(axis=0)
+    ) / n_of_distances
+    variances = (
+        selection_state["exact_pair_squared_distance_sum"]
+        + (shifted_distances**2).sum(axis=0)
+    ) / n_of_distances - means**2
+    return int(candidate_indexes[numpy.argmin(numpy.maximum(variances, 0))])
+
+
+def Extend_The_Selection(
+    selection_state,
+    latitudes,
+    longitudes,
+    how_many_points_to_find,
+    condensed_distance_matrix=None,
+    parallel_context=None,
+    progress_callback=None,
+    projected_points=None,
+):
+    # Look for points until specified number has been found
+    distance_model = selection_state["distance_model"]
+    while len(selection_state["selected_indexes"]) < how_many_points_to_find:
+        if not selection_state["is_available"].any():
+            break
+        standard_deviations = Calculate_Standard_Deviations(selection_state)
+        Count_The_Event(
+            "candidate_rows_scored",
+            len(standard_deviations) - len(selection_state["selected_indexes"]),
+        )
+        # Already selected points can not be chosen again
+        standard_deviations[~selection_state["is_available"]] = numpy.inf
+        # Find optimal index - optimal in a sense of representing minimal standard deviation
+        optimal_point_index = int(numpy.argmin(standard_deviations))
+        if distance_model == "approximate":
+            optimal_point_index = Refine_The_Optimal_Point(
+                selection_state, latitudes, longitudes, standard_deviations
+            )
+            Add_Exact_Pair_Distances(
+                selection_state, latitudes, longitudes, optimal_point_index
+            )
+        # Only the distances to the newly selected point are calculated
+        Add_Selected_Point(
+            selection_state,
+            optimal_point_index,
+            Get_Distances_From_Point(
+                latitudes,
+                longitudes,
+                optimal_point_index,
+                distance_model,
+                condensed_distance_matrix,
+                parallel_context,
+                projected_points,
+            ),
+        )
+        # Report the number of points selected so far (the state is consistent at this moment)
+        if progress_callback is not None:
+            progress_callback(
+                "selection",
+                len(selection_state["selected_indexes"]),
+                how_many_points_to_find,
+            )
+    return selection_state["selected_indexes"]
+
+
+def Is_The_Selection_State_Valid(
+    selection_state,
+    latitudes,
+    longitudes,
+    distance_model="ellipsoidal",
+    selection_mode="uniform_spacing",
+):
+    # Check whether the state was created for the same points, distance model and selection mode
+    return (
+        bool(selection_state)
+        and selection_state.get("selection_mode", "uniform_spacing") == selection_mode
+        and selection_state["points_key"]
+        == Get_Cache_Key(latitudes, longitudes, distance_model)
+    )
+
+
+def Save_The_Selection_State(selection_state, path_to_state_file):
+    # Store the state as a .npz file (without pickling) to be able to resume the selection later
+    # Arrays are stored as they are, numbers and strings as arrays without dimensions
+    numpy.savez(
+        path_to_state_file,
+        **{
+            key: numpy.array(value, dtype=numpy.int64)
+            if key == "selected_indexes"
+            else numpy.asarray(value)
+            for key, value in selection_state.items()
+        },
+    )
+
+
+def Load_The_Selection_State(path_to_state_file):
+    # Restore the state saved by Save_The_Selection_State
+    selection_state = {}
+    with numpy.load(path_to_state_file) as state_file:
+        for key in state_file.files:
+            value = state_file[key]
+            if key == "selected_indexes":
+                selection_state[key] = value.tolist()
+            elif value.ndim > 0:
+                selection_state[key] = value.copy()
+            elif value.dtype.kind == "U":
+                selection_state[key] = str(value)
+            else:
+                selection_state[key] = value.item()
+    return selection_state
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+Functions finding the two geographical points that are furthest apart.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import numpy  # Working with coordinate arrays
+
+from Dependencies.Subroutine_Calculate_Distances import Calculate_Distances
+from Dependencies.Subroutine_Calculate_Distances_In_Parallel import (
+    Find_The_Furthest_Pair_In_Parallel,
+)
+
+# Names of the supported search methods
+FURTHEST_PAIR_METHODS = ("convex_hull", "brute_force")
+# Largest extent of the points (in degrees) for which the planar projection is trusted
+MAXIMAL_LATITUDE_SPAN = 30
+MAXIMAL_LONGITUDE_SPAN = 60
+MAXIMAL_ABSOLUTE_LATITUDE = 80
+# Up to this number of hull vertices all their pairs are refined, above it only antipodal ones
+MAXIMAL_HULL_SIZE_FOR_ALL_PAIRS = 2048
+
+
+def Find_The_Furthest_Pair_By_Brute_Force(
+    latitudes,
+    longitudes,
+    distance_model="ellipsoidal",
+    parallel_context=None,
+    progress_callback=None,
+):
+    # The rows can be split among the workers of a pool
+    if parallel_context is not None:
+        return Find_The_Furthest_Pair_In_Parallel(parallel_context, distance_model)
+    # Compare every point with all the following points - distances of one row are calculated at once
+    n_of_points = len(latitudes)
+    maximal_distance = 0
+    furthest_pair_indexes = ()
+    # The progress is reported as the number of compared pairs about every 1 % of the rows
+    n_of_pairs = n_of_points * (n_of_points - 1) // 2
+    progress_step = max(1, n_of_points // 100)
+    for first_point_index in range(n_of_points - 1):
+        if progress_callback is not None and first_point_index % progress_step == 0:
+            progress_callback(
+                "seed",
+                first_point_index * (2 * n_of_points - first_point_index - 1) // 2,
+                n_of_pairs,
+            )
+        point_distances = Calculate_Distances(
+            latitudes[first_point_index],
+            longitudes[first_point_index],
+            latitudes[first_point_index + 1 :],
+            longitudes[first_point_index + 1 :],
+            distance_model,
+        )
+        furthest_point_offset = numpy.argmax(point_distances)
+        if point_distances[furthest_point_offset] > maximal_distance:
+            maximal_distance = point_distances[furthest_point_offset]
+            furthest_pair_indexes = (
+                first_point_index,
+                first_point_index + 1 + int(furthest_point_offset),
+            )
+    return furthest_pair_indexes, maximal_distance
+
+
+def Find_The_Longitude_Offsets(longitudes, middle_longitude):
+    # Longitudes unwrapped around the middle longitude (in degrees)
+    return (longitudes - middle_longitude + 180) % 360 - 180
+
+
+def Is_The_Area_Projectable(
+    latitude_span, longitude_span, largest_absolute_latitude
+):
+    # Whether the points cover small enough area for the projection to keep the hull intact
+    return (
+        latitude_span <= MAXIMAL_LATITUDE_SPAN
+        and longitude_span <= MAXIMAL_LONGITUDE_SPAN
+        and largest_absolute_latitude <= MAXIMAL_ABSOLUTE_LATITUDE
+    )
+
+
+def Project_To_Plane(latitudes, longitudes):
+    # Equirectangular projection around the mean point, longitudes are unwrapped around the mean
+    # Returns None if the points cover too large area for the projection to keep the hull intact
+    latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+    longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+    middle_longitude = numpy.degrees(
+        numpy.arctan2(
+            numpy.sin(numpy.radians(longitudes)).mean(),
+            numpy.cos(numpy.radians(longitudes)).mean(),
+        )
+    )
+    longitude_offsets = Find_The_Longitude_Offsets(longitudes, middle_longitude)
+    if not Is_The_Area_Projectable(
+        numpy.ptp(latitudes),
+        numpy.ptp(longitude_offsets),
+        numpy.abs(latitudes).max(),
+    ):
+        return None
+    middle_latitude = (latitudes.min() + latitudes.max()) / 2
+    x_coordinates = longitude_offsets * numpy.cos(numpy.radians(middle_latitude))
+    y_coordinates = latitudes
+    return x_coordinates, y_coordinates
+
+
+def Is_Inside_The_Extreme_Points(x_coordinates, y_coordinates, extreme_points):
+    # Points lying strictly inside the quadrilateral of the extreme points (Akl-Toussaint)
+    # The extreme points are given as (index, x, y) in the order of the quadrilateral
+    # (if all of them are the same point, there is no edge and nothing lies inside)
+    if len({extreme_point[0] for extreme_point in extreme_points}) == 1:
+        return numpy.zeros(len(x_coordinates), dtype=bool)
+    is_inside = numpy.ones(len(x_coordinates), dtype=bool)
+    for (start_index, start_x, start_y), (end_index, end_x, end_y) in zip(
+        extreme_points, extreme_points[1:] + extreme_points[:1]
+    ):
+        # Coinciding extreme points do not define an edge
+        if start_index == end_index:
+            continue
+        is_inside &= (end_x - start_x) * (y_coordinates - start_y) - (
+            end_y - start_y
+        ) * (x_coordinates - start_x) > 0
+    return is_inside
+
+
+def Find_Convex_Hull(x_coordinates, y_coordinates):
+    # Andrew's monotone chain - returns indexes of hull vertices in counter-clockwise order
+    # Discard points lying strictly inside the quadrilateral of the extreme points first
+    extreme_points = [
+        (index, x_coordinates[index], y_coordinates[index])
+        for index in (
+            numpy.argmin(x_coordinates),
+            numpy.argmin(y_coordinates),
+            numpy.argmax(x_coordinates),
+            numpy.argmax(y_coordinates),
+        )
+    ]
+    candidate_indexes = numpy.flatnonzero(
+        ~Is_Inside_The_Extreme_Points(x_coordinates, y_coordinates, extreme_points)
+    )
+    return Find_Convex_Hull_Of_Candidates(
+        x_coordinates[candidate_indexes],
+        y_coordinates[candidate_indexes],
+        candidate_indexes,
+    )
+
+
+def Find_The_Collinearity_Tolerance(x_extent, y_extent):
+    # Cross product still considered zero for the points of the given extent
+    return 1e-12 * max(x_extent, y_extent) ** 2
+
+
+def Find_Convex_Hull_Of_Candidates(
+    x_candidates, y_candidates, candidate_indexes, tolerance=None
+):
+    # Hull of the points left by the extreme points filter (given with their indexes)
+    # Collinear points on the hull edges are kept, as they can also be a part of the furthest pair
+    # Sort the candidates by x and then by y (stable, so duplicates keep the lower index first)
+    candidate_order = numpy.lexsort((y_candidates, x_candidates))
+    points = list(
+        zip(
+            x_candidates[candidate_order].tolist(),
+            y_candidates[candidate_order].tolist(),
+            numpy.asarray(candidate_indexes)[candidate_order].tolist(),
+        )
+    )
+    # Drop repeated coordinates (the lowest index of identical points is kept)
+    unique_points = [points[0]]
+    for point in points[1:]:
+        if point[:2] != unique_points[-1][:2]:
+            unique_points.append(point)
+    if len(unique_points) < 3:
+        return [point[2] for point in unique_points]
+
+    # Points that are collinear up to the rounding errors of the projection are kept as well
+    # (the tolerance of a subset of the points is given by the extent of all of them)
+    if tolerance is None:
+        tolerance = Find_The_Collinearity_Tolerance(
+            numpy.ptp(x_candidates), numpy.ptp(y_candidates)
+        )
+
+    def cross(origin, first, second):
+        return (first[0] - origin[0]) * (second[1] - origin[1]) - (
+            first[1] - origin[1]
+        ) * (second[0] - origin[0])
+
+    # Build the lower and upper part of the hull
+    lower_hull = []
+    for point in unique_points:
+        while (
+            len(lower_hull) >= 2
+            and cross(lower_hull[-2], lower_hull[-1], point) < -tolerance
+        ):
+            lower_hull.pop()
+        lower_hull.append(point)
+    upper_hull = []
+    for point in reversed(unique_points):
+        while (
+            len(upper_hull) >= 2
+            and cross(upper_hull[-2], upper_hull[-1], point) < -tolerance
+        ):
+            upper_hull.pop()
+        upper_hull.append(point)
+    hull = lower_hull[:-1] + upper_hull[:-1]
+    # If all the points are collinear, both parts contain the same points
+    hull_indexes = list(dict.fromkeys(point[2] for point in hull))
+    return hull_indexes
+
+
+def Find_Antipodal_Pairs(x_coordinates, y_coordinates, hull_indexes):
+    # Rotating calipers - pairs of hull vertices which admit parallel supporting lines
+    hull_x = x_coordinates[hull_indexes].tolist()
+    hull_y = y_coordinates[hull_indexes].tolist()
+
+    def area(first, second, third):
+        return abs(
+            (hull_x[second] - hull_x[first]) * (hull_y[third] - hull_y[first])
+            - (hull_y[second] - hull_y[first]) * (hull_x[third] - hull_x[first])
+        )
+
+    # The calipers need strictly convex polygon - skip the vertices lying on the hull edges
+    tolerance = 1e-12 * max(numpy.ptp(hull_x), numpy.ptp(hull_y)) ** 2
+    n_of_vertices = len(hull_indexes)
+    convex_positions = [
+        position
+        for position in range(n_of_vertices)
+        if area(position - 1, position, (position + 1) % n_of_vertices) > tolerance
+    ]
+    # Collinear points form a degenerate hull - its first vertex is one end of the segment
+    if len(convex_positions) < 3:
+        return [(hull_indexes[0], index) for index in hull_indexes[1:]]
+    hull_indexes = [hull_indexes[position] for position in convex_positions]
+    hull_x = [hull_x[position] for position in convex_positions]
+    hull_y = [hull_y[position] for position in convex_positions]
+    n_of_vertices = len(hull_indexes)
+    if n_of_vertices == 3:
+        return [
+            (hull_indexes[0], hull_indexes[1]),
+            (hull_indexes[0], hull_indexes[2]),
+            (hull_indexes[1], hull_indexes[2]),
+        ]
+
+    antipodal_pairs = set()
+    opposite = 1
+    for current in range(n_of_vertices):
+        following = (current + 1) % n_of_vertices
+        # Move the opposite vertex while it gets further from the current edge
+        while area(current, following, (opposite + 1) % n_of_vertices) > area(
+            current, following, opposite
+        ):
+            opposite = (opposite + 1) % n_of_vertices
+        antipodal_pairs.add((current, opposite))
+        antipodal_pairs.add((following, opposite))
+        # Edges parallel to the current edge make the next vertex antipodal as well
+        next_opposite = (opposite + 1) % n_of_vertices
+        if area(current, following, next_opposite) == area(
+            current, following, opposite
+        ):
+            antipodal_pairs.add((current, next_opposite))
+            antipodal_pairs.add((following, next_opposite))
+    return [
+        (hull_indexes[first], hull_indexes[second])
+        for first, second in antipodal_pairs
+        if first != second
+    ]
+
+
+def Find_Identical_Points(latitudes, longitudes, point_indexes, block_size=None):
+    # For each of the given points find all the points with exactly the same coordinates
+    # (the points are searched block by block if the block size is given)
+    identical_points = {}
+    point_coordinates = {
+        (latitudes[index], longitudes[index]): index for index in point_indexes
+    }
+    point_latitudes = latitudes[list(point_indexes)]
+    block_size = block_size or max(len(latitudes), 1)
+    for block_start in range(0, len(latitudes), block_size):
+        # Only the points sharing the latitude with some of the given points need to be checked
+        for index in (
+            numpy.flatnonzero(
+                numpy.isin(
+                    latitudes[block_start : block_start + block_size], point_latitudes
+                )
+            )
+            + block_start
+        ).tolist():
+            coordinates = (latitudes[index], longitudes[index])
+            if coordinates in point_coordinates:
+                identical_points.setdefault(point_coordinates[coordinates], []).append(
+                    index
+                )
+    return identical_points
+
+
+def Find_The_Candidate_Pairs(hull_x, hull_y, hull_indexes):
+    # Pairs of hull vertices to be measured - all of them for smaller hulls, antipodal pairs
+    # for larger ones (the coordinates are given for the hull vertices only)
+    if len(hull_indexes) <= MAXIMAL_HULL_SIZE_FOR_ALL_PAIRS:
+        first_positions, second_positions = numpy.triu_indices(len(hull_indexes), k=1)
+        return numpy.array(hull_indexes)[
+            numpy.stack((first_positions, second_positions), axis=1)
+        ]
+    return numpy.array(hull_indexes)[
+        numpy.array(
+            Find_Antipodal_Pairs(hull_x, hull_y, list(range(len(hull_indexes)))),
+            dtype=numpy.int64,
+        ).reshape(-1, 2)
+    ]
+
+
+def Measure_The_Candidate_Pairs(
+    latitudes, longitudes, candidate_pairs, identical_points, distance_model
+):
+    # The furthest of the candidate pairs and its distance (no pair if all points coincide)
+    # Copies of the hull vertices are candidates as well, so that the ties are resolved like in brute force
+    if any(len(indexes) > 1 for indexes in identical_points.values()):
+        candidate_pairs = numpy.array(
+            [
+                (first_index, second_index)
+                for first_vertex, second_vertex in candidate_pairs.tolist()
+                for first_index in identical_points[first_vertex]
+                for second_index in identical_points[second_vertex]
+            ]
+        )
+    # Order each pair and all pairs the same way as the brute force search does, so ties are resolved alike
+    candidate_pairs = numpy.sort(candidate_pairs, axis=1)
+    candidate_pairs = candidate_pairs[
+        numpy.lexsort((candidate_pairs[:, 1], candidate_pairs[:, 0]))
+    ]
+    # The few candidate pairs of the approximate model are measured exactly (ellipsoidal)
+    pair_distances = Calculate_Distances(
+        latitudes[candidate_pairs[:, 0]],
+        longitudes[candidate_pairs[:, 0]],
+        latitudes[candidate_pairs[:, 1]],
+        longitudes[candidate_pairs[:, 1]],
+        "ellipsoidal" if distance_model == "approximate" else distance_model,
+    )
+    furthest_pair_position = numpy.argmax(pair_distances)
+    maximal_distance = pair_distances[furthest_pair_position]
+    if maximal_distance <= 0:
+        return (), 0
+    furthest_pair_indexes = tuple(
+        int(index) for index in candidate_pairs[furthest_pair_position]
+    )
+    return furthest_pair_indexes, maximal_distance
+
+
+def Find_The_Furthest_Pair(
+    latitudes,
+    longitudes,
+    distance_model="ellipsoidal",
+    method="convex_hull",
+    parallel_context=None,
+    progress_callback=None,
+):
+    # Find two points and their indexes that are furthest apart - maximal distance between them
+    # (the optional callback receives the stage name, the finished and the total amount of work)
+    if method not in FURTHEST_PAIR_METHODS:
+        raise ValueError(
+            f"Unknown furthest pair method '{method}'. Expected one of {FURTHEST_PAIR_METHODS}."
+        )
+    latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+    longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+    projected_coordinates = Project_To_Plane(latitudes, longitudes)
+    # The furthest pair lies on the convex hull - use it unless the area is too large to be projected
+    if method == "brute_force" or projected_coordinates is None:
+        return Find_The_Furthest_Pair_By_Brute_Force(
+            latitudes, longitudes, distance_model, parallel_context, progress_callback
+        )
+    x_coordinates, y_coordinates = projected_coordinates
+    hull_indexes = Find_Convex_Hull(x_coordinates, y_coordinates)
+    # Geodesic refinement - all pairs of hull vertices for smaller hulls, antipodal pairs for larger ones
+    candidate_pairs = Find_The_Candidate_Pairs(
+        x_coordinates[hull_indexes], y_coordinates[hull_indexes], hull_indexes
+    )
+    if len(candidate_pairs) == 0:
+        return (), 0
+    furthest_pair_indexes, maximal_distance = Measure_The_Candidate_Pairs(
+        latitudes,
+        longitudes,
+        candidate_pairs,
+        Find_Identical_Points(
+            latitudes, longitudes, numpy.unique(candidate_pairs).tolist()
+        ),
+        distance_model,
+    )
+    if not furthest_pair_indexes:
+        return (), 0
+    return furthest_pair_indexes, maximal_distance
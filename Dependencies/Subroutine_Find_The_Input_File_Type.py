@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Function finding the type of an input file by its extension.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import os  # Working with file extensions
+
+# The supported types are described apart from their readers, so that the app can offer them
+# in the file dialog without importing the readers (and the numerical libraries they need).
+
+# Supported file types and their extensions
+INPUT_FILE_EXTENSIONS = {
+    "excel": (".xlsx", ".xlsm"),
+    "csv": (".csv", ".txt"),
+    "parquet": (".parquet", ".geoparquet"),
+    "geojson": (".geojson", ".json"),
+}
+SUPPORTED_FILE_EXTENSIONS = tuple(
+    extension
+    for extensions in INPUT_FILE_EXTENSIONS.values()
+    for extension in extensions
+)
+# Extensions of files that are marked by a modified copy of the Excel file itself
+EXCEL_FILE_EXTENSIONS = INPUT_FILE_EXTENSIONS["excel"]
+# File types offered by the file dialog
+INPUT_FILE_TYPES = (
+    (
+        "All supported files",
+        tuple("*" + extension for extension in SUPPORTED_FILE_EXTENSIONS),
+    ),
+    ("Excel files", ("*.xlsx", "*.xlsm")),
+    ("CSV files", ("*.csv", "*.txt")),
+    ("Parquet files", ("*.parquet", "*.geoparquet")),
+    ("GeoJSON files", ("*.geojson", "*.json")),
+)
+
+
+def Find_The_Input_File_Type(path_to_input_file):
+    # Type of the file by its extension (ValueError if the type is not supported)
+    file_extension = os.path.splitext(path_to_input_file)[1].lower()
+    for file_type, extensions in INPUT_FILE_EXTENSIONS.items():
+        if file_extension in extensions:
+            return file_type
+    raise ValueError(
+        f'Unsupported input file type "{file_extension}". Supported types are: '
+        + ", ".join(SUPPORTED_FILE_EXTENSIONS)
+    )
@@ -0,0 +1,812 @@
+# -*- coding: utf-8 -*-
+"""
+Functions selecting the points block by block, for point sets larger than the memory.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import numpy  # Blocks of the coordinate and working arrays
+
+from Dependencies.Class_Implementing_Selection_Metrics import (
+    Count_The_Event,
+    Measure_The_Stage,
+)
+from Dependencies.Class_Implementing_Spatial_Index import (
+    Convert_Distance_To_Chord,
+    Convert_To_Unit_Vectors,
+    Get_The_Search_Radius,
+)
+from Dependencies.Subroutine_Calculate_Distances import Calculate_Distances
+from Dependencies.Subroutine_Extend_The_Selection import (
+    SELECTION_MODES,
+    Add_Exact_Pair_Distances,
+    Find_The_Score_Margin,
+    Refine_Among_The_Candidates,
+)
+from Dependencies.Subroutine_Find_The_Furthest_Pair import (
+    FURTHEST_PAIR_METHODS,
+    Find_Convex_Hull_Of_Candidates,
+    Find_The_Collinearity_Tolerance,
+    Find_Identical_Points,
+    Find_The_Candidate_Pairs,
+    Find_The_Longitude_Offsets,
+    Is_Inside_The_Extreme_Points,
+    Is_The_Area_Projectable,
+    Measure_The_Candidate_Pairs,
+)
+from Dependencies.Subroutine_Project_To_Local_Frame import (
+    MAXIMAL_APPROXIMATION_ERROR,
+    Calculate_Projected_Distances,
+    Estimate_The_Approximation_Error,
+    Find_The_Local_Frame,
+    Is_The_Approximation_Accepted,
+    Project_Into_The_Local_Frame,
+)
+from Dependencies.Subroutine_Sample_The_Furthest_Points import (
+    Find_The_Distance_Margin,
+    Refine_Among_The_Furthest_Candidates,
+)
+from Dependencies.Subroutine_Store_The_Coordinates import (
+    Create_The_Stored_Array,
+    Store_The_Coordinates,
+)
+
+# The coordinates and the running statistics of the candidates live in memory-mapped files,
+# only the temporary arrays of one block of points are held in memory at a time, so the
+# block size follows from the memory limit. The passes are the same as those of the
+# in-memory selection and every value of a point is calculated by the same operations,
+# so both modes select exactly the same points:
+# - the furthest pair filters the points by the extreme points of the projection block by
+#   block (or compares every pair block by block if the area can not be projected),
+# - the uniform spacing adds the distances to the new point to the sums of each block and
+#   scores the block right away (one pass over the points per selected point),
+# - the furthest point sampling keeps the best candidate of each block and only updates the
+#   blocks whose bounding box reaches within the search radius of the new point.
+# Sums over all points (the means of the projections) are split into halves the same way
+# numpy splits them for its pairwise summation, so they do not differ in the last bits.
+
+# Peak memory of the blocks by default [bytes]
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+# Temporary memory of one point of a block (the ellipsoidal distances need the most of it)
+BYTES_PER_BLOCK_POINT = 320
+# Smallest block (has to be larger than the 128 values numpy sums without splitting)
+MINIMAL_BLOCK_SIZE = 4096
+
+
+def Find_The_Block_Size(memory_limit):
+    # Number of points of a block whose temporary arrays fit into the memory limit (bytes)
+    if memory_limit <= 0:
+        raise ValueError("The memory limit has to be a positive number of bytes.")
+    return max(MINIMAL_BLOCK_SIZE, int(memory_limit) // BYTES_PER_BLOCK_POINT)
+
+
+def Iterate_The_Blocks(n_of_points, block_size, first_index=0):
+    # Start and end of every block of the points from the first index on
+    for block_start in range(first_index, n_of_points, block_size):
+        yield block_start, min(block_start + block_size, n_of_points)
+
+
+def Sum_In_Blocks(calculate_values, start, end, block_size):
+    # Sum of the values of the range (calculated by blocks), split into halves the same way
+    # as numpy's pairwise summation of the whole range is
+    n_of_values = end - start
+    if n_of_values <= block_size:
+        return numpy.sum(calculate_values(start, end))
+    half = n_of_values // 2
+    half -= half % 8
+    return Sum_In_Blocks(
+        calculate_values, start, start + half, block_size
+    ) + Sum_In_Blocks(calculate_values, start + half, end, block_size)
+
+
+def Find_The_Mean_Longitude_Direction(longitudes, block_size):
+    # Means of the sines and cosines of the longitudes (as numpy.mean of the whole arrays)
+    n_of_points = len(longitudes)
+    return (
+        Sum_In_Blocks(
+            lambda start, end: numpy.sin(numpy.radians(longitudes[start:end])),
+            0,
+            n_of_points,
+            block_size,
+        )
+        / n_of_points,
+        Sum_In_Blocks(
+            lambda start, end: numpy.cos(numpy.radians(longitudes[start:end])),
+            0,
+            n_of_points,
+            block_size,
+        )
+        / n_of_points,
+    )
+
+
+def Find_The_Plane_Frame_In_Blocks(latitudes, longitudes, block_size):
+    # Middle longitude and x scale of the projection of Project_To_Plane, found block by block
+    # (None if the points cover too large area for the projection to keep the hull intact)
+    middle_longitude = numpy.degrees(
+        numpy.arctan2(*Find_The_Mean_Longitude_Direction(longitudes, block_size))
+    )
+    block_ranges = []
+    for block_start, block_end in Iterate_The_Blocks(len(latitudes), block_size):
+        block_latitudes = latitudes[block_start:block_end]
+        longitude_offsets = Find_The_Longitude_Offsets(
+            longitudes[block_start:block_end], middle_longitude
+        )
+        block_ranges.append(
+            (
+                block_latitudes.min(),
+                block_latitudes.max(),
+                numpy.abs(block_latitudes).max(),
+                longitude_offsets.min(),
+                longitude_offsets.max(),
+            )
+        )
+    block_ranges = numpy.array(block_ranges)
+    minimal_latitude = block_ranges[:, 0].min()
+    maximal_latitude = block_ranges[:, 1].max()
+    if not Is_The_Area_Projectable(
+        maximal_latitude - minimal_latitude,
+        block_ranges[:, 4].max() - block_ranges[:, 3].min(),
+        block_ranges[:, 2].max(),
+    ):
+        return None
+    middle_latitude = (minimal_latitude + maximal_latitude) / 2
+    return middle_longitude, numpy.cos(numpy.radians(middle_latitude))
+
+
+def Calculate_Plane_Coordinates(latitudes, longitudes, plane_frame):
+    # Projected x and y coordinates of a block of points
+    middle_longitude, x_scale = plane_frame
+    return (
+        Find_The_Longitude_Offsets(numpy.asarray(longitudes), middle_longitude)
+        * x_scale,
+        numpy.asarray(latitudes),
+    )
+
+
+def Find_The_Furthest_Pair_By_Brute_Force_In_Blocks(
+    latitudes, longitudes, distance_model, block_size, progress_callback=None
+):
+    # Compare every point with all the following points - one block of a row at once
+    n_of_points = len(latitudes)
+    maximal_distance = 0
+    furthest_pair_indexes = ()
+    # The progress is reported as the number of compared pairs about every 1 % of the rows
+    n_of_pairs = n_of_points * (n_of_points - 1) // 2
+    progress_step = max(1, n_of_points // 100)
+    for first_point_index in range(n_of_points - 1):
+        if progress_callback is not None and first_point_index % progress_step == 0:
+            progress_callback(
+                "seed",
+                first_point_index * (2 * n_of_points - first_point_index - 1) // 2,
+                n_of_pairs,
+            )
+        # The first furthest point of the row wins, like within the whole row at once
+        for block_start, block_end in Iterate_The_Blocks(
+            n_of_points, block_size, first_point_index + 1
+        ):
+            point_distances = Calculate_Distances(
+                latitudes[first_point_index],
+                longitudes[first_point_index],
+                latitudes[block_start:block_end],
+                longitudes[block_start:block_end],
+                distance_model,
+            )
+            furthest_point_offset = numpy.argmax(point_distances)
+            if point_distances[furthest_point_offset] > maximal_distance:
+                maximal_distance = point_distances[furthest_point_offset]
+                furthest_pair_indexes = (
+                    first_point_index,
+                    block_start + int(furthest_point_offset),
+                )
+    return furthest_pair_indexes, maximal_distance
+
+
+def Find_The_Furthest_Pair_In_Blocks(
+    latitudes,
+    longitudes,
+    distance_model,
+    method,
+    block_size,
+    progress_callback=None,
+):
+    # Find_The_Furthest_Pair over the blocks of the points
+    if method not in FURTHEST_PAIR_METHODS:
+        raise ValueError(
+            f"Unknown furthest pair method '{method}'. Expected one of {FURTHEST_PAIR_METHODS}."
+        )
+    plane_frame = Find_The_Plane_Frame_In_Blocks(latitudes, longitudes, block_size)
+    if method == "brute_force" or plane_frame is None:
+        return Find_The_Furthest_Pair_By_Brute_Force_In_Blocks(
+            latitudes, longitudes, distance_model, block_size, progress_callback
+        )
+    # Extreme points of each block - the lowest x, lowest y, highest x and highest y
+    block_extremes = []
+    for block_start, block_end in Iterate_The_Blocks(len(latitudes), block_size):
+        x_coordinates, y_coordinates = Calculate_Plane_Coordinates(
+            latitudes[block_start:block_end],
+            longitudes[block_start:block_end],
+            plane_frame,
+        )
+        block_extremes.append(
+            [
+                (block_start + int(offset), x_coordinates[offset], y_coordinates[offset])
+                for offset in (
+                    numpy.argmin(x_coordinates),
+                    numpy.argmin(y_coordinates),
+                    numpy.argmax(x_coordinates),
+                    numpy.argmax(y_coordinates),
+                )
+            ]
+        )
+    # The first block holding the extreme value has its first point (as numpy.argmin/argmax)
+    extreme_points = []
+    for position, (coordinate, find_the_extreme) in enumerate(
+        ((1, numpy.argmin), (2, numpy.argmin), (1, numpy.argmax), (2, numpy.argmax))
+    ):
+        extreme_block = find_the_extreme(
+            [extremes[position][coordinate] for extremes in block_extremes]
+        )
+        extreme_points.append(block_extremes[extreme_block][position])
+    # Points outside the quadrilateral of the extreme points are the hull candidates and only
+    # the hull vertices of their block can be the vertices of the whole hull (the extreme
+    # points give the extent of all points, so the blocks use the tolerance of the whole hull)
+    tolerance = Find_The_Collinearity_Tolerance(
+        extreme_points[2][1] - extreme_points[0][1],
+        extreme_points[3][2] - extreme_points[1][2],
+    )
+    candidate_blocks = []
+    for block_start, block_end in Iterate_The_Blocks(len(latitudes), block_size):
+        x_coordinates, y_coordinates = Calculate_Plane_Coordinates(
+            latitudes[block_start:block_end],
+            longitudes[block_start:block_end],
+            plane_frame,
+        )
+        is_candidate = ~Is_Inside_The_Extreme_Points(
+            x_coordinates, y_coordinates, extreme_points
+        )
+        block_candidate_indexes = numpy.flatnonzero(is_candidate) + block_start
+        if len(block_candidate_indexes) == 0:
+            continue
+        x_candidates = x_coordinates[is_candidate]
+        y_candidates = y_coordinates[is_candidate]
+        block_hull_positions = numpy.sort(
+            numpy.searchsorted(
+                block_candidate_indexes,
+                Find_Convex_Hull_Of_Candidates(
+                    x_candidates, y_candidates, block_candidate_indexes, tolerance
+                ),
+            )
+        )
+        candidate_blocks.append(
+            (
+                block_candidate_indexes[block_hull_positions],
+                x_candidates[block_hull_positions],
+                y_candidates[block_hull_positions],
+            )
+        )
+    candidate_indexes, x_candidates, y_candidates = (
+        numpy.concatenate(candidate_arrays) for candidate_arrays in zip(*candidate_blocks)
+    )
+    hull_indexes = Find_Convex_Hull_Of_Candidates(
+        x_candidates, y_candidates, candidate_indexes, tolerance
+    )
+    hull_positions = numpy.searchsorted(candidate_indexes, hull_indexes)
+    candidate_pairs = Find_The_Candidate_Pairs(
+        x_candidates[hull_positions], y_candidates[hull_positions], hull_indexes
+    )
+    if len(candidate_pairs) == 0:
+        return (), 0
+    return Measure_The_Candidate_Pairs(
+        latitudes,
+        longitudes,
+        candidate_pairs,
+        Find_Identical_Points(
+            latitudes, longitudes, numpy.unique(candidate_pairs).tolist(), block_size
+        ),
+        distance_model,
+    )
+
+
+def Prepare_The_Approximation_In_Blocks(
+    latitudes,
+    longitudes,
+    store_folder,
+    block_size,
+    maximal_approximation_error=MAXIMAL_APPROXIMATION_ERROR,
+):
+    # Prepare_The_Approximation over the blocks - the projected points are stored in the folder
+    latitude_ranges = numpy.array(
+        [
+            (latitudes[block_start:block_end].min(), latitudes[block_start:block_end].max())
+            for block_start, block_end in Iterate_The_Blocks(len(latitudes), block_size)
+        ]
+    )
+    origin, rotation = Find_The_Local_Frame(
+        latitude_ranges[:, 0].min(),
+        latitude_ranges[:, 1].max(),
+        *Find_The_Mean_Longitude_Direction(longitudes, block_size),
+    )
+    projected_points = Create_The_Stored_Array(
+        store_folder, "projected_points.npy", (len(latitudes), 3)
+    )
+    projected_ranges = []
+    for block_start, block_end in Iterate_The_Blocks(len(latitudes), block_size):
+        projected_block = Project_Into_The_Local_Frame(
+            latitudes[block_start:block_end],
+            longitudes[block_start:block_end],
+            origin,
+            rotation,
+        )
+        projected_points[block_start:block_end] = projected_block
+        projected_ranges.append(
+            (projected_block.min(axis=0), projected_block.max(axis=0))
+        )
+    # Corners of the bounding box of all projected points
+    minimal_corners, maximal_corners = zip(*projected_ranges)
+    approximation_error = Estimate_The_Approximation_Error(
+        numpy.array(
+            (numpy.min(minimal_corners, axis=0), numpy.max(maximal_corners, axis=0))
+        )
+    )
+    if not Is_The_Approximation_Accepted(
+        approximation_error, maximal_approximation_error
+    ):
+        return None, approximation_error
+    return projected_points, approximation_error
+
+
+def Calculate_Block_Distances(
+    latitudes,
+    longitudes,
+    point_index,
+    block_start,
+    block_end,
+    distance_model,
+    projected_points=None,
+):
+    # Distances in km from one point of the set to the points of the block
+    if projected_points is not None:
+        return Calculate_Projected_Distances(
+            projected_points[block_start:block_end], projected_points[point_index]
+        )
+    return Calculate_Distances(
+        latitudes[point_index],
+        longitudes[point_index],
+        latitudes[block_start:block_end],
+        longitudes[block_start:block_end],
+        distance_model,
+    )
+
+
+def Score_The_Candidates_In_Blocks(
+    selection_state,
+    latitudes,
+    longitudes,
+    block_size,
+    point_index,
+    projected_points=None,
+):
+    # One pass over the blocks - the distances to the newly selected point are added to the
+    # sums of the candidates and the candidates are scored by them right away
+    # Returns the best candidate and the candidates the approximation can not tell from it
+    distance_sums = selection_state["distance_sums"]
+    squared_distance_sums = selection_state["squared_distance_sums"]
+    is_available = selection_state["is_available"]
+    distance_shift = selection_state["distance_shift"]
+    # Distances from the new point to the already selected ones become a part of the fixed pairs
+    selection_state["pair_count"] += len(selection_state["selected_indexes"])
+    selection_state["pair_distance_sum"] += distance_sums[point_index]
+    selection_state["pair_squared_distance_sum"] += squared_distance_sums[point_index]
+    selection_state["selected_indexes"].append(int(point_index))
+    is_available[point_index] = False
+    n_of_distances = selection_state["pair_count"] + len(
+        selection_state["selected_indexes"]
+    )
+    is_approximate = selection_state["distance_model"] == "approximate"
+    score_margin = Find_The_Score_Margin(selection_state) if is_approximate else 0
+    best_scores = []
+    best_indexes = []
+    close_candidate_blocks = []
+    smallest_score = numpy.inf
+    for block_start, block_end in Iterate_The_Blocks(len(latitudes), block_size):
+        block_distance_sums = distance_sums[block_start:block_end]
+        block_squared_distance_sums = squared_distance_sums[block_start:block_end]
+        shifted_distances = (
+            Calculate_Block_Distances(
+                latitudes,
+                longitudes,
+                point_index,
+                block_start,
+                block_end,
+                selection_state["distance_model"],
+                projected_points,
+            )
+            - distance_shift
+        )
+        block_distance_sums += shifted_distances
+        block_squared_distance_sums += shifted_distances**2
+        # Closed-form standard deviation (as Calculate_Standard_Deviations)
+        means = (
+            selection_state["pair_distance_sum"] + block_distance_sums
+        ) / n_of_distances
+        variances = (
+            selection_state["pair_squared_distance_sum"] + block_squared_distance_sums
+        ) / n_of_distances - means**2
+        standard_deviations = numpy.sqrt(numpy.maximum(variances, 0))
+        standard_deviations[~is_available[block_start:block_end]] = numpy.inf
+        best_offset = numpy.argmin(standard_deviations)
+        best_scores.append(standard_deviations[best_offset])
+        best_indexes.append(block_start + int(best_offset))
+        # Candidates close to the best score so far (filtered by the final best score below)
+        if is_approximate:
+            smallest_score = min(smallest_score, standard_deviations[best_offset])
+            close_offsets = numpy.flatnonzero(
+                standard_deviations <= smallest_score + score_margin
+            )
+            close_candidate_blocks.append(
+                (close_offsets + block_start, standard_deviations[close_offsets])
+            )
+    best_block = numpy.argmin(best_scores)
+    if not is_approximate:
+        return best_indexes[best_block], None
+    close_candidates, close_scores = (
+        numpy.concatenate(close_arrays) for close_arrays in zip(*close_candidate_blocks)
+    )
+    return best_indexes[best_block], close_candidates[
+        close_scores <= best_scores[best_block] + score_margin
+    ]
+
+
+def Select_Uniformly_In_Blocks(
+    latitudes,
+    longitudes,
+    furthest_pair_indexes,
+    maximal_distance,
+    how_many_points_to_find,
+    distance_model,
+    store_folder,
+    block_size,
+    projected_points=None,
+    approximation_error=0.0,
+    progress_callback=None,
+):
+    # Uniform spacing selection (Start_The_Selection and Extend_The_Selection) over the blocks
+    n_of_points = len(latitudes)
+    selection_state = {
+        "selected_indexes": [],
+        "is_available": Create_The_Stored_Array(
+            store_folder, "is_available.npy", (n_of_points,), bool, True
+        ),
+        "distance_shift": maximal_distance / 2,
+        "distance_sums": Create_The_Stored_Array(
+            store_folder, "distance_sums.npy", (n_of_points,), fill_value=0.0
+        ),
+        "squared_distance_sums": Create_The_Stored_Array(
+            store_folder, "squared_distance_sums.npy", (n_of_points,), fill_value=0.0
+        ),
+        "pair_count": 0,
+        "pair_distance_sum": 0.0,
+        "pair_squared_distance_sum": 0.0,
+        "distance_model": distance_model,
+    }
+    # Approximate distances are refined by the ellipsoidal ones (within their error bound)
+    if distance_model == "approximate":
+        selection_state.update(
+            approximation_error=approximation_error,
+            exact_pair_distance_sum=0.0,
+            exact_pair_squared_distance_sum=0.0,
+        )
+    best_candidate = None
+    for point_index in furthest_pair_indexes:
+        if distance_model == "approximate":
+            Add_Exact_Pair_Distances(selection_state, latitudes, longitudes, point_index)
+        best_candidate = Score_The_Candidates_In_Blocks(
+            selection_state,
+            latitudes,
+            longitudes,
+            block_size,
+            point_index,
+            projected_points,
+        )
+    # Look for points until specified number has been found
+    selected_indexes = selection_state["selected_indexes"]
+    while len(selected_indexes) < min(how_many_points_to_find, n_of_points):
+        Count_The_Event("candidate_rows_scored", n_of_points - len(selected_indexes))
+        optimal_point_index, close_candidates = best_candidate
+        if distance_model == "approximate":
+            optimal_point_index = Refine_Among_The_Candidates(
+                selection_state, latitudes, longitudes, close_candidates
+            )
+            Add_Exact_Pair_Distances(
+                selection_state, latitudes, longitudes, optimal_point_index
+            )
+        best_candidate = Score_The_Candidates_In_Blocks(
+            selection_state,
+            latitudes,
+            longitudes,
+            block_size,
+            optimal_point_index,
+            projected_points,
+        )
+        if progress_callback is not None:
+            progress_callback(
+                "selection", len(selected_indexes), how_many_points_to_find
+            )
+    return selected_indexes
+
+
+def Find_The_Block_Boxes(latitudes, longitudes, block_size):
+    # Corners of the bounding box of the unit vectors of each block
+    block_boxes = []
+    for block_start, block_end in Iterate_The_Blocks(len(latitudes), block_size):
+        vectors = Convert_To_Unit_Vectors(
+            latitudes[block_start:block_end], longitudes[block_start:block_end]
+        )
+        block_boxes.append((vectors.min(axis=0), vectors.max(axis=0)))
+    lower_corners, upper_corners = zip(*block_boxes)
+    return numpy.array(lower_corners), numpy.array(upper_corners)
+
+
+def Sample_The_Point_In_Blocks(
+    selection_state,
+    latitudes,
+    longitudes,
+    block_size,
+    point_index,
+    projected_points=None,
+    search_radius=None,
+):
+    # The new point may be the closest selected point of some candidates - their minimal
+    # distances are updated and the furthest candidate of each changed block is found again
+    # (only the blocks reaching within the search radius of the point can change)
+    minimal_distances = selection_state["minimal_distances"]
+    is_available = selection_state["is_available"]
+    is_block_changed = numpy.ones(len(selection_state["block_best_indexes"]), dtype=bool)
+    selection_state["selected_indexes"].append(int(point_index))
+    is_available[point_index] = False
+    if search_radius is not None:
+        point_vector = Convert_To_Unit_Vectors(
+            latitudes[point_index], longitudes[point_index]
+        )[0]
+        closest_squared_chords = numpy.sum(
+            numpy.maximum(
+                numpy.maximum(
+                    selection_state["block_lower_corners"] - point_vector,
+                    point_vector - selection_state["block_upper_corners"],
+                ),
+                0,
+            )
+            ** 2,
+            axis=1,
+        )
+        is_block_changed = (
+            closest_squared_chords <= Convert_Distance_To_Chord(search_radius) ** 2
+        )
+    for block_number, (block_start, block_end) in enumerate(
+        Iterate_The_Blocks(len(latitudes), block_size)
+    ):
+        # The block of the point changes anyway, the point is not available any more
+        is_point_block = block_start <= point_index < block_end
+        if not is_block_changed[block_number] and not is_point_block:
+            continue
+        block_minimal_distances = minimal_distances[block_start:block_end]
+        if is_block_changed[block_number]:
+            numpy.minimum(
+                block_minimal_distances,
+                Calculate_Block_Distances(
+                    latitudes,
+                    longitudes,
+                    point_index,
+                    block_start,
+                    block_end,
+                    selection_state["distance_model"],
+                    projected_points,
+                ),
+                out=block_minimal_distances,
+            )
+        # Already selected points are never chosen again (as in the in-memory sampling)
+        candidate_distances = numpy.where(
+            is_available[block_start:block_end], block_minimal_distances, -1
+        )
+        furthest_offset = numpy.argmax(candidate_distances)
+        selection_state["block_best_distances"][block_number] = candidate_distances[
+            furthest_offset
+        ]
+        selection_state["block_best_indexes"][block_number] = block_start + int(
+            furthest_offset
+        )
+
+
+def Find_The_Close_Furthest_Candidates(
+    selection_state, largest_distance, block_size
+):
+    # Candidates whose minimal distance is within the error bound of the largest one
+    # (only the blocks whose furthest candidate is that close are searched)
+    smallest_close_distance = largest_distance - Find_The_Distance_Margin(
+        selection_state, largest_distance
+    )
+    close_candidate_blocks = []
+    for block_number in numpy.flatnonzero(
+        selection_state["block_best_distances"] >= smallest_close_distance
+    ).tolist():
+        block_start = block_number * block_size
+        block_end = block_start + block_size
+        candidate_distances = numpy.where(
+            selection_state["is_available"][block_start:block_end],
+            selection_state["minimal_distances"][block_start:block_end],
+            -1,
+        )
+        close_candidate_blocks.append(
+            numpy.flatnonzero(candidate_distances >= smallest_close_distance)
+            + block_start
+        )
+    return numpy.concatenate(close_candidate_blocks)
+
+
+def Sample_The_Furthest_Points_In_Blocks(
+    latitudes,
+    longitudes,
+    furthest_pair_indexes,
+    how_many_points_to_find,
+    distance_model,
+    store_folder,
+    block_size,
+    projected_points=None,
+    approximation_error=0.0,
+    progress_callback=None,
+):
+    # Furthest point sampling (Start_The_Furthest_Point_Sampling and its extension) over the blocks
+    n_of_points = len(latitudes)
+    n_of_blocks = -(-n_of_points // block_size)
+    block_lower_corners, block_upper_corners = Find_The_Block_Boxes(
+        latitudes, longitudes, block_size
+    )
+    selection_state = {
+        "selected_indexes": [],
+        "is_available": Create_The_Stored_Array(
+            store_folder, "is_available.npy", (n_of_points,), bool, True
+        ),
+        "minimal_distances": Create_The_Stored_Array(
+            store_folder, "minimal_distances.npy", (n_of_points,), fill_value=numpy.inf
+        ),
+        "distance_model": distance_model,
+        "block_best_distances": numpy.full(n_of_blocks, numpy.inf),
+        "block_best_indexes": numpy.zeros(n_of_blocks, dtype=numpy.int64),
+        "block_lower_corners": block_lower_corners,
+        "block_upper_corners": block_upper_corners,
+    }
+    # Approximate distances are refined by the ellipsoidal ones (within their error bound)
+    if distance_model == "approximate":
+        selection_state["approximation_error"] = approximation_error
+    # The furthest pair is measured to all points (by the projected points if approximate)
+    for point_index in furthest_pair_indexes:
+        Sample_The_Point_In_Blocks(
+            selection_state,
+            latitudes,
+            longitudes,
+            block_size,
+            point_index,
+            projected_points,
+        )
+    # Look for points until specified number has been found
+    selected_indexes = selection_state["selected_indexes"]
+    while len(selected_indexes) < min(how_many_points_to_find, n_of_points):
+        Count_The_Event("candidate_rows_scored", n_of_points - len(selected_indexes))
+        furthest_block = numpy.argmax(selection_state["block_best_distances"])
+        furthest_point_index = int(selection_state["block_best_indexes"][furthest_block])
+        largest_minimal_distance = selection_state["block_best_distances"][
+            furthest_block
+        ]
+        if distance_model == "approximate":
+            furthest_point_index = Refine_Among_The_Furthest_Candidates(
+                selection_state,
+                latitudes,
+                longitudes,
+                Find_The_Close_Furthest_Candidates(
+                    selection_state, largest_minimal_distance, block_size
+                ),
+            )
+        # Only the candidates within the largest minimal distance of the new point can change
+        Sample_The_Point_In_Blocks(
+            selection_state,
+            latitudes,
+            longitudes,
+            block_size,
+            furthest_point_index,
+            search_radius=Get_The_Search_Radius(
+                largest_minimal_distance, distance_model
+            ),
+        )
+        if progress_callback is not None:
+            progress_callback(
+                "selection", len(selected_indexes), how_many_points_to_find
+            )
+    return selected_indexes
+
+
+def Find_The_Selection_Order_In_Blocks(
+    latitudes,
+    longitudes,
+    maximal_number_of_points,
+    store_folder,
+    distance_model="ellipsoidal",
+    furthest_pair_method="convex_hull",
+    selection_mode="uniform_spacing",
+    memory_limit=DEFAULT_MEMORY_LIMIT,
+    progress_callback=None,
+):
+    # Out-of-core Find_The_Selection_Order - the same points in the same order, with the
+    # coordinates and working arrays stored in the folder and the blocks kept within the limit
+    if selection_mode not in SELECTION_MODES:
+        raise ValueError(
+            f"Unknown selection mode '{selection_mode}'. Expected one of {SELECTION_MODES}."
+        )
+    block_size = Find_The_Block_Size(memory_limit)
+    latitudes, longitudes = Store_The_Coordinates(
+        store_folder, latitudes, longitudes, block_size
+    )
+    if len(latitudes) == 0:
+        return []
+    # The approximate distances are measured between the projected points (the ellipsoidal
+    # ones are used instead if the points are too far apart for it)
+    projected_points = None
+    approximation_error = 0.0
+    if distance_model == "approximate":
+        projected_points, approximation_error = Prepare_The_Approximation_In_Blocks(
+            latitudes, longitudes, store_folder, block_size
+        )
+        if projected_points is None:
+            distance_model = "ellipsoidal"
+    with Measure_The_Stage("seed_pair"):
+        furthest_pair_indexes, maximal_distance = Find_The_Furthest_Pair_In_Blocks(
+            latitudes,
+            longitudes,
+            distance_model,
+            furthest_pair_method,
+            block_size,
+            progress_callback,
+        )
+        # Without a furthest pair the first points are the seed (as in Find_The_Selection_Order)
+        if not furthest_pair_indexes:
+            furthest_pair_indexes = tuple(range(min(2, len(latitudes))))
+            maximal_distance = 0.0
+    if progress_callback is not None:
+        progress_callback("seed", 1, 1)
+    if selection_mode == "furthest_point":
+        return Sample_The_Furthest_Points_In_Blocks(
+            latitudes,
+            longitudes,
+            furthest_pair_indexes,
+            maximal_number_of_points,
+            distance_model,
+            store_folder,
+            block_size,
+            projected_points,
+            approximation_error,
+            progress_callback,
+        )
+    return Select_Uniformly_In_Blocks(
+        latitudes,
+        longitudes,
+        furthest_pair_indexes,
+        maximal_distance,
+        maximal_number_of_points,
+        distance_model,
+        store_folder,
+        block_size,
+        projected_points,
+        approximation_error,
+        progress_callback,
+    )
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Functions generating reproducible synthetic point sets and writing them as input files.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import os  # Working with file paths
+import csv  # Writing CSV files
+import openpyxl  # Writing Excel files
+import numpy  # Random generators and coordinate arrays
+
+# The points are placed within a square region (of the given size in km) around its middle,
+# by default one covering a city like the points of the example input file. The same kind,
+# number of points and seed always give the same points.
+
+# Kinds of the generated point sets
+SYNTHETIC_DATASET_KINDS = ("uniform", "clustered", "road")
+DEFAULT_MIDDLE_POINT = (48.15, 17.11)
+DEFAULT_REGION_SIZE_KM = 30.0
+KM_PER_DEGREE_OF_LATITUDE = 111.32
+# Parameters of the clustered and road-like point sets
+NUMBER_OF_POINTS_PER_CLUSTER = 2000
+CLUSTER_SPREAD_KM = 0.5
+NUMBER_OF_ROADS = 12
+NUMBER_OF_ROAD_BENDS = 8
+ROAD_WIDTH_KM = 0.02
+
+
+def Generate_Uniform_Offsets(random_generator, n_of_points, region_size_km):
+    # East and north offsets in km spread evenly over the whole region
+    return random_generator.uniform(
+        -region_size_km / 2, region_size_km / 2, size=(n_of_points, 2)
+    )
+
+
+def Generate_Clustered_Offsets(random_generator, n_of_points, region_size_km):
+    # Offsets gathered in normally distributed clusters around random centres
+    n_of_clusters = max(1, n_of_points // NUMBER_OF_POINTS_PER_CLUSTER)
+    cluster_centres = Generate_Uniform_Offsets(
+        random_generator, n_of_clusters, region_size_km * 0.9
+    )
+    cluster_of_points = random_generator.integers(0, n_of_clusters, size=n_of_points)
+    return cluster_centres[cluster_of_points] + random_generator.normal(
+        0, CLUSTER_SPREAD_KM, size=(n_of_points, 2)
+    )
+
+
+def Generate_Road_Offsets(random_generator, n_of_points, region_size_km):
+    # Offsets along random polylines crossing the region (with a small sideways noise)
+    road_bends = Generate_Uniform_Offsets(
+        random_generator, NUMBER_OF_ROADS * (NUMBER_OF_ROAD_BENDS + 1), region_size_km
+    ).reshape(NUMBER_OF_ROADS, NUMBER_OF_ROAD_BENDS + 1, 2)
+    road_of_points = random_generator.integers(0, NUMBER_OF_ROADS, size=n_of_points)
+    segment_of_points = random_generator.integers(
+        0, NUMBER_OF_ROAD_BENDS, size=n_of_points
+    )
+    positions_on_segments = random_generator.random(size=(n_of_points, 1))
+    segment_starts = road_bends[road_of_points, segment_of_points]
+    segment_ends = road_bends[road_of_points, segment_of_points + 1]
+    return (
+        segment_starts
+        + positions_on_segments * (segment_ends - segment_starts)
+        + random_generator.normal(0, ROAD_WIDTH_KM, size=(n_of_points, 2))
+    )
+
+
+SYNTHETIC_OFFSET_GENERATORS = {
+    "uniform": Generate_Uniform_Offsets,
+    "clustered": Generate_Clustered_Offsets,
+    "road": Generate_Road_Offsets,
+}
+
+
+def Generate_Synthetic_Points(
+    kind,
+    n_of_points,
+    seed=0,
+    middle_point=DEFAULT_MIDDLE_POINT,
+    region_size_km=DEFAULT_REGION_SIZE_KM,
+):
+    # Names, latitudes and longitudes of a reproducible point set of the given kind
+    if kind not in SYNTHETIC_OFFSET_GENERATORS:
+        raise ValueError(
+            f"Unknown synthetic dataset kind '{kind}'. Expected one of {SYNTHETIC_DATASET_KINDS}."
+        )
+    random_generator = numpy.random.default_rng(seed)
+    offsets = SYNTHETIC_OFFSET_GENERATORS[kind](
+        random_generator, n_of_points, region_size_km
+    )
+    # Kilometres to degrees around the middle point
+    latitudes = middle_point[0] + offsets[:, 1] / KM_PER_DEGREE_OF_LATITUDE
+    longitudes = middle_point[1] + offsets[:, 0] / (
+        KM_PER_DEGREE_OF_LATITUDE * numpy.cos(numpy.radians(middle_point[0]))
+    )
+    names = [f"Point {point_number}" for point_number in range(1, n_of_points + 1)]
+    return names, latitudes, longitudes
+
+
+def Write_The_Synthetic_File(path_to_file, names, latitudes, longitudes):
+    # Write the points as an Excel or CSV input file (a header and a row per point)
+    header = ("Description", "Latitude [°]", "Longitude [°]")
+    rows = zip(names, latitudes.tolist(), longitudes.tolist())
+    file_extension = os.path.splitext(path_to_file)[1].lower()
+    if file_extension == ".xlsx":
+        # Rows are streamed into the file instead of keeping the whole sheet in memory
+        excel_workbook_handle = openpyxl.Workbook(write_only=True)
+        sheet_handle = excel_workbook_handle.create_sheet()
+        sheet_handle.append(header)
+        for row in rows:
+            sheet_handle.append(row)
+        excel_workbook_handle.save(path_to_file)
+    elif file_extension == ".csv":
+        with open(path_to_file, "w", newline="", encoding="utf-8") as csv_file:
+            csv_writer = csv.writer(csv_file)
+            csv_writer.writerow(header)
+            csv_writer.writerows(rows)
+    else:
+        raise ValueError(
+            f"Synthetic files can be written as .xlsx or .csv, not '{file_extension}'."
+        )
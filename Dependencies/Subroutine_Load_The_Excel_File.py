@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Function reading the dimensions, validity and points of Excel file in a single pass.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import openpyxl  # Working with Excel files
+
+from Dependencies.Subroutine_Validate_Coordinate_Values import (
+    Validate_Coordinate_Columns,
+)
+
+
+def Read_The_Excel_Columns(path_to_excel_file):
+    # Numbers of rows and columns of the first sheet, names and the unconverted latitude and
+    # longitude values (the first three columns of every row after the header)
+    # Open Excel file with intention to only read - the rows are streamed instead of parsing the whole sheet
+    excel_workbook_handle = openpyxl.load_workbook(
+        path_to_excel_file, read_only=True, data_only=True
+    )
+    try:
+        # Select the first sheet (assuming that it is the correct one)
+        first_sheet_handle = excel_workbook_handle.worksheets[0]
+        # Variables for storing the sheet properties and the extracted values
+        number_of_rows = 0
+        number_of_columns = 0
+        names = []
+        latitude_values = []
+        longitude_values = []
+        # Go through all lines (the first one is the header)
+        for row_values in first_sheet_handle.iter_rows(values_only=True):
+            number_of_rows += 1
+            number_of_columns = max(number_of_columns, len(row_values))
+            if number_of_rows == 1:
+                continue
+            # Missing cells at the end of a short row are treated as empty
+            row_values = tuple(row_values) + (None,) * (3 - len(row_values))
+            names.append(row_values[0])
+            latitude_values.append(row_values[1])
+            longitude_values.append(row_values[2])
+    finally:
+        # Read-only workbooks keep the file open until closed
+        excel_workbook_handle.close()
+    return number_of_rows, number_of_columns, names, latitude_values, longitude_values
+
+
+def Load_The_Excel_File(path_to_excel_file):
+    # Read the name and coordinate columns and validate the coordinates
+    (
+        number_of_rows,
+        number_of_columns,
+        names,
+        latitude_values,
+        longitude_values,
+    ) = Read_The_Excel_Columns(path_to_excel_file)
+    # Check if latitude and longitude values are witin their bounds - if they acutally are
+    # lat/long numeric values (all rows at once, every offending row is reported)
+    latitudes, longitudes, validation_report = Validate_Coordinate_Columns(
+        latitude_values, longitude_values
+    )
+    # Return everything that was found out about the file
+    return {
+        "number_of_rows": number_of_rows,
+        "number_of_columns": number_of_columns,
+        "are_coordinates_valid": not len(validation_report["invalid_indexes"]),
+        "names": names,
+        "latitudes": latitudes,
+        "longitudes": longitudes,
+        "validation_report": validation_report,
+    }
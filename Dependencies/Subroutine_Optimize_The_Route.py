@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Functions ordering the selected points into a short route and improving it by local moves.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import time  # Measuring the time budget of the improvement
+import numpy  # Evaluating all moves of one kind at once
+
+# The route is an open path (its first and last point are not connected). To use the moves
+# known from closed tours, a virtual point with zero distance to all points is added - the
+# closed tour through it is exactly as long as the open path, and cutting the tour at the
+# virtual point gives the path back. Both of its ends are therefore free to change.
+# Every step evaluates all 2-opt moves (reversal of a part of the route) at once and applies
+# the best one. Once there is no improving 2-opt move, all Or-opt moves (moving a run of
+# 1 to 3 consecutive points elsewhere, possibly reversed) are evaluated the same way.
+# The nearest neighbour sort scans a row of the distance matrix (needed for the moves anyway)
+# at once - a spatial index would only replace this vectorized scan by slower Python queries.
+
+DEFAULT_ROUTE_TIME_BUDGET = 2.0  # Seconds
+MAXIMAL_OR_OPT_SEGMENT_LENGTH = 3
+# Smallest shortening (in km) accepted as an improvement - protects against rounding cycles
+MINIMAL_IMPROVEMENT = 1e-9
+
+
+def Sort_By_Nearest_Neighbour(distance_matrix, starting_point_index):
+    # Order the points by always moving to the closest not yet visited point
+    route = [starting_point_index]
+    total_distance = 0
+    is_visited = numpy.zeros(len(distance_matrix), dtype=bool)
+    is_visited[starting_point_index] = True
+    # While some points are still left - until all points have been ordered
+    while len(route) < len(distance_matrix):
+        # Calculate distance with regard to the last "selected" point
+        distances = numpy.where(is_visited, numpy.inf, distance_matrix[route[-1]])
+        closest_point_index = int(numpy.argmin(distances))
+        total_distance += distances[closest_point_index]
+        is_visited[closest_point_index] = True
+        route.append(closest_point_index)
+    return route, total_distance
+
+
+def Calculate_Route_Length(distance_matrix, route):
+    # Sum of the distances between the consecutive points of the route
+    route = numpy.asarray(route, dtype=numpy.int64)
+    return float(numpy.sum(distance_matrix[route[:-1], route[1:]]))
+
+
+def Find_The_Best_Two_Opt_Move(extended_matrix, tour):
+    # Change of the tour length for reversing each part tour[i..j] (the virtual point stays at 0)
+    n_of_tour_points = len(tour)
+    previous_points = tour[:-1]  # tour[i - 1] for i = 1..n-1
+    first_points = tour[1:]  # tour[i]
+    last_points = tour[1:]  # tour[j] for j = 1..n-1
+    next_points = numpy.roll(tour, -1)[1:]  # tour[j + 1] (back to the virtual point at the end)
+    length_changes = (
+        extended_matrix[previous_points[:, None], last_points[None, :]]
+        + extended_matrix[first_points[:, None], next_points[None, :]]
+        - extended_matrix[previous_points, first_points][:, None]
+        - extended_matrix[last_points, next_points][None, :]
+    )
+    # Only the parts with j > i are real moves
+    length_changes[numpy.tril_indices(n_of_tour_points - 1)] = numpy.inf
+    best_move_position = int(numpy.argmin(length_changes))
+    first_position, last_position = numpy.unravel_index(
+        best_move_position, length_changes.shape
+    )
+    return (
+        float(length_changes.flat[best_move_position]),
+        int(first_position) + 1,
+        int(last_position) + 1,
+    )
+
+
+def Find_The_Best_Or_Opt_Move(extended_matrix, tour, segment_length):
+    # Change of the tour length for moving each run of points between two other neighbours
+    n_of_tour_points = len(tour)
+    if n_of_tour_points - 1 <= segment_length:
+        return numpy.inf, 0, 0, False
+    # Runs tour[s..s+L-1] with s = 1..n-L (the virtual point at 0 is never moved)
+    segment_starts = numpy.arange(1, n_of_tour_points - segment_length + 1)
+    segment_ends = segment_starts + segment_length - 1
+    first_points = tour[segment_starts]
+    last_points = tour[segment_ends]
+    previous_points = tour[segment_starts - 1]
+    next_points = tour[(segment_ends + 1) % n_of_tour_points]
+    removal_changes = (
+        extended_matrix[previous_points, next_points]
+        - extended_matrix[previous_points, first_points]
+        - extended_matrix[last_points, next_points]
+    )
+    # Insertion between tour[q] and tour[q + 1] for every q, as it is or reversed
+    edge_starts = tour
+    edge_ends = numpy.roll(tour, -1)
+    edge_lengths = extended_matrix[edge_starts, edge_ends]
+    insertion_changes = (
+        extended_matrix[edge_starts[None, :], first_points[:, None]]
+        + extended_matrix[last_points[:, None], edge_ends[None, :]]
+        - edge_lengths[None, :]
+    )
+    reversed_insertion_changes = (
+        extended_matrix[edge_starts[None, :], last_points[:, None]]
+        + extended_matrix[first_points[:, None], edge_ends[None, :]]
+        - edge_lengths[None, :]
+    )
+    # Edges touching or inside of the run itself are not valid insertion places
+    edge_positions = numpy.arange(n_of_tour_points)[None, :]
+    is_invalid = (edge_positions >= segment_starts[:, None] - 1) & (
+        edge_positions <= segment_ends[:, None]
+    )
+    insertion_changes[is_invalid] = numpy.inf
+    reversed_insertion_changes[is_invalid] = numpy.inf
+    is_reversed = reversed_insertion_changes < insertion_changes
+    length_changes = removal_changes[:, None] + numpy.where(
+        is_reversed, reversed_insertion_changes, insertion_changes
+    )
+    best_move_position = int(numpy.argmin(length_changes))
+    segment_position, edge_position = numpy.unravel_index(
+        best_move_position, length_changes.shape
+    )
+    return (
+        float(length_changes.flat[best_move_position]),
+        int(segment_starts[segment_position]),
+        int(edge_position),
+        bool(is_reversed.flat[best_move_position]),
+    )
+
+
+def Apply_The_Or_Opt_Move(tour, segment_start, segment_length, edge_position, is_reversed):
+    # Move the run tour[s..s+L-1] between tour[q] and tour[q + 1]
+    segment = tour[segment_start : segment_start + segment_length]
+    if is_reversed:
+        segment = segment[::-1]
+    if edge_position < segment_start:
+        return numpy.concatenate(
+            (
+                tour[: edge_position + 1],
+                segment,
+                tour[edge_position + 1 : segment_start],
+                tour[segment_start + segment_length :],
+            )
+        )
+    return numpy.concatenate(
+        (
+            tour[:segment_start],
+            tour[segment_start + segment_length : edge_position + 1],
+            segment,
+            tour[edge_position + 1 :],
+        )
+    )
+
+
+def Improve_The_Route(distance_matrix, route, time_budget=DEFAULT_ROUTE_TIME_BUDGET):
+    # Apply the best 2-opt or Or-opt move until none shortens the route or the time runs out
+    deadline = time.perf_counter() + time_budget
+    n_of_points = len(route)
+    if n_of_points < 3:
+        return list(route)
+    # Distance matrix extended by the virtual point (the last one)
+    extended_matrix = numpy.zeros((n_of_points + 1, n_of_points + 1))
+    extended_matrix[:n_of_points, :n_of_points] = distance_matrix
+    tour = numpy.array([n_of_points] + list(route), dtype=numpy.int64)
+    while time.perf_counter() < deadline:
+        length_change, first_position, last_position = Find_The_Best_Two_Opt_Move(
+            extended_matrix, tour
+        )
+        if length_change < -MINIMAL_IMPROVEMENT:
+            tour[first_position : last_position + 1] = tour[
+                first_position : last_position + 1
+            ][::-1].copy()
+            continue
+        best_or_opt_move = None
+        for segment_length in range(1, MAXIMAL_OR_OPT_SEGMENT_LENGTH + 1):
+            (
+                length_change,
+                segment_start,
+                edge_position,
+                is_reversed,
+            ) = Find_The_Best_Or_Opt_Move(extended_matrix, tour, segment_length)
+            if length_change < -MINIMAL_IMPROVEMENT and (
+                best_or_opt_move is None or length_change < best_or_opt_move[0]
+            ):
+                best_or_opt_move = (
+                    length_change,
+                    segment_start,
+                    segment_length,
+                    edge_position,
+                    is_reversed,
+                )
+        # Local optimum - no move of either kind shortens the route
+        if best_or_opt_move is None:
+            break
+        tour = Apply_The_Or_Opt_Move(tour, *best_or_opt_move[1:])
+    # Cut the tour at the virtual point
+    virtual_point_position = int(numpy.flatnonzero(tour == n_of_points)[0])
+    return numpy.roll(tour, -virtual_point_position)[1:].tolist()
+
+
+def Optimize_The_Route(
+    distance_matrix,
+    starting_point_indexes=(0,),
+    time_budget=DEFAULT_ROUTE_TIME_BUDGET,
+):
+    # Build the route by nearest neighbour from each starting point, keep the shortest one
+    # (the later one on a tie)
+    # and improve it - return the route with its length before and after the improvement
+    initial_route = None
+    initial_route_length = numpy.inf
+    for starting_point_index in starting_point_indexes:
+        route, route_length = Sort_By_Nearest_Neighbour(
+            distance_matrix, starting_point_index
+        )
+        if route_length <= initial_route_length:
+            initial_route, initial_route_length = route, route_length
+    optimized_route = Improve_The_Route(distance_matrix, initial_route, time_budget)
+    optimized_route_length = Calculate_Route_Length(distance_matrix, optimized_route)
+    # The improvement only accepts shorter routes, but keep the initial one on a tie of rounding
+    if optimized_route_length > initial_route_length:
+        return initial_route, float(initial_route_length), float(initial_route_length)
+    return optimized_route, float(initial_route_length), optimized_route_length
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Functions projecting the points into a local east-north-up frame for approximate distances.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import warnings  # Warning about the fallback to the exact distances
+import numpy  # Projecting and measuring whole coordinate arrays at once
+
+from Dependencies.Class_Implementing_Selection_Metrics import Count_The_Event
+from Dependencies.Subroutine_Calculate_Distances import (
+    WGS84_MAJOR_AXIS_KM,
+    WGS84_SQUARED_ECCENTRICITY,
+    Convert_To_Earth_Centered_Coordinates,
+)
+
+# The points are projected once into the east, north and up (ENU) coordinates around the
+# middle of the dataset. The projection only moves and rotates the Earth-centered coordinates,
+# so the Euclidean distance of two projected points is the straight line between them and
+# the heavy search needs no trigonometry. The straight line is shorter than the ellipsoidal
+# distance s by about s^3 / (24 R^2), where R is at least the smallest radius of curvature of
+# the ellipsoid. The relative error of the longest distance within the dataset (twice this
+# estimate to stay on the safe side) bounds the relative error of every distance.
+
+# Largest relative error of the approximate distances accepted (beyond it exact ones are used)
+MAXIMAL_APPROXIMATION_ERROR = 1e-3
+# Meridian radius of curvature at the equator - the smallest one of the WGS-84 ellipsoid
+MINIMAL_RADIUS_OF_CURVATURE_KM = WGS84_MAJOR_AXIS_KM * (1 - WGS84_SQUARED_ECCENTRICITY)
+
+
+def Project_To_Local_Frame(latitudes, longitudes):
+    # East, north and up coordinates in km of the points (one row per point)
+    latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+    longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+    if len(latitudes) == 0:
+        return numpy.column_stack(
+            Convert_To_Earth_Centered_Coordinates(latitudes, longitudes)
+        )
+    # Middle of the points (the longitudes are averaged as angles to handle the antimeridian)
+    origin, rotation = Find_The_Local_Frame(
+        latitudes.min(),
+        latitudes.max(),
+        numpy.mean(numpy.sin(numpy.radians(longitudes))),
+        numpy.mean(numpy.cos(numpy.radians(longitudes))),
+    )
+    return Project_Into_The_Local_Frame(latitudes, longitudes, origin, rotation)
+
+
+def Find_The_Local_Frame(
+    minimal_latitude, maximal_latitude, mean_longitude_sine, mean_longitude_cosine
+):
+    # Origin (Earth-centered) and rotation of the frame around the middle of the points
+    origin_latitude = numpy.radians((minimal_latitude + maximal_latitude) / 2)
+    origin_longitude = numpy.arctan2(mean_longitude_sine, mean_longitude_cosine)
+    origin = numpy.array(
+        Convert_To_Earth_Centered_Coordinates(
+            numpy.degrees(origin_latitude), numpy.degrees(origin_longitude)
+        )
+    )
+    sin_latitude = numpy.sin(origin_latitude)
+    cos_latitude = numpy.cos(origin_latitude)
+    sin_longitude = numpy.sin(origin_longitude)
+    cos_longitude = numpy.cos(origin_longitude)
+    # Rows of the rotation are the east, north and up directions at the origin
+    rotation = numpy.array(
+        (
+            (-sin_longitude, cos_longitude, 0),
+            (
+                -sin_latitude * cos_longitude,
+                -sin_latitude * sin_longitude,
+                cos_latitude,
+            ),
+            (cos_latitude * cos_longitude, cos_latitude * sin_longitude, sin_latitude),
+        )
+    )
+    return origin, rotation
+
+
+def Project_Into_The_Local_Frame(latitudes, longitudes, origin, rotation):
+    # East, north and up coordinates in km of the points within the given frame
+    earth_centered_coordinates = numpy.column_stack(
+        Convert_To_Earth_Centered_Coordinates(latitudes, longitudes)
+    )
+    return (earth_centered_coordinates - origin) @ rotation.T
+
+
+def Estimate_The_Approximation_Error(projected_points):
+    # Bound of the relative error of the approximate distances within the dataset
+    if len(projected_points) < 2:
+        return 0.0
+    # No distance within the dataset is longer than the diagonal of its bounding box
+    longest_distance = numpy.linalg.norm(
+        projected_points.max(axis=0) - projected_points.min(axis=0)
+    )
+    return float((longest_distance / MINIMAL_RADIUS_OF_CURVATURE_KM) ** 2 / 12)
+
+
+def Calculate_Projected_Distances_From_Point(projected_points, point_index):
+    # Euclidean distances in km from one projected point to every projected point
+    return Calculate_Projected_Distances(projected_points, projected_points[point_index])
+
+
+def Calculate_Projected_Distances(projected_points, projected_point):
+    # Euclidean distances in km from the given projected point to the projected points
+    Count_The_Event("distance_evaluations", len(projected_points))
+    return numpy.sqrt(numpy.sum((projected_points - projected_point) ** 2, axis=1))
+
+
+def Prepare_The_Approximation(
+    latitudes, longitudes, maximal_approximation_error=MAXIMAL_APPROXIMATION_ERROR
+):
+    # Projected points with the error bound, or no points (with a warning) if the dataset
+    # is too large for the approximation - the exact distances have to be used then
+    projected_points = Project_To_Local_Frame(latitudes, longitudes)
+    approximation_error = Estimate_The_Approximation_Error(projected_points)
+    if not Is_The_Approximation_Accepted(
+        approximation_error, maximal_approximation_error
+    ):
+        return None, approximation_error
+    return projected_points, approximation_error
+
+
+def Is_The_Approximation_Accepted(approximation_error, maximal_approximation_error):
+    # Whether the error bound is small enough (warns that the exact distances are used if not)
+    if approximation_error > maximal_approximation_error:
+        warnings.warn(
+            f"The points are too far apart for the approximate distances (relative error up"
+            f" to {approximation_error:.2g}, at most {maximal_approximation_error:.2g} is"
+            f" accepted), the ellipsoidal distances are used instead.",
+            stacklevel=3,
+        )
+        return False
+    return True
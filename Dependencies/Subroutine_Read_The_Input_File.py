@@ -0,0 +1,556 @@
+# -*- coding: utf-8 -*-
+"""
+Functions reading the points of CSV, Parquet and GeoJSON files directly into arrays.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import csv  # Reading CSV files
+import json  # Reading GeoJSON files and GeoParquet metadata
+import numpy  # Storing the coordinates as arrays
+import openpyxl  # Reading the group column of Excel files
+
+from Dependencies.Subroutine_Find_The_Input_File_Type import Find_The_Input_File_Type
+from Dependencies.Subroutine_Load_The_Excel_File import Load_The_Excel_File
+from Dependencies.Subroutine_Validate_Coordinate_Values import (
+    Convert_The_Coordinate_Columns,
+    Find_The_Coordinate_Issues,
+    Validate_Coordinate_Columns,
+)
+
+# Every reader returns the same dictionary as Load_The_Excel_File. The header counts as a row
+# and the number of columns is 3 once the name, latitude and longitude columns were found
+# (other columns are only read by Read_The_Other_Columns when the marked CSV file is written),
+# otherwise it is the number of columns of the file.
+
+# Column names recognised (case-insensitively) as names and coordinates
+NAME_COLUMN_NAMES = ("name", "label", "title", "id")
+LATITUDE_COLUMN_NAMES = ("latitude", "lat", "y")
+LONGITUDE_COLUMN_NAMES = ("longitude", "lon", "lng", "long", "x")
+# Number of CSV rows converted to arrays at once
+CSV_CHUNK_SIZE = 100000
+# Number of bytes the CSV dialect (delimiter, quoting) is guessed from
+CSV_SNIFF_SIZE = 64 * 1024
+# WKB geometry type of a point and the EWKB flag of an included SRID
+WKB_POINT_TYPE = 1
+EWKB_SRID_FLAG = 0x20000000
+
+
+def Find_The_Column(column_names, recognised_names):
+    # Index of the first column with one of the recognised names (None if there is none)
+    lowercase_names = [str(column_name).strip().lower() for column_name in column_names]
+    for recognised_name in recognised_names:
+        if recognised_name in lowercase_names:
+            return lowercase_names.index(recognised_name)
+    return None
+
+
+def Find_The_Point_Columns(column_names):
+    # Indexes of the name, latitude and longitude columns (name may be missing)
+    latitude_index = Find_The_Column(column_names, LATITUDE_COLUMN_NAMES)
+    longitude_index = Find_The_Column(column_names, LONGITUDE_COLUMN_NAMES)
+    if latitude_index is not None and longitude_index is not None:
+        return (
+            Find_The_Column(column_names, NAME_COLUMN_NAMES),
+            latitude_index,
+            longitude_index,
+        )
+    # Without recognised names the columns are expected in the order of the Excel file
+    if len(column_names) >= 3:
+        return 0, 1, 2
+    return None
+
+
+def Create_The_Loaded_File(
+    number_of_points,
+    number_of_columns,
+    names,
+    latitudes=None,
+    longitudes=None,
+    validation_report=None,
+):
+    # Put the read arrays into the form returned by Load_The_Excel_File
+    # (without coordinates and their report if the coordinate columns were not found)
+    return {
+        "number_of_rows": number_of_points + 1,
+        "number_of_columns": number_of_columns,
+        "are_coordinates_valid": validation_report is not None
+        and not len(validation_report["invalid_indexes"]),
+        "names": names,
+        "latitudes": latitudes,
+        "longitudes": longitudes,
+        "validation_report": validation_report,
+    }
+
+
+def Create_The_Csv_Reader(csv_file):
+    # Reader of the rows of the open file in its guessed dialect
+    sample = csv_file.read(CSV_SNIFF_SIZE)
+    csv_file.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    return csv.reader(csv_file, dialect)
+
+
+def Iterate_The_Csv_Points(csv_reader, point_columns):
+    # Name, latitude and longitude text of every point (completely empty lines are skipped)
+    name_index, latitude_index, longitude_index = point_columns
+    n_of_needed_values = max(point_columns, key=lambda index: index or 0) + 1
+    for row_values in csv_reader:
+        if not row_values:
+            continue
+        # Missing cells at the end of a short row are treated as empty
+        if len(row_values) < n_of_needed_values:
+            row_values = row_values + [""] * (n_of_needed_values - len(row_values))
+        yield (
+            row_values[name_index] if name_index is not None else None,
+            row_values[latitude_index],
+            row_values[longitude_index],
+        )
+
+
+def Read_The_Csv_Columns(path_to_csv_file):
+    # Numbers of rows and columns, names and the unconverted latitude and longitude texts
+    # (as Read_The_Excel_Columns, so that the validation can be measured on its own)
+    with open(path_to_csv_file, newline="", encoding="utf-8-sig") as csv_file:
+        csv_reader = Create_The_Csv_Reader(csv_file)
+        header = next(csv_reader, [])
+        point_columns = Find_The_Point_Columns(header)
+        if point_columns is None:
+            return sum(1 for _ in csv_reader) + 1, len(header), [], [], []
+        names = []
+        latitude_values = []
+        longitude_values = []
+        for name, latitude_value, longitude_value in Iterate_The_Csv_Points(
+            csv_reader, point_columns
+        ):
+            names.append(name)
+            latitude_values.append(latitude_value)
+            longitude_values.append(longitude_value)
+    return len(names) + 1, 3, names, latitude_values, longitude_values
+
+
+def Read_The_Csv_File(path_to_csv_file, chunk_size=CSV_CHUNK_SIZE):
+    # Stream the file and convert the coordinates chunk by chunk (the first row is the header)
+    with open(path_to_csv_file, newline="", encoding="utf-8-sig") as csv_file:
+        csv_reader = Create_The_Csv_Reader(csv_file)
+        header = next(csv_reader, [])
+        point_columns = Find_The_Point_Columns(header)
+        if point_columns is None:
+            return Create_The_Loaded_File(sum(1 for _ in csv_reader), len(header), [])
+        names = []
+        # Converted coordinates and masks of missing and non-numeric values of each chunk
+        converted_chunks = []
+        chunk_latitudes = []
+        chunk_longitudes = []
+        for name, latitude_value, longitude_value in Iterate_The_Csv_Points(
+            csv_reader, point_columns
+        ):
+            names.append(name)
+            chunk_latitudes.append(latitude_value)
+            chunk_longitudes.append(longitude_value)
+            if len(chunk_latitudes) == chunk_size:
+                converted_chunks.append(
+                    Convert_The_Coordinate_Columns(chunk_latitudes, chunk_longitudes)
+                )
+                chunk_latitudes = []
+                chunk_longitudes = []
+        if chunk_latitudes or not converted_chunks:
+            converted_chunks.append(
+                Convert_The_Coordinate_Columns(chunk_latitudes, chunk_longitudes)
+            )
+    # The whole columns are checked at once (duplicates may be in different chunks)
+    latitudes, longitudes, is_missing, is_not_numeric = (
+        numpy.concatenate(converted_arrays) for converted_arrays in zip(*converted_chunks)
+    )
+    return Create_The_Loaded_File(
+        len(names),
+        3,
+        names,
+        latitudes,
+        longitudes,
+        Find_The_Coordinate_Issues(latitudes, longitudes, is_missing, is_not_numeric),
+    )
+
+
+def Import_Pyarrow():
+    # The optional pyarrow package is only imported once a Parquet file is read (it takes
+    # longer to import than the rest of the app)
+    try:
+        import pyarrow.parquet  # Reading Parquet files (optional package)
+    except ImportError:
+        raise ImportError(
+            'Reading Parquet files requires the "pyarrow" package (pip install pyarrow).'
+        ) from None
+    return pyarrow
+
+
+def Decode_Wkb_Points(geometries):
+    # Coordinates of WKB/EWKB encoded points read straight from the Arrow buffers
+    # (None if some geometry is missing or is not a point)
+    pyarrow = Import_Pyarrow()
+    n_of_points = len(geometries)
+    if geometries.null_count:
+        return None
+    if n_of_points == 0:
+        return numpy.zeros(0), numpy.zeros(0)
+    offset_type = numpy.int64 if pyarrow.types.is_large_binary(geometries.type) else numpy.int32
+    _, offsets_buffer, data_buffer = geometries.buffers()
+    offsets = numpy.frombuffer(offsets_buffer, dtype=offset_type)[
+        geometries.offset : geometries.offset + n_of_points + 1
+    ]
+    data = numpy.frombuffer(data_buffer, dtype=numpy.uint8)
+    starts = offsets[:-1].astype(numpy.int64)
+    if numpy.any(numpy.diff(offsets) < 21):
+        return None
+    # The first byte tells the byte order of the rest of the value
+    is_little_endian = data[starts] == 1
+    type_bytes = data[starts[:, None] + numpy.arange(1, 5)].astype(numpy.uint32)
+    geometry_types = numpy.where(
+        is_little_endian,
+        type_bytes @ numpy.array([1, 256, 256**2, 256**3], dtype=numpy.uint32),
+        type_bytes @ numpy.array([256**3, 256**2, 256, 1], dtype=numpy.uint32),
+    )
+    # ISO WKB adds 1000/2000/3000 for Z/M/ZM points, EWKB uses the high bits
+    if numpy.any((geometry_types & 0xFFFF) % 1000 != WKB_POINT_TYPE):
+        return None
+    coordinates_starts = starts + numpy.where(
+        geometry_types & EWKB_SRID_FLAG, 9, 5
+    )
+    coordinate_bytes = numpy.ascontiguousarray(
+        data[coordinates_starts[:, None] + numpy.arange(16)]
+    )
+    coordinates = numpy.where(
+        is_little_endian[:, None],
+        coordinate_bytes.view("<f8"),
+        coordinate_bytes.view(">f8"),
+    )
+    # Points are stored in the x (longitude), y (latitude) order
+    return coordinates[:, 1].copy(), coordinates[:, 0].copy()
+
+
+def Read_The_Parquet_File(path_to_parquet_file):
+    # Read only the name and coordinate columns (or the GeoParquet point geometry)
+    pyarrow = Import_Pyarrow()
+    parquet_file = pyarrow.parquet.ParquetFile(path_to_parquet_file)
+    schema = parquet_file.schema_arrow
+    column_names = schema.names
+    n_of_points = parquet_file.metadata.num_rows
+    # GeoParquet files describe their geometry column in the "geo" metadata
+    geo_metadata = json.loads((schema.metadata or {}).get(b"geo", b"null"))
+    if geo_metadata is not None:
+        geometry_column = geo_metadata.get("primary_column", "geometry")
+        geometry_encoding = (
+            geo_metadata.get("columns", {}).get(geometry_column, {}).get("encoding", "WKB")
+        )
+        name_index = Find_The_Column(column_names, NAME_COLUMN_NAMES)
+        name_column = column_names[name_index] if name_index is not None else None
+        point_table = parquet_file.read(
+            columns=[geometry_column] + ([name_column] if name_column else [])
+        )
+        names = (
+            point_table.column(name_column).to_pylist()
+            if name_column
+            else [None] * n_of_points
+        )
+        geometries = point_table.column(geometry_column).combine_chunks()
+        if geometry_encoding.lower() == "point":
+            # GeoArrow point encoding - a struct of x and y coordinates
+            coordinates = (
+                geometries.field("y").to_numpy(zero_copy_only=False).astype(numpy.float64),
+                geometries.field("x").to_numpy(zero_copy_only=False).astype(numpy.float64),
+            )
+        else:
+            coordinates = Decode_Wkb_Points(geometries)
+        if coordinates is None:
+            return Create_The_Loaded_File(n_of_points, 3, names)
+        return Create_The_Loaded_File(
+            n_of_points, 3, names, *Validate_Coordinate_Columns(*coordinates)
+        )
+    # Plain Parquet files hold the coordinates in their own columns
+    point_columns = Find_The_Point_Columns(column_names)
+    if point_columns is None:
+        return Create_The_Loaded_File(n_of_points, len(column_names), [])
+    name_index, latitude_index, longitude_index = point_columns
+    projected_column_names = [column_names[latitude_index], column_names[longitude_index]]
+    if name_index is not None:
+        projected_column_names.append(column_names[name_index])
+    point_table = parquet_file.read(columns=projected_column_names)
+    names = (
+        point_table.column(column_names[name_index]).to_pylist()
+        if name_index is not None
+        else [None] * n_of_points
+    )
+    return Create_The_Loaded_File(
+        n_of_points,
+        3,
+        names,
+        *Validate_Coordinate_Columns(
+            point_table.column(column_names[latitude_index]).to_numpy(),
+            point_table.column(column_names[longitude_index]).to_numpy(),
+        ),
+    )
+
+
+def Read_The_Geojson_File(path_to_geojson_file):
+    # Read the point features of a FeatureCollection (a single Feature is accepted as well)
+    with open(path_to_geojson_file, encoding="utf-8-sig") as geojson_file:
+        geojson_content = json.load(geojson_file)
+    if geojson_content.get("type") == "FeatureCollection":
+        features = geojson_content.get("features") or []
+    else:
+        features = [geojson_content]
+    names = []
+    latitude_values = []
+    longitude_values = []
+    for feature in features:
+        properties = feature.get("properties") or {}
+        names.append(
+            next(
+                (
+                    value
+                    for key, value in properties.items()
+                    if key.lower() in NAME_COLUMN_NAMES
+                ),
+                feature.get("id"),
+            )
+        )
+        geometry = feature.get("geometry") or {}
+        # GeoJSON positions are in the longitude, latitude order (features without a point
+        # geometry have missing coordinates)
+        position = geometry.get("coordinates") if geometry.get("type") == "Point" else None
+        if not isinstance(position, list) or len(position) < 2:
+            position = (None, None)
+        longitude_values.append(position[0])
+        latitude_values.append(position[1])
+    return Create_The_Loaded_File(
+        len(features),
+        3,
+        names,
+        *Validate_Coordinate_Columns(latitude_values, longitude_values),
+    )
+
+
+# Readers of the supported file types
+INPUT_FILE_READERS = {
+    "excel": Load_The_Excel_File,
+    "csv": Read_The_Csv_File,
+    "parquet": Read_The_Parquet_File,
+    "geojson": Read_The_Geojson_File,
+}
+
+
+def Read_The_Input_File(path_to_input_file):
+    # Choose the reader by the file extension
+    return INPUT_FILE_READERS[Find_The_Input_File_Type(path_to_input_file)](
+        path_to_input_file
+    )
+
+
+def Find_The_Group_Column(column_names, group_column):
+    # Index of the group column named by the user (case-insensitively)
+    group_column_index = Find_The_Column(column_names, (group_column.strip().lower(),))
+    if group_column_index is None:
+        raise ValueError(f"The group column '{group_column}' was not found.")
+    return group_column_index
+
+
+def Read_The_Excel_Group_Column(path_to_excel_file, group_column):
+    # Values of the group column of the first sheet (its header is in the first row)
+    excel_workbook_handle = openpyxl.load_workbook(
+        path_to_excel_file, read_only=True, data_only=True
+    )
+    try:
+        row_values = excel_workbook_handle.worksheets[0].iter_rows(values_only=True)
+        group_column_index = Find_The_Group_Column(
+            [value or "" for value in next(row_values, ())], group_column
+        )
+        # Every row is a point, as in Load_The_Excel_File
+        return [
+            row[group_column_index] if group_column_index < len(row) else None
+            for row in row_values
+        ]
+    finally:
+        excel_workbook_handle.close()
+
+
+def Read_The_Csv_Group_Column(path_to_csv_file, group_column):
+    # Values of the group column (completely empty lines are skipped, as in Read_The_Csv_File)
+    with open(path_to_csv_file, newline="", encoding="utf-8-sig") as csv_file:
+        csv_reader = Create_The_Csv_Reader(csv_file)
+        group_column_index = Find_The_Group_Column(next(csv_reader, []), group_column)
+        return [
+            row_values[group_column_index]
+            if group_column_index < len(row_values)
+            else None
+            for row_values in csv_reader
+            if row_values
+        ]
+
+
+def Read_The_Parquet_Group_Column(path_to_parquet_file, group_column):
+    # Values of the group column (only this column is read)
+    pyarrow = Import_Pyarrow()
+    parquet_file = pyarrow.parquet.ParquetFile(path_to_parquet_file)
+    column_names = parquet_file.schema_arrow.names
+    group_column_name = column_names[Find_The_Group_Column(column_names, group_column)]
+    return parquet_file.read(columns=[group_column_name]).column(0).to_pylist()
+
+
+def Read_The_Geojson_Group_Column(path_to_geojson_file, group_column):
+    # Values of the group property of the features
+    with open(path_to_geojson_file, encoding="utf-8-sig") as geojson_file:
+        geojson_content = json.load(geojson_file)
+    if geojson_content.get("type") == "FeatureCollection":
+        features = geojson_content.get("features") or []
+    else:
+        features = [geojson_content]
+    group_values = []
+    is_group_property_found = False
+    for feature in features:
+        properties = feature.get("properties") or {}
+        group_property_index = Find_The_Column(
+            list(properties), (group_column.strip().lower(),)
+        )
+        is_group_property_found |= group_property_index is not None
+        group_values.append(
+            list(properties.values())[group_property_index]
+            if group_property_index is not None
+            else None
+        )
+    if features and not is_group_property_found:
+        raise ValueError(f"The group column '{group_column}' was not found.")
+    return group_values
+
+
+# Readers of the group column of the supported file types
+GROUP_COLUMN_READERS = {
+    "excel": Read_The_Excel_Group_Column,
+    "csv": Read_The_Csv_Group_Column,
+    "parquet": Read_The_Parquet_Group_Column,
+    "geojson": Read_The_Geojson_Group_Column,
+}
+
+
+def Read_The_Group_Column(path_to_input_file, group_column):
+    # Values of the named column for every point of the file (in the order of the points)
+    return GROUP_COLUMN_READERS[Find_The_Input_File_Type(path_to_input_file)](
+        path_to_input_file, group_column
+    )
+
+
+def Read_The_Other_Csv_Columns(path_to_csv_file):
+    # Names of the columns that are not read as the name and coordinates and a generator of
+    # their values in every row (completely empty lines are skipped, as in Read_The_Csv_File)
+    with open(path_to_csv_file, newline="", encoding="utf-8-sig") as csv_file:
+        header = next(Create_The_Csv_Reader(csv_file), [])
+    point_columns = Find_The_Point_Columns(header) or ()
+    other_column_indexes = [
+        index for index in range(len(header)) if index not in point_columns
+    ]
+
+    def Generate_The_Rows():
+        with open(path_to_csv_file, newline="", encoding="utf-8-sig") as csv_file:
+            csv_reader = Create_The_Csv_Reader(csv_file)
+            next(csv_reader, None)
+            for row_values in csv_reader:
+                if row_values:
+                    yield [
+                        row_values[index] if index < len(row_values) else ""
+                        for index in other_column_indexes
+                    ]
+
+    return [header[index] for index in other_column_indexes], Generate_The_Rows()
+
+
+def Read_The_Other_Parquet_Columns(path_to_parquet_file):
+    # Names of the columns that are not read as the name and coordinates (or the geometry)
+    # and a generator of their values in every row (read in batches)
+    pyarrow = Import_Pyarrow()
+    parquet_file = pyarrow.parquet.ParquetFile(path_to_parquet_file)
+    schema = parquet_file.schema_arrow
+    column_names = schema.names
+    geo_metadata = json.loads((schema.metadata or {}).get(b"geo", b"null"))
+    if geo_metadata is not None:
+        point_columns = (
+            Find_The_Column(column_names, NAME_COLUMN_NAMES),
+            Find_The_Column(
+                column_names, (geo_metadata.get("primary_column", "geometry").lower(),)
+            ),
+        )
+    else:
+        point_columns = Find_The_Point_Columns(column_names) or ()
+    other_column_names = [
+        column_name
+        for index, column_name in enumerate(column_names)
+        if index not in point_columns
+    ]
+
+    def Generate_The_Rows():
+        if not other_column_names:
+            yield from ([] for _ in range(parquet_file.metadata.num_rows))
+            return
+        for batch in parquet_file.iter_batches(columns=other_column_names):
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+
+    return other_column_names, Generate_The_Rows()
+
+
+def Read_The_Other_Geojson_Columns(path_to_geojson_file):
+    # Names of the properties that are not read as the name (in the order they first appear)
+    # and their values in every feature
+    with open(path_to_geojson_file, encoding="utf-8-sig") as geojson_file:
+        geojson_content = json.load(geojson_file)
+    if geojson_content.get("type") == "FeatureCollection":
+        features = geojson_content.get("features") or []
+    else:
+        features = [geojson_content]
+    other_properties = []
+    for feature in features:
+        properties = dict(feature.get("properties") or {})
+        # The first property with a recognised name is the name, as in Read_The_Geojson_File
+        name_key = next(
+            (key for key in properties if key.lower() in NAME_COLUMN_NAMES), None
+        )
+        properties.pop(name_key, None)
+        other_properties.append(properties)
+    other_column_names = list(
+        dict.fromkeys(key for properties in other_properties for key in properties)
+    )
+    return other_column_names, (
+        [
+            # Nested values are written as JSON
+            json.dumps(value) if isinstance(value, (dict, list)) else value
+            for value in (properties.get(key) for key in other_column_names)
+        ]
+        for properties in other_properties
+    )
+
+
+# Readers of the other columns of the supported file types (Excel files are copied whole)
+OTHER_COLUMNS_READERS = {
+    "csv": Read_The_Other_Csv_Columns,
+    "parquet": Read_The_Other_Parquet_Columns,
+    "geojson": Read_The_Other_Geojson_Columns,
+}
+
+
+def Read_The_Other_Columns(path_to_input_file):
+    # Names of the columns of the file besides the name and coordinates and their values for
+    # every point of the file (in the order of the points)
+    return OTHER_COLUMNS_READERS[Find_The_Input_File_Type(path_to_input_file)](
+        path_to_input_file
+    )
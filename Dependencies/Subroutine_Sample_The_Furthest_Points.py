@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Functions selecting large numbers of points by farthest-point sampling.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import numpy  # Minimal distances of all candidates as one array
+
+from Dependencies.Class_Implementing_Selection_Metrics import Count_The_Event
+
+from Dependencies.Class_Implementing_Spatial_Index import Get_The_Search_Radius
+from Dependencies.Subroutine_Calculate_Distances import Calculate_Distances
+from Dependencies.Subroutine_Cache_Distance_Matrix import Get_Cache_Key
+from Dependencies.Subroutine_Extend_The_Selection import Get_Distances_From_Point
+
+# Every step selects the candidate furthest from all already selected points. Only the
+# distance of each candidate to its closest selected point is kept, so one step costs one
+# row of distances and one pass over the candidates, no matter how many points were selected.
+# Like the uniform spacing selection, it starts from the furthest pair and is deterministic,
+# so the selection of k points is a prefix of the selection of k+1 points.
+# The new point is the furthest candidate, so only the candidates closer to it than its own
+# minimal distance can get a smaller minimal distance. With a spatial index of the points,
+# the distances are therefore calculated only for the candidates within that radius.
+# With the approximate distance model, the candidates whose minimal distance is within the
+# error bound of the largest one get their minimal distance by the ellipsoidal distances
+# and the furthest of them by these is selected.
+
+
+def Add_Sampled_Point(
+    selection_state, point_index, point_distances, candidate_indexes=None
+):
+    # The new point may be the closest selected point of some candidates
+    # (of all points, or only of the given candidates the distances were calculated for)
+    minimal_distances = selection_state["minimal_distances"]
+    if candidate_indexes is None:
+        numpy.minimum(minimal_distances, point_distances, out=minimal_distances)
+    else:
+        minimal_distances[candidate_indexes] = numpy.minimum(
+            minimal_distances[candidate_indexes], point_distances
+        )
+    selection_state["selected_indexes"].append(int(point_index))
+    selection_state["is_available"][point_index] = False
+
+
+def Refine_The_Furthest_Point(
+    selection_state, latitudes, longitudes, candidate_distances
+):
+    # Furthest candidate by the ellipsoidal distances among those the approximation can not tell apart
+    largest_distance = numpy.max(candidate_distances)
+    candidate_indexes = numpy.flatnonzero(
+        candidate_distances
+        >= largest_distance - Find_The_Distance_Margin(selection_state, largest_distance)
+    )
+    return Refine_Among_The_Furthest_Candidates(
+        selection_state, latitudes, longitudes, candidate_indexes
+    )
+
+
+def Find_The_Distance_Margin(selection_state, largest_distance):
+    # Minimal distances of two candidates differ by at most twice the error of each of them
+    approximation_error = selection_state["approximation_error"]
+    return 2 * approximation_error * largest_distance * (1 + approximation_error)
+
+
+def Refine_Among_The_Furthest_Candidates(
+    selection_state, latitudes, longitudes, candidate_indexes
+):
+    # Furthest of the given candidates by the ellipsoidal distances
+    if len(candidate_indexes) == 1:
+        return int(candidate_indexes[0])
+    selected_indexes = selection_state["selected_indexes"]
+    # (measured from the selected points, like the distances of the exact selection)
+    exact_minimal_distances = Calculate_Distances(
+        latitudes[selected_indexes, numpy.newaxis],
+        longitudes[selected_indexes, numpy.newaxis],
+        latitudes[numpy.newaxis, candidate_indexes],
+        longitudes[numpy.newaxis, candidate_indexes],
+    ).min(axis=0)
+    return int(candidate_indexes[numpy.argmax(exact_minimal_distances)])
+
+
+def Start_The_Furthest_Point_Sampling(
+    latitudes,
+    longitudes,
+    furthest_pair_indexes,
+    distance_model="ellipsoidal",
+    condensed_distance_matrix=None,
+    parallel_context=None,
+    projected_points=None,
+    approximation_error=0.0,
+):
+    # Create the sampling state holding the minimal distances, seeded by the furthest pair
+    n_of_points = len(latitudes)
+    selection_state = {
+        "selected_indexes": [],
+        "is_available": numpy.ones(n_of_points, dtype=bool),
+        "minimal_distances": numpy.full(n_of_points, numpy.inf),
+        "distance_model": distance_model,
+        "points_key": Get_Cache_Key(latitudes, longitudes, distance_model),
+        "selection_mode": "furthest_point",
+    }
+    # Approximate distances are refined by the ellipsoidal ones (within their error bound)
+    if distance_model == "approximate":
+        selection_state["approximation_error"] = approximation_error
+    for point_index in furthest_pair_indexes:
+        Add_Sampled_Point(
+            selection_state,
+            point_index,
+            Get_Distances_From_Point(
+                latitudes,
+                longitudes,
+                point_index,
+                distance_model,
+                condensed_distance_matrix,
+                parallel_context,
+                projected_points,
+            ),
+        )
+    return selection_state
+
+
+def Extend_The_Furthest_Point_Sampling(
+    selection_state,
+    latitudes,
+    longitudes,
+    how_many_points_to_find,
+    condensed_distance_matrix=None,
+    parallel_context=None,
+    progress_callback=None,
+    spatial_index=None,
+    projected_points=None,
+):
+    # Look for points until specified number has been found
+    distance_model = selection_state["distance_model"]
+    while len(selection_state["selected_indexes"]) < how_many_points_to_find:
+        if not selection_state["is_available"].any():
+            break
+        # Already selected points have zero distance to themselves, so they are never chosen again
+        # (copies of them as well - they are only chosen once all other points are selected)
+        candidate_distances = numpy.where(
+            selection_state["is_available"], selection_state["minimal_distances"], -1
+        )
+        Count_The_Event(
+            "candidate_rows_scored",
+            len(candidate_distances) - len(selection_state["selected_indexes"]),
+        )
+        furthest_point_index = int(numpy.argmax(candidate_distances))
+        largest_minimal_distance = candidate_distances[furthest_point_index]
+        if distance_model == "approximate":
+            furthest_point_index = Refine_The_Furthest_Point(
+                selection_state, latitudes, longitudes, candidate_distances
+            )
+        if spatial_index is not None:
+            # Only the candidates within the largest minimal distance of the new point can change
+            candidate_indexes, _ = spatial_index.query_radius(
+                latitudes[furthest_point_index],
+                longitudes[furthest_point_index],
+                Get_The_Search_Radius(largest_minimal_distance, distance_model),
+            )
+            Add_Sampled_Point(
+                selection_state,
+                furthest_point_index,
+                Calculate_Distances(
+                    latitudes[furthest_point_index],
+                    longitudes[furthest_point_index],
+                    latitudes[candidate_indexes],
+                    longitudes[candidate_indexes],
+                    distance_model,
+                ),
+                candidate_indexes,
+            )
+        else:
+            Add_Sampled_Point(
+                selection_state,
+                furthest_point_index,
+                Get_Distances_From_Point(
+                    latitudes,
+                    longitudes,
+                    furthest_point_index,
+                    distance_model,
+                    condensed_distance_matrix,
+                    parallel_context,
+                    projected_points,
+                ),
+            )
+        if progress_callback is not None:
+            progress_callback(
+                "selection",
+                len(selection_state["selected_indexes"]),
+                how_many_points_to_find,
+            )
+    return selection_state["selected_indexes"]
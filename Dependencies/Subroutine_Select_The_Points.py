@@ -17,379 +17,670 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see https://www.gnu.org/licenses/.
 """
 import os  # Working with file paths
-import openpyxl  # Working with Excel files
-import openpyxl.styles  # Excel cell formatting
-from openpyxl.worksheet.table import Table  # Excel table management
-from openpyxl.styles.borders import Border, Side  # Excel cell border formatting
-import geopy.point  # Definition of point object with lat/lon coordinates
-import geopy.distance  # Distance between point objects in m or km
+import tempfile  # Writing the output into a temporary file first
+import functools  # Binding the progress reporting arguments
+import shutil  # Copying the file permissions
 import numpy  # Statistical functions std,argmin
 import webbrowser  # Working with web browser
-import gmplot  # Plotting the coordinates using gmaps
-import shutil  # Making a backup copy of a file
 
-
-def Select_The_Points(path_to_excel_file, how_many_points_to_find):
-
-    # Make a copy of the original file with the intention to modify only the copy
-    chosen_file_folder_path_and_file_name = os.path.split(path_to_excel_file)
-    chosen_file_folder_path = chosen_file_folder_path_and_file_name[0]
-    chosen_file_name_and_extension = os.path.splitext(
-        chosen_file_folder_path_and_file_name[1]
-    )
-    copied_file_name = (
-        chosen_file_name_and_extension[0]
-        + "_MARKED"
-        + chosen_file_name_and_extension[1]
-    )
-    path_to_copied_file = os.path.join(chosen_file_folder_path, copied_file_name)
-    shutil.copy(path_to_excel_file, path_to_copied_file)
-
-    # Open the copy of the original file
-    excel_workbook_handle = openpyxl.load_workbook(path_to_copied_file)
-
-    # Get sheet names and select the first one (assuming that it is the correct one)
-    sheet_names = excel_workbook_handle.sheetnames
-    first_sheet_name = sheet_names[0]
-    first_sheet = excel_workbook_handle[first_sheet_name]
-
-    # Define assumed constants
-    header_row_number = 1
-    names_column_number = 1
-    x_column_number = 2
-    y_column_number = 3
-    ordering_column_number = 5
-    ordered_names_column_number = ordering_column_number + 1
-    x_selected_column_number = ordered_names_column_number + 1
-    y_selected_column_number = x_selected_column_number + 1
-
-    # Extract the individual coordinates from file as a list of point objects
-    extracted_points = []
-    for row in range(header_row_number + 1, first_sheet.max_row + 1):
-        x_coordinate = first_sheet.cell(row, x_column_number).value
-        y_coordinate = first_sheet.cell(row, y_column_number).value
-        extracted_points.append(geopy.point.Point(x_coordinate, y_coordinate))
-    # Create a dictionary and corresponding index list mirroring/representing the extracted points
-    available_points = {}
-    available_points_indexes = []
-    for index, point in enumerate(extracted_points):
-        available_points[index] = point
-        available_points_indexes.append(index)
-    # Find two points and their indexes that are furthest apart - maximal distance between them
-    n_of_available_points = len(available_points)
-    maximal_distance = 0
-    furthest_pair_indexes = ()
-    for first_point_index in range(n_of_available_points):
-        for second_point_index in range(first_point_index + 1, n_of_available_points):
-            first_point = available_points[first_point_index]
-            second_point = available_points[second_point_index]
-            point_distance = geopy.distance.distance(first_point, second_point).km
-            if point_distance > maximal_distance:
-                maximal_distance = point_distance
-                furthest_pair_indexes = (first_point_index, second_point_index)
-    # Mark these two points as selected by removing them from the dictionary/list of available points/indexes
-    # Manage points
-    selected_points = {}
-    selected_points[furthest_pair_indexes[0]] = available_points.pop(
-        furthest_pair_indexes[0]
-    )
-    selected_points[furthest_pair_indexes[1]] = available_points.pop(
-        furthest_pair_indexes[1]
-    )
-    # Manage indexes
-    selected_points_indexes = list(furthest_pair_indexes)
-    available_points_indexes.remove(furthest_pair_indexes[0])
-    available_points_indexes.remove(furthest_pair_indexes[1])
-
-    # Look for points until specified number has been found
-    while len(selected_points) < how_many_points_to_find:
-        # Define testing matrix where each available point will be in a separate row together with already selected points
-        # All already selected points + 1 extra slot for 1 available point to test its "compatibility" wtith the others
-        n_of_columns = len(selected_points) + 1
-        n_of_rows = len(available_points)
-        testing_matrix = []
-        # Initialize first row with zeroes
-        first_row = [0] * n_of_columns
-        # Fill first row with already selected points (the extra slot at the end remains 0 at this point)
-        for i in range(len(selected_points)):
-            first_row[i] = selected_points[selected_points_indexes[i]]
-        # Add the row to the "matrix"
-        testing_matrix.extend(first_row)
-        # Actually generate the matrix by copying the first row (selected points are the same in each row)
-        testing_matrix = [testing_matrix.copy() for x in range(n_of_rows)]
-
-        # Fill the last positions in each row of the matrix by one of the available points (the rows differ only in the last position)
-        for i in range(len(available_points)):
-            testing_matrix[i][n_of_columns - 1] = available_points[
-                available_points_indexes[i]
-            ]
-        # Calculate distances of each two points in each row from each other and store it in the distance matrix (think of traveling in rows by the columns)
-        distance_matrix = []
-        for i in range(n_of_rows):
-            distances_row = []
-            for j in range(n_of_columns):
-                # k is used so that already calculated pairs do not repeat, as that would be unnecessary
-                for k in range(j + 1, n_of_columns):
-                    distances_row.append(
-                        geopy.distance.distance(
-                            testing_matrix[i][j], testing_matrix[i][k]
-                        ).km
-                    )
-            distance_matrix.append(distances_row)
-        # Calculate standard deviation for each row - to find out how the additional new point affected the variance
-        standard_deviations = []
-        for row in distance_matrix:
-            standard_deviations.append(numpy.std(row))
-        # Find optimal index - optimal in a sense of representing minimal standard deviation
-        optimal_point_index = numpy.argmin(standard_deviations)
-
-        # Select the suitable points - remove from available points/their indexes, and append to the selected points/their indexes
-        selected_points[
-            available_points_indexes[optimal_point_index]
-        ] = available_points.pop(available_points_indexes[optimal_point_index])
-        selected_points_indexes.append(available_points_indexes[optimal_point_index])
-        available_points_indexes.remove(available_points_indexes[optimal_point_index])
-    # Extract the names of selected points
-    list_of_selected_names = []
-    for point_index in selected_points_indexes:
-        list_of_selected_names.append(
-            first_sheet.cell(point_index + 2, names_column_number).value
+from Dependencies.Class_Implementing_Point_Dataset import Load_The_Point_Dataset
+from Dependencies.Class_Implementing_Selection_Cancelled import Selection_Cancelled
+from Dependencies.Class_Implementing_Selection_Metrics import (
+    Selection_Metrics,
+    Count_The_Event,
+    Measure_The_Stage,
+    Write_The_Metrics_File,
+)
+from Dependencies.Class_Implementing_Spatial_Index import Spatial_Index
+from Dependencies.Subroutine_Calculate_Distances import Calculate_Distance_Matrix
+from Dependencies.Subroutine_Find_The_Input_File_Type import EXCEL_FILE_EXTENSIONS
+from Dependencies.Subroutine_Read_The_Input_File import Read_The_Other_Columns
+from Dependencies.Subroutine_Validate_Coordinate_Values import (
+    Describe_The_Validation_Report,
+)
+from Dependencies.Subroutine_Write_The_Marked_Excel_File import (
+    Write_The_Marked_Excel_File,
+)
+from Dependencies.Subroutine_Write_The_Marked_Csv_File import (
+    Write_The_Marked_Csv_File,
+)
+from Dependencies.Subroutine_Find_The_Furthest_Pair import Find_The_Furthest_Pair
+from Dependencies.Subroutine_Optimize_The_Route import (
+    DEFAULT_ROUTE_TIME_BUDGET,
+    Optimize_The_Route,
+)
+from Dependencies.Subroutine_Cache_Distance_Matrix import (
+    Load_Condensed_Distance_Matrix,
+    Find_The_Furthest_Pair_In_Condensed_Matrix,
+)
+from Dependencies.Subroutine_Calculate_Distances_In_Parallel import (
+    Start_The_Worker_Pool,
+    Stop_The_Worker_Pool,
+)
+from Dependencies.Subroutine_Extend_The_Selection import (
+    SELECTION_MODES,
+    Start_The_Selection,
+    Extend_The_Selection,
+    Is_The_Selection_State_Valid,
+)
+from Dependencies.Subroutine_Sample_The_Furthest_Points import (
+    Start_The_Furthest_Point_Sampling,
+    Extend_The_Furthest_Point_Sampling,
+)
+from Dependencies.Subroutine_Project_To_Local_Frame import Prepare_The_Approximation
+from Dependencies.Subroutine_Find_The_Selection_Order_In_Blocks import (
+    DEFAULT_MEMORY_LIMIT,
+    Find_The_Selection_Order_In_Blocks,
+)
+from Dependencies.Subroutine_Draw_The_Offline_Map import (
+    Choose_The_Map_Renderer,
+    Draw_The_Offline_Map,
+    Find_The_Marker_Colors,
+)
+
+
+def Find_The_Selection_Order(
+    latitudes,
+    longitudes,
+    maximal_number_of_points,
+    distance_model="ellipsoidal",
+    furthest_pair_method="convex_hull",
+    use_distance_cache=False,
+    distance_cache_folder=None,
+    selection_state=None,
+    number_of_workers=1,
+    progress_callback=None,
+    selection_mode="uniform_spacing",
+):
+    # Select up to the given number of points - the selection of any smaller size is its prefix
+    # A given selection state of the same points is extended in place instead of starting over
+    # The uniform spacing mode minimises the spread of the distances among the selected points,
+    # the furthest point mode (meant for large numbers of points) maximises their separation
+    if selection_mode not in SELECTION_MODES:
+        raise ValueError(
+            f"Unknown selection mode '{selection_mode}'. Expected one of {SELECTION_MODES}."
         )
-    # Performing two separate distance sorts with different starting points
-    list_of_selected_points = list(selected_points.values())
-    # Sorted from south to north
-    downmost_sorted_points, downmost_sorted_names = zip(
-        *sorted(
-            zip(list_of_selected_points, list_of_selected_names),
-            key=lambda pair: pair[0].latitude,
+    # The approximate model is meant to avoid the full matrix, and the cached one would hold
+    # other distances than the projected points (selecting other points than without it)
+    if distance_model == "approximate" and use_distance_cache:
+        raise ValueError(
+            "The distance cache can not be used with the approximate distance model."
         )
-    )
-    # Sorted from west to east
-    leftmost_sorted_points, leftmost_sorted_names = zip(
-        *sorted(
-            zip(list_of_selected_points, list_of_selected_names),
-            key=lambda pair: pair[0].longitude,
+    if selection_state is None:
+        selection_state = {}
+    # The approximate distances are measured between the points projected once into a local
+    # frame (the ellipsoidal ones are used instead if the points are too far apart for it)
+    projected_points = None
+    approximation_error = 0.0
+    if distance_model == "approximate":
+        projected_points, approximation_error = Prepare_The_Approximation(
+            latitudes, longitudes
         )
+        if projected_points is None:
+            distance_model = "ellipsoidal"
+    is_selection_state_valid = Is_The_Selection_State_Valid(
+        selection_state, latitudes, longitudes, distance_model, selection_mode
     )
-
-    # Transform tuples to lists to use pop()
-    downmost_sorted_points = list(downmost_sorted_points)
-    downmost_sorted_names = list(downmost_sorted_names)
-    leftmost_sorted_points = list(leftmost_sorted_points)
-    leftmost_sorted_names = list(leftmost_sorted_names)
-
-    # Sorting of points in a way to assure the smallest distance between two adjacent points - optimal route
-    distance_sorted_points_starting_down = []
-    distance_sorted_points_starting_left = []
-
-    # Variables to store names of sorted points
-    distance_sorted_names_starting_down = []
-    distance_sorted_names_starting_left = []
-
-    # Pick the downmost and leftmost point in the south and west as the starting points
-    distance_sorted_points_starting_down.append(downmost_sorted_points.pop(0))
-    distance_sorted_points_starting_left.append(leftmost_sorted_points.pop(0))
-
-    # Pick the downmost and leftmost name in the south and west as the starting names
-    distance_sorted_names_starting_down.append(downmost_sorted_names.pop(0))
-    distance_sorted_names_starting_left.append(leftmost_sorted_names.pop(0))
-
-    # While some points are still left - until all points have been ordered
-    # Calculate total distance to compare at the end
-    total_distance_down = 0
-    while downmost_sorted_points:
-        smallest_distance = None
-        smallest_distance_point_index = None
-        # Calculate distance with regard to the last "selected" point
-        first_point = distance_sorted_points_starting_down[-1]
-        for index, second_point in enumerate(downmost_sorted_points):
-            distance = geopy.distance.distance(first_point, second_point).km
-            if not smallest_distance or distance < smallest_distance:
-                smallest_distance = distance
-                smallest_distance_point_index = index
-                total_distance_down += distance
-        distance_sorted_points_starting_down.append(
-            downmost_sorted_points.pop(smallest_distance_point_index)
+    # Nothing needs to be calculated if the state already holds enough points
+    if (
+        is_selection_state_valid
+        and len(selection_state["selected_indexes"]) >= maximal_number_of_points
+    ):
+        return selection_state
+    # Optionally map the distance matrix of the point set from the cache (calculated on first use)
+    condensed_distance_matrix = None
+    if use_distance_cache:
+        with Measure_The_Stage("distance_cache"):
+            condensed_distance_matrix = Load_Condensed_Distance_Matrix(
+                latitudes,
+                longitudes,
+                distance_model,
+                distance_cache_folder,
+                progress_callback=progress_callback,
+            )
+    # Optionally split the distance calculations among a pool of worker processes
+    parallel_context = None
+    if (
+        number_of_workers > 1
+        and condensed_distance_matrix is None
+        and projected_points is None
+    ):
+        parallel_context = Start_The_Worker_Pool(
+            latitudes, longitudes, number_of_workers
         )
-        distance_sorted_names_starting_down.append(
-            downmost_sorted_names.pop(smallest_distance_point_index)
+    try:
+        if not is_selection_state_valid:
+            # Find two points and their indexes that are furthest apart - maximal distance between them
+            with Measure_The_Stage("seed_pair"):
+                if condensed_distance_matrix is not None:
+                    (
+                        furthest_pair_indexes,
+                        maximal_distance,
+                    ) = Find_The_Furthest_Pair_In_Condensed_Matrix(
+                        condensed_distance_matrix, len(latitudes)
+                    )
+                else:
+                    furthest_pair_indexes, maximal_distance = Find_The_Furthest_Pair(
+                        latitudes,
+                        longitudes,
+                        distance_model,
+                        furthest_pair_method,
+                        parallel_context=parallel_context,
+                        progress_callback=progress_callback,
+                    )
+            # Without a furthest pair (all points coincide or there is only one) every point is
+            # as good as any other - the first points are the seed and all distances are zero
+            if not furthest_pair_indexes:
+                furthest_pair_indexes = tuple(range(min(2, len(latitudes))))
+                maximal_distance = 0.0
+            # The seed is complete (the selection starts from here)
+            if progress_callback is not None:
+                progress_callback("seed", 1, 1)
+            # Mark these two points as selected and keep running distance statistics of all candidates
+            selection_state.clear()
+            if selection_mode == "furthest_point":
+                selection_state.update(
+                    Start_The_Furthest_Point_Sampling(
+                        latitudes,
+                        longitudes,
+                        furthest_pair_indexes,
+                        distance_model,
+                        condensed_distance_matrix,
+                        parallel_context,
+                        projected_points,
+                        approximation_error,
+                    )
+                )
+            else:
+                selection_state.update(
+                    Start_The_Selection(
+                        latitudes,
+                        longitudes,
+                        furthest_pair_indexes,
+                        maximal_distance,
+                        distance_model,
+                        condensed_distance_matrix,
+                        parallel_context,
+                        projected_points,
+                        approximation_error,
+                    )
+                )
+        # Look for points until specified number has been found
+        if selection_mode == "furthest_point":
+            # Without the cached matrix, the distances are only calculated for the candidates
+            # found around each new point by the spatial index
+            Extend_The_Furthest_Point_Sampling(
+                selection_state,
+                latitudes,
+                longitudes,
+                maximal_number_of_points,
+                condensed_distance_matrix,
+                parallel_context,
+                progress_callback,
+                spatial_index=Spatial_Index(latitudes, longitudes)
+                if condensed_distance_matrix is None
+                else None,
+                projected_points=projected_points,
+            )
+        else:
+            Extend_The_Selection(
+                selection_state,
+                latitudes,
+                longitudes,
+                maximal_number_of_points,
+                condensed_distance_matrix,
+                parallel_context,
+                progress_callback,
+                projected_points,
+            )
+    finally:
+        if parallel_context is not None:
+            Stop_The_Worker_Pool(parallel_context)
+    return selection_state
+
+
+def Find_The_Output_Names(path_to_input_file):
+    # Folder and name stem of the output files of the input file, name of its marked copy and
+    # whether the input is an Excel file (Excel files are copied and marked, the points of
+    # other files are written into a CSV file)
+    # The stem of other files keeps their extension, so e.g. "points.csv" and "points.geojson"
+    # in one folder do not overwrite each other's (or an Excel file's) marked file and map
+    folder_path, file_name_and_extension = os.path.split(path_to_input_file)
+    file_name, file_extension = os.path.splitext(file_name_and_extension)
+    is_excel_file = file_extension.lower() in EXCEL_FILE_EXTENSIONS
+    if is_excel_file:
+        return folder_path, file_name, file_name + "_MARKED" + file_extension, True
+    file_name += "_" + file_extension.lstrip(".").lower()
+    return folder_path, file_name, file_name + "_MARKED.csv", False
+
+
+def Replace_The_Marked_File(path_to_input_file, path_to_marked_file, write_the_file):
+    # The file is written into a temporary file in the same folder first, which replaces the
+    # marked file only once it is complete (a failed or cancelled writing leaves it untouched)
+    folder_path, marked_file_name = os.path.split(path_to_marked_file)
+    temporary_file_handle, path_to_temporary_file = tempfile.mkstemp(
+        suffix=os.path.splitext(marked_file_name)[1],
+        prefix=os.path.splitext(marked_file_name)[0] + ".",
+        dir=folder_path or None,
+    )
+    os.close(temporary_file_handle)
+    try:
+        write_the_file(path_to_temporary_file)
+        # Temporary files are private, the marked file gets the permissions of the original one
+        shutil.copymode(path_to_input_file, path_to_temporary_file)
+        os.replace(path_to_temporary_file, path_to_marked_file)
+    except BaseException:
+        os.remove(path_to_temporary_file)
+        raise
+
+
+def Draw_The_Selection_Map(
+    path_to_map,
+    map_renderer,
+    latitudes,
+    longitudes,
+    middle_latitude,
+    middle_longitude,
+    selected_latitudes,
+    selected_longitudes,
+    selected_labels=None,
+    selected_groups=None,
+):
+    # Large point sets are drawn on the compact offline canvas map
+    if Choose_The_Map_Renderer(map_renderer, len(latitudes)) == "canvas":
+        Draw_The_Offline_Map(
+            path_to_map,
+            latitudes,
+            longitudes,
+            selected_latitudes,
+            selected_longitudes,
+            selected_labels,
+            selected_groups,
         )
-    # While some points are still left - until all points have been ordered
-    # Calculate total distance to compare at the end
-    total_distance_left = 0
-    while leftmost_sorted_points:
-        smallest_distance = None
-        smallest_distance_point_index = None
-        # Calculate distance with regard to the last "selected" point
-        first_point = distance_sorted_points_starting_left[-1]
-        for index, second_point in enumerate(leftmost_sorted_points):
-            distance = geopy.distance.distance(first_point, second_point).km
-            if not smallest_distance or distance < smallest_distance:
-                smallest_distance = distance
-                smallest_distance_point_index = index
-                total_distance_left += distance
-        distance_sorted_points_starting_left.append(
-            leftmost_sorted_points.pop(smallest_distance_point_index)
+    else:
+        Draw_The_Map(
+            path_to_map,
+            middle_latitude,
+            middle_longitude,
+            latitudes,
+            longitudes,
+            selected_latitudes,
+            selected_longitudes,
+            selected_labels,
+            selected_groups,
         )
-        distance_sorted_names_starting_left.append(
-            leftmost_sorted_names.pop(smallest_distance_point_index)
+
+
+def Report_Progress(
+    progress_callback, cancel_event, stage, finished_work, total_work
+):
+    # Stop between two steps if the cancellation was requested, report the progress otherwise
+    if cancel_event is not None and cancel_event.is_set():
+        raise Selection_Cancelled()
+    if progress_callback is not None:
+        progress_callback(stage, finished_work, total_work)
+
+
+def Get_The_Selection_Prefixes(selection_state, minimal_number_of_points=2):
+    # Selections of every size up to the size of the found selection order
+    selected_indexes = selection_state["selected_indexes"]
+    return {
+        number_of_points: selected_indexes[:number_of_points]
+        for number_of_points in range(
+            minimal_number_of_points, len(selected_indexes) + 1
         )
-    # Select the path with the smaller total distance as the one to be exported
-    if total_distance_down < total_distance_left:
-        points_to_write_to_excel = distance_sorted_points_starting_down
-        names_to_write_to_excel = distance_sorted_names_starting_down
-    else:
-        points_to_write_to_excel = distance_sorted_points_starting_left
-        names_to_write_to_excel = distance_sorted_names_starting_left
-    # Fill the cells representing the selected points with red colour
-    for row in selected_points_indexes:
-        for column in range(1, first_sheet.max_column + 1):
-            first_sheet.cell(row + 2, column).fill = openpyxl.styles.PatternFill(
-                fgColor="FFCCCC", fill_type="solid"
-            )
-            first_sheet.cell(row + 2, column).font = openpyxl.styles.Font(
-                color="9C0006"
-            )
-    # Define cell border
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
+    }
+
+
+def Order_The_Selected_Points(
+    selected_latitudes,
+    selected_longitudes,
+    distance_model="ellipsoidal",
+    route_time_budget=DEFAULT_ROUTE_TIME_BUDGET,
+):
+    # Route through the selected points (their order) with its initial and final length in km
+    # Distances between every two selected points are calculated only once for the whole ordering
+    # (the route of the approximate model is measured by the exact ellipsoidal distances)
+    route_distance_matrix = Calculate_Distance_Matrix(
+        selected_latitudes,
+        selected_longitudes,
+        "ellipsoidal" if distance_model == "approximate" else distance_model,
+    )
+    # Sorted from south to north and from west to east (starting points of the two sorts)
+    downmost_point_index = int(numpy.argmin(selected_latitudes))
+    leftmost_point_index = int(numpy.argmin(selected_longitudes))
+    return Optimize_The_Route(
+        route_distance_matrix,
+        (downmost_point_index, leftmost_point_index),
+        route_time_budget,
     )
 
-    # Add headers for selected points and format them
-    first_sheet.cell(1, ordering_column_number).value = "Number"
-    first_sheet.cell(1, ordering_column_number).font = openpyxl.styles.Font(bold=True)
-    first_sheet.cell(1, ordering_column_number).border = thin_border
-    first_sheet.cell(1, ordered_names_column_number).value = "Description"
-    first_sheet.cell(1, ordered_names_column_number).font = openpyxl.styles.Font(
-        bold=True
+
+def Select_The_Point_Indexes(
+    latitudes,
+    longitudes,
+    how_many_points_to_find,
+    distance_model="ellipsoidal",
+    furthest_pair_method="convex_hull",
+    selection_mode="uniform_spacing",
+    route_time_budget=DEFAULT_ROUTE_TIME_BUDGET,
+):
+    # Select the points of the coordinate arrays without any files - the indexes of the
+    # selected points (in the selection order), their route and its length in km
+    selection_state = Find_The_Selection_Order(
+        latitudes,
+        longitudes,
+        how_many_points_to_find,
+        distance_model,
+        furthest_pair_method,
+        selection_mode=selection_mode,
     )
-    first_sheet.cell(1, ordered_names_column_number).border = thin_border
-    first_sheet.cell(1, x_selected_column_number).value = "Latitude [°]"
-    first_sheet.cell(1, x_selected_column_number).font = openpyxl.styles.Font(bold=True)
-    first_sheet.cell(1, x_selected_column_number).border = thin_border
-    first_sheet.cell(1, y_selected_column_number).value = "Longitude [°]"
-    first_sheet.cell(1, y_selected_column_number).font = openpyxl.styles.Font(bold=True)
-    first_sheet.cell(1, y_selected_column_number).border = thin_border
-
-    # Write the selected points in separate columns into the excel file and format them
-    n_of_selected_points = len(selected_points)
-    for row in range(n_of_selected_points):
-        first_sheet.cell(row + 2, ordering_column_number).value = row + 1
-        first_sheet.cell(row + 2, ordering_column_number).number_format = "0"
-        first_sheet.cell(row + 2, ordering_column_number).border = thin_border
-        first_sheet.cell(
-            row + 2, ordered_names_column_number
-        ).value = names_to_write_to_excel[row]
-        first_sheet.cell(row + 2, ordered_names_column_number).border = thin_border
-        first_sheet.cell(
-            row + 2, x_selected_column_number
-        ).value = points_to_write_to_excel[row].latitude
-        first_sheet.cell(row + 2, x_selected_column_number).number_format = "0.00000"
-        first_sheet.cell(row + 2, x_selected_column_number).border = thin_border
-        first_sheet.cell(
-            row + 2, y_selected_column_number
-        ).value = points_to_write_to_excel[row].longitude
-        first_sheet.cell(row + 2, y_selected_column_number).number_format = "0.00000"
-        first_sheet.cell(row + 2, y_selected_column_number).border = thin_border
-    # Note: This step is valid only if the Excel decimal delimiter in your language is colon
-    # Replace dot delimiters with colon in the original data range (if present)
-    for row in range(header_row_number + 1, first_sheet.max_row + 1):
-        for column in range(x_column_number, y_column_number + 1):
-            cell_string_value = str(first_sheet.cell(row, column).value)
-            if "." in cell_string_value:
-                first_sheet.cell(row, column).value = float(
-                    first_sheet.cell(row, column).value
-                )
-            first_sheet.cell(row, column).number_format = "0.00000"
-    # Apply border to the original data range
-    for row in range(header_row_number, first_sheet.max_row + 1):
-        for column in range(1, y_column_number + 1):
-            first_sheet.cell(row, column).border = thin_border
-    # In case the original data range was not contained in a table, contain it in a table
-    if not first_sheet.tables:
-        main_data_table = Table(
-            displayName="Main_Data_Table", ref="A1:C" + str(first_sheet.max_row)
-        )
-        first_sheet.add_table(main_data_table)
-    # Contain the selected data in a table
-    selected_data_table = Table(
-        displayName="Selected_Data_Table",
-        ref="E1:H" + str(n_of_selected_points + header_row_number),
+    selected_points_indexes = selection_state["selected_indexes"][
+        :how_many_points_to_find
+    ]
+    selected_route, initial_route_length, route_length = Order_The_Selected_Points(
+        numpy.asarray(latitudes)[selected_points_indexes],
+        numpy.asarray(longitudes)[selected_points_indexes],
+        distance_model,
+        route_time_budget,
     )
-    first_sheet.add_table(selected_data_table)
-
-    # Modify the width of new columns to better accomodate their contents
-    # For unknown reason bestFit does not work as intended
-    # first_sheet.column_dimensions['E'].bestFit = True
-    # first_sheet.column_dimensions['F'].bestFit = True
-    # first_sheet.column_dimensions['G'].bestFit = True
-    # first_sheet.column_dimensions['H'].bestFit = True
-
-    first_sheet.column_dimensions["E"].width = 10
-    first_sheet.column_dimensions["F"].width = 20
-    first_sheet.column_dimensions["G"].width = 20
-    first_sheet.column_dimensions["H"].width = 20
-
-    # Make sure that the header in the original range is also bold
-    first_sheet.cell(
-        header_row_number, names_column_number
-    ).font = openpyxl.styles.Font(bold=True)
-    first_sheet.cell(header_row_number, x_column_number).font = openpyxl.styles.Font(
-        bold=True
+    return {
+        "selected_indexes": [int(index) for index in selected_points_indexes],
+        "route": [int(selected_points_indexes[i]) for i in selected_route],
+        "initial_route_length": initial_route_length,
+        "route_length": route_length,
+    }
+
+
+def Select_The_Points(
+    path_to_excel_file,
+    how_many_points_to_find,
+    distance_model="ellipsoidal",
+    furthest_pair_method="convex_hull",
+    use_distance_cache=False,
+    distance_cache_folder=None,
+    selection_state=None,
+    number_of_workers=1,
+    dataset=None,
+    route_time_budget=DEFAULT_ROUTE_TIME_BUDGET,
+    return_details=False,
+    create_map=True,
+    open_map_in_browser=True,
+    progress_callback=None,
+    cancel_event=None,
+    selection_mode="uniform_spacing",
+    collect_metrics=False,
+    write_metrics_file=False,
+    trace_memory=False,
+    map_renderer="auto",
+    skip_invalid_points=False,
+    out_of_core=False,
+    memory_limit=DEFAULT_MEMORY_LIMIT,
+    out_of_core_folder=None,
+):
+    # Progress of every step is passed to the optional callback as (stage, finished, total) and
+    # the calculation stops between two steps (raising Selection_Cancelled) once the optional
+    # cancel event is set - the marked file is then left untouched
+    Report_The_Progress = functools.partial(
+        Report_Progress, progress_callback, cancel_event
     )
-    first_sheet.cell(header_row_number, y_column_number).font = openpyxl.styles.Font(
-        bold=True
+    # The out-of-core selection keeps its arrays in files (there is nothing to reuse or cache)
+    if out_of_core and use_distance_cache:
+        raise ValueError(
+            "The distance cache can not be used with the out-of-core selection."
+        )
+    Report_The_Progress("loading", 0, 1)
+
+    # The marked copy is stored next to the original file
+    (
+        chosen_file_folder_path,
+        chosen_file_name,
+        copied_file_name,
+        is_excel_file,
+    ) = Find_The_Output_Names(path_to_excel_file)
+    path_to_copied_file = os.path.join(chosen_file_folder_path, copied_file_name)
+
+    # Optionally measure the stages and count the work done (the metrics are returned with
+    # the details and can be stored next to the marked file) - tracing the peak memory slows
+    # the selection down noticeably, so it is only done on request
+    metrics = (
+        Selection_Metrics(trace_memory)
+        if collect_metrics or write_metrics_file
+        else None
     )
+    metrics_token = metrics.start() if metrics is not None else None
+    try:
+        with Measure_The_Stage("loading"):
+            # Take the names and coordinates (as arrays) of the loaded dataset, load it if not given yet
+            if dataset is None:
+                dataset = Load_The_Point_Dataset(path_to_excel_file)
+            names = dataset.names
+            latitudes = dataset.latitudes
+            longitudes = dataset.longitudes
+            # Points with invalid coordinates are only left out of the selection if allowed
+            # (the selection then works with the valid points, see the file indexes below)
+            valid_point_indexes = None
+            if not dataset.are_coordinates_valid:
+                if dataset.validation_report is None:
+                    raise ValueError("The coordinate columns were not found.")
+                if not skip_invalid_points:
+                    raise ValueError(
+                        "The coordinates of some points are not valid.\n"
+                        + Describe_The_Validation_Report(dataset.validation_report)
+                    )
+                valid_point_indexes = dataset.valid_point_indexes
+                names = names[valid_point_indexes]
+                latitudes = latitudes[valid_point_indexes]
+                longitudes = longitudes[valid_point_indexes]
+        with Measure_The_Stage("selection"):
+            # Find the order in which the points are selected (reusing and extending the given state)
+            # Out of core, the points are selected block by block from the temporary files
+            if out_of_core:
+                with tempfile.TemporaryDirectory(
+                    prefix="out_of_core.", dir=out_of_core_folder
+                ) as store_folder:
+                    selection_state = {
+                        "selected_indexes": Find_The_Selection_Order_In_Blocks(
+                            latitudes,
+                            longitudes,
+                            how_many_points_to_find,
+                            store_folder,
+                            distance_model,
+                            furthest_pair_method,
+                            selection_mode,
+                            memory_limit,
+                            Report_The_Progress,
+                        )
+                    }
+            else:
+                selection_state = Find_The_Selection_Order(
+                    latitudes,
+                    longitudes,
+                    how_many_points_to_find,
+                    distance_model,
+                    furthest_pair_method,
+                    use_distance_cache,
+                    distance_cache_folder,
+                    selection_state,
+                    number_of_workers,
+                    Report_The_Progress,
+                    selection_mode,
+                )
+        Report_The_Progress(
+            "selection", how_many_points_to_find, how_many_points_to_find
+        )
+        # The selection of the requested size is a prefix of the (possibly longer) selection order
+        selected_points_indexes = selection_state["selected_indexes"][
+            :how_many_points_to_find
+        ]
+        # Indexes of the selected points among all points of the file
+        selected_file_indexes = (
+            selected_points_indexes
+            if valid_point_indexes is None
+            else valid_point_indexes[selected_points_indexes].tolist()
+        )
+        # Coordinates and names of the selected points (in the selection order)
+        selected_latitudes = latitudes[selected_points_indexes]
+        selected_longitudes = longitudes[selected_points_indexes]
+        selected_names = names[selected_points_indexes]
+        Report_The_Progress("ordering", 0, 1)
+        with Measure_The_Stage("ordering"):
+            # Ordering the selected points into a route - two nearest neighbour sorts with different
+            # starting points, the shorter one is then improved by local moves within the time budget
+            (
+                selected_route,
+                initial_route_length,
+                route_length,
+            ) = Order_The_Selected_Points(
+                selected_latitudes, selected_longitudes, distance_model, route_time_budget
+            )
+        latitudes_to_write_to_excel = selected_latitudes[selected_route].tolist()
+        longitudes_to_write_to_excel = selected_longitudes[selected_route].tolist()
+        names_to_write_to_excel = selected_names[selected_route].tolist()
+        # Write the selected points into the marked copy of the original file
+        # (a temporary file in the same folder replaces the marked file only once it is complete)
+        Report_The_Progress("writing", 0, 1)
+        with Measure_The_Stage("writing"):
+
+            def Write_The_Marked_File(path_to_temporary_file):
+                if is_excel_file:
+                    Write_The_Marked_Excel_File(
+                        path_to_excel_file,
+                        path_to_temporary_file,
+                        selected_file_indexes,
+                        names_to_write_to_excel,
+                        latitudes_to_write_to_excel,
+                        longitudes_to_write_to_excel,
+                    )
+                else:
+                    Write_The_Marked_Csv_File(
+                        path_to_temporary_file,
+                        dataset.names,
+                        dataset.latitudes,
+                        dataset.longitudes,
+                        [selected_file_indexes[i] for i in selected_route],
+                        other_columns=Read_The_Other_Columns(path_to_excel_file),
+                    )
+                Report_The_Progress("writing", 1, 1)
 
-    # Save the changes performed on the file
-    excel_workbook_handle.save(path_to_copied_file)
+            Replace_The_Marked_File(
+                path_to_excel_file, path_to_copied_file, Write_The_Marked_File
+            )
+            Count_The_Event("bytes_saved", os.path.getsize(path_to_copied_file))
+
+        # Find approximate middle point for the map (teoretically third selected point):
+        middle_point_index = selected_points_indexes[
+            2 if len(selected_points_indexes) > 2 else 0
+        ]
+        # Create path to save map
+        map_name = chosen_file_name + "_MAP.html"
+        path_to_map = os.path.join(chosen_file_folder_path, map_name)
+
+        # Draw the map and open it in the browser (both can be skipped, e.g. for batch processing)
+        # The marked file is already stored, so the selection can not be cancelled any more
+        if create_map:
+            if progress_callback is not None:
+                progress_callback("map", 0, 1)
+            with Measure_The_Stage("map"):
+                Draw_The_Selection_Map(
+                    path_to_map,
+                    map_renderer,
+                    latitudes,
+                    longitudes,
+                    latitudes[middle_point_index],
+                    longitudes[middle_point_index],
+                    latitudes_to_write_to_excel,
+                    longitudes_to_write_to_excel,
+                )
+                Count_The_Event("bytes_saved", os.path.getsize(path_to_map))
+            if open_map_in_browser:
+                Open_The_Map_In_Browser(path_to_map)
+    finally:
+        if metrics is not None:
+            metrics.stop(metrics_token)
+
+    # Return the name of the new file (optionally with the route and its length in km,
+    # and with the collected metrics)
+    selection_details = {
+        "route": [selected_file_indexes[i] for i in selected_route],
+        "initial_route_length": initial_route_length,
+        "route_length": route_length,
+    }
+    if metrics is not None:
+        selection_details["metrics"] = metrics.as_dictionary()
+        # The metrics file is stored next to the marked file
+        if write_metrics_file:
+            Write_The_Metrics_File(
+                os.path.join(
+                    chosen_file_folder_path,
+                    chosen_file_name + "_METRICS.json",
+                ),
+                selection_details["metrics"],
+            )
+    if return_details:
+        return copied_file_name, selection_details
+    return copied_file_name
+
+
+def Draw_The_Map(
+    path_to_map,
+    middle_latitude,
+    middle_longitude,
+    latitudes,
+    longitudes,
+    selected_latitudes,
+    selected_longitudes,
+    selected_labels=None,
+    selected_groups=None,
+):
+    # The plotting library is only imported once a map is drawn by it
+    import gmplot  # Plotting the coordinates using gmaps
 
-    # Find approximate middle point for the map (teoretically third selected point):
-    approximate_middle_point = (
-        selected_points[selected_points_indexes[2]]
-        if len(selected_points_indexes) > 2
-        else selected_points[selected_points_indexes[0]]
-    )
     # Congifure google map through API key and set middle point with initial zoom
     apikey = ''  # (your API key here)
     google_map = gmplot.GoogleMapPlotter(
-        approximate_middle_point.latitude,
-        approximate_middle_point.longitude,
+        float(middle_latitude),
+        float(middle_longitude),
         14,
         apikey=apikey,
     )
 
-    # Extract original latitudes and longitudes and plot them with full circles
-    latitudes = []
-    longitudes = []
-    for point in extracted_points:
-        latitudes.append(point.latitude)
-        longitudes.append(point.longitude)
+    # Plot the original latitudes and longitudes with full circles
     google_map.scatter(
-        latitudes, longitudes, size=15, color="magenta", marker=False, fa=1
+        numpy.asarray(latitudes).tolist(),
+        numpy.asarray(longitudes).tolist(),
+        size=15,
+        color="magenta",
+        marker=False,
+        fa=1,
     )
 
     # Add red numbered markers for actually selected points
-    for index, point in enumerate(points_to_write_to_excel):
+    # (or the given labels, with a colour of each of the optional groups)
+    marker_colors = (
+        ["red"] * len(selected_latitudes)
+        if selected_groups is None
+        else Find_The_Marker_Colors(len(selected_latitudes), selected_groups)
+    )
+    for index, (latitude, longitude) in enumerate(
+        zip(selected_latitudes, selected_longitudes)
+    ):
         google_map.marker(
-            point.latitude,
-            point.longitude,
-            color="red",
-            label=str(index + 1),
-            title="Latidude: {:.5f} Longitude: {:.5f}".format(
-                point.latitude, point.longitude
-            ),
+            latitude,
+            longitude,
+            color=marker_colors[index],
+            label=str(index + 1) if selected_labels is None else selected_labels[index],
+            title=(
+                "" if selected_groups is None else f"Group: {selected_groups[index]} "
+            )
+            + "Latidude: {:.5f} Longitude: {:.5f}".format(latitude, longitude),
         )
-    # Create path to save map
-    map_name = chosen_file_name_and_extension[0] + "_MAP.html"
-    path_to_map = os.path.join(chosen_file_folder_path, map_name)
 
     # "Draw" the map
     google_map.draw(path_to_map)
 
+
+def Open_The_Map_In_Browser(path_to_map):
     # Find chrome or edge browser
     path_to_browser = None
     expected_path_1 = "C://Program Files (x86)//Google//Chrome//Application//chrome.exe"
@@ -410,6 +701,3 @@ def Select_The_Points(path_to_excel_file, how_many_points_to_find):
         path_to_browser = expected_path_4 + " %s"
     # Open the map in browser, ideally chrome
     webbrowser.get(path_to_browser).open_new(path_to_map)
-
-    # Return the name of the new file
-    return copied_file_name
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Functions selecting the points of many input files in a pool of worker processes.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import os  # Working with file paths
+import glob  # Expanding the file name patterns
+import time  # Measuring the time spent on each file
+import json  # Writing the summary
+import traceback  # Keeping the details of failed files
+import concurrent.futures  # Pool of worker processes
+
+from Dependencies.Class_Implementing_Point_Dataset import Load_The_Point_Dataset
+from Dependencies.Subroutine_Find_The_Input_File_Type import SUPPORTED_FILE_EXTENSIONS
+from Dependencies.Subroutine_Select_The_Points import (
+    Find_The_Output_Names,
+    Select_The_Points,
+)
+from Dependencies.Subroutine_Select_The_Points_In_Groups import (
+    Select_The_Points_In_Groups,
+)
+from Dependencies.Subroutine_Validate_Coordinate_Values import (
+    Describe_The_Validation_Report,
+    Summarize_The_Validation_Report,
+)
+
+# Each file is processed by one worker from start to end (loading, selection, output), so the
+# files are independent of each other and a failure of one file does not stop the others.
+# Files split into groups are processed one after another instead, their groups are spread
+# over the worker processes.
+
+# Statuses of the processed files
+STATUS_DONE = "done"
+STATUS_INVALID = "invalid"
+STATUS_FAILED = "failed"
+
+
+# Suffixes of the names of the files written next to each input (outputs of previous runs)
+OUTPUT_FILE_SUFFIXES = ("_MARKED", "_MAP", "_METRICS")
+
+
+def Find_The_Input_Files(paths_or_patterns, excluded_paths=()):
+    # Expand the given files, glob patterns and directories into a sorted list of input files
+    # (the excluded files, e.g. the summary, are never picked up from directories and patterns)
+    excluded_paths = {
+        os.path.normcase(os.path.abspath(excluded_path)) for excluded_path in excluded_paths
+    }
+    input_files = []
+    for path_or_pattern in paths_or_patterns:
+        if os.path.isdir(path_or_pattern):
+            candidate_paths = [
+                os.path.join(path_or_pattern, file_name)
+                for file_name in os.listdir(path_or_pattern)
+            ]
+        elif glob.has_magic(path_or_pattern):
+            candidate_paths = glob.glob(path_or_pattern, recursive=True)
+        else:
+            # Explicitly given files are kept even if they do not exist, to be reported as failed
+            input_files.append(os.path.abspath(path_or_pattern))
+            continue
+        for candidate_path in candidate_paths:
+            file_name, file_extension = os.path.splitext(os.path.basename(candidate_path))
+            # Outputs of previous runs are not processed again
+            if (
+                os.path.isfile(candidate_path)
+                and file_extension.lower() in SUPPORTED_FILE_EXTENSIONS
+                and not file_name.endswith(OUTPUT_FILE_SUFFIXES)
+                and os.path.normcase(os.path.abspath(candidate_path)) not in excluded_paths
+            ):
+                input_files.append(os.path.abspath(candidate_path))
+    # Every file is processed only once, in a stable order
+    return sorted(set(input_files))
+
+
+def Find_The_Output_Collisions(input_files):
+    # Error of every input file whose marked file, map or metrics would be written by another
+    # input file as well (e.g. "points.xlsx" and "points.xlsm" share "points_MAP.html")
+    output_owners = {}
+    for path_to_input_file in input_files:
+        folder_path, file_name, marked_file_name, _ = Find_The_Output_Names(
+            path_to_input_file
+        )
+        for output_file_name in (
+            marked_file_name,
+            file_name + "_MAP.html",
+            file_name + "_METRICS.json",
+        ):
+            output_owners.setdefault(
+                os.path.normcase(os.path.join(folder_path, output_file_name)), []
+            ).append(path_to_input_file)
+    collision_errors = {}
+    for path_to_output_file, owners in output_owners.items():
+        if len(owners) > 1:
+            for path_to_input_file in owners:
+                collision_errors.setdefault(
+                    path_to_input_file,
+                    f"The output {os.path.basename(path_to_output_file)} would also be"
+                    " written by "
+                    + ", ".join(owner for owner in owners if owner != path_to_input_file)
+                    + ".",
+                )
+    return collision_errors
+
+
+def Is_The_Selection_Grouped(options):
+    # Whether the points of each file are selected within their groups
+    return (
+        options.get("group_column") is not None
+        or options.get("group_pattern") is not None
+    )
+
+
+def Select_The_Points_In_File(path_to_input_file, how_many_points_to_find, options):
+    # Process one file and describe the result (never raises, the errors become a part of the result)
+    start_time = time.perf_counter()
+    file_result = {"path": path_to_input_file, "status": STATUS_FAILED}
+    try:
+        # Every file is loaded once, so the long-lived workers do not cache the datasets
+        dataset = Load_The_Point_Dataset(path_to_input_file, use_cache=False)
+        file_result["number_of_points"] = dataset.number_of_points
+        # All coordinate issues found in the file (the invalid and the suspicious points)
+        if dataset.validation_report is not None:
+            validation_summary = Summarize_The_Validation_Report(
+                dataset.validation_report
+            )
+            if validation_summary:
+                file_result["validation"] = validation_summary
+        number_of_valid_points = len(dataset.valid_point_indexes)
+        is_grouped = Is_The_Selection_Grouped(options)
+        # Same conditions as those of the loaded file in the application
+        # (the group column may follow the name and coordinate columns)
+        if not (
+            (dataset.number_of_columns == 3 or is_grouped and dataset.number_of_columns > 3)
+            and dataset.number_of_rows > 3
+        ):
+            file_result["status"] = STATUS_INVALID
+            file_result["error"] = (
+                f"Expected 3 columns and at least 4 rows, found {dataset.number_of_columns}"
+                f" columns and {dataset.number_of_rows} rows."
+            )
+        elif dataset.validation_report is None:
+            file_result["status"] = STATUS_INVALID
+            file_result["error"] = "Values in the coordinate columns are not GPS coordinates."
+        # Invalid points are only left out if allowed (and enough valid points remain)
+        elif not dataset.are_coordinates_valid and (
+            not options.get("skip_invalid_points", False) or number_of_valid_points < 3
+        ):
+            file_result["status"] = STATUS_INVALID
+            file_result["error"] = Describe_The_Validation_Report(
+                dataset.validation_report
+            )
+        elif is_grouped:
+            # Up to the given number of points is selected in every group
+            output_file_name, selection_details = Select_The_Points_In_Groups(
+                path_to_input_file,
+                how_many_points_to_find,
+                dataset=dataset,
+                return_details=True,
+                open_map_in_browser=False,
+                **options,
+            )
+            file_result.update(
+                status=STATUS_DONE,
+                number_of_selected_points=len(selection_details["route"]),
+                output_file=os.path.join(
+                    os.path.dirname(path_to_input_file), output_file_name
+                ),
+                route_length=selection_details["route_length"],
+                initial_route_length=selection_details["initial_route_length"],
+                number_of_ungrouped_points=selection_details[
+                    "number_of_ungrouped_points"
+                ],
+                groups=[
+                    {key: value for key, value in group.items() if key != "route"}
+                    for group in selection_details["groups"]
+                ],
+            )
+        else:
+            number_of_points_to_select = min(
+                how_many_points_to_find, number_of_valid_points
+            )
+            output_file_name, selection_details = Select_The_Points(
+                path_to_input_file,
+                number_of_points_to_select,
+                dataset=dataset,
+                return_details=True,
+                open_map_in_browser=False,
+                **options,
+            )
+            file_result.update(
+                status=STATUS_DONE,
+                number_of_selected_points=number_of_points_to_select,
+                output_file=os.path.join(
+                    os.path.dirname(path_to_input_file), output_file_name
+                ),
+                route_length=selection_details["route_length"],
+                initial_route_length=selection_details["initial_route_length"],
+            )
+            # Metrics are only present if they were collected
+            if "metrics" in selection_details:
+                file_result["metrics"] = selection_details["metrics"]
+    except Exception as error:
+        file_result["error"] = f"{type(error).__name__}: {error}"
+        file_result["traceback"] = traceback.format_exc()
+    file_result["seconds"] = time.perf_counter() - start_time
+    return file_result
+
+
+def Select_The_Points_In_Batch(
+    input_files, how_many_points_to_find, number_of_workers=None, options=None
+):
+    # Process the files in a pool of worker processes, the results keep the order of the files
+    if options is None:
+        options = {}
+    if number_of_workers is None:
+        number_of_workers = os.cpu_count() or 1
+    # The groups of each file are selected by the workers instead of the files
+    if Is_The_Selection_Grouped(options):
+        options = dict(options, number_of_workers=number_of_workers)
+        number_of_workers = 1
+    # Files that would overwrite each other's outputs are reported as failed and not processed
+    collision_errors = Find_The_Output_Collisions(input_files)
+    files_to_process = [
+        path_to_input_file
+        for path_to_input_file in input_files
+        if path_to_input_file not in collision_errors
+    ]
+    if number_of_workers <= 1 or len(files_to_process) <= 1:
+        processed_results = [
+            Select_The_Points_In_File(path_to_input_file, how_many_points_to_find, options)
+            for path_to_input_file in files_to_process
+        ]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(number_of_workers, len(files_to_process))
+        ) as executor:
+            processed_results = list(
+                executor.map(
+                    Select_The_Points_In_File,
+                    files_to_process,
+                    [how_many_points_to_find] * len(files_to_process),
+                    [options] * len(files_to_process),
+                )
+            )
+    processed_results = iter(processed_results)
+    return [
+        {
+            "path": path_to_input_file,
+            "status": STATUS_FAILED,
+            "error": collision_errors[path_to_input_file],
+            "seconds": 0.0,
+        }
+        if path_to_input_file in collision_errors
+        else next(processed_results)
+        for path_to_input_file in input_files
+    ]
+
+
+def Write_The_Batch_Summary(path_to_summary_file, file_results, total_seconds):
+    # Store the results of all files with the counts of each status as JSON
+    summary = {
+        "total_seconds": total_seconds,
+        "number_of_files": len(file_results),
+        "status_counts": {
+            status: sum(file_result["status"] == status for file_result in file_results)
+            for status in (STATUS_DONE, STATUS_INVALID, STATUS_FAILED)
+        },
+        "files": file_results,
+    }
+    with open(path_to_summary_file, "w", encoding="utf-8") as summary_file:
+        json.dump(summary, summary_file, indent=2, ensure_ascii=False)
+    return summary
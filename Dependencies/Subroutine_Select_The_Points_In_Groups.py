@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Functions for selecting uniformly spaced points within every group of the points of a file.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import os  # Working with file paths
+import re  # Finding the groups in the names of the points
+import concurrent.futures  # Pool of worker processes
+import numpy  # Indexes of the points of each group
+
+from Dependencies.Class_Implementing_Point_Dataset import Load_The_Point_Dataset
+from Dependencies.Subroutine_Optimize_The_Route import DEFAULT_ROUTE_TIME_BUDGET
+from Dependencies.Subroutine_Read_The_Input_File import (
+    Read_The_Group_Column,
+    Read_The_Other_Columns,
+)
+from Dependencies.Subroutine_Select_The_Points import (
+    Draw_The_Selection_Map,
+    Find_The_Output_Names,
+    Open_The_Map_In_Browser,
+    Replace_The_Marked_File,
+    Select_The_Point_Indexes,
+)
+from Dependencies.Subroutine_Validate_Coordinate_Values import (
+    Describe_The_Validation_Report,
+)
+from Dependencies.Subroutine_Write_The_Marked_Csv_File import (
+    Write_The_Marked_Csv_File,
+)
+from Dependencies.Subroutine_Write_The_Marked_Excel_File import (
+    Write_The_Marked_Excel_File,
+)
+
+# The points are split into groups by the values of a group column, or by the part of their
+# names matched by a regular expression (its first capture group if it has one). The groups do
+# not depend on each other, so each one is selected (and its route ordered) by a worker process
+# of its own, the largest groups first. All selections are then written into one marked file
+# and drawn on one map - the selected points of every group are numbered along their own route.
+# Points without a group (empty value or no match) are not selected. Groups of a single point
+# or of coinciding points have nothing to space out - all their points are taken as they are.
+
+
+def Find_The_Group_Name(value):
+    # Group of a column value or of a matched part of a name (None for empty values)
+    if value is None:
+        return None
+    group_name = str(value).strip()
+    return group_name or None
+
+
+def Find_The_Group_Names_By_Pattern(names, group_pattern):
+    # Group of each name - the first capture group of the pattern, or the whole match if it has none
+    try:
+        compiled_pattern = re.compile(group_pattern)
+    except re.error as error:
+        raise ValueError(f"Invalid group pattern '{group_pattern}': {error}.") from None
+    matched_group = 1 if compiled_pattern.groups else 0
+    group_names = []
+    for name in names:
+        match = compiled_pattern.search("" if name is None else str(name))
+        group_names.append(
+            Find_The_Group_Name(match.group(matched_group)) if match else None
+        )
+    return group_names
+
+
+def Partition_The_Points(group_names):
+    # Indexes of the points of each group (in the order in which the groups first appear)
+    group_point_indexes = {}
+    for point_index, group_name in enumerate(group_names):
+        if group_name is not None:
+            group_point_indexes.setdefault(group_name, []).append(point_index)
+    return {
+        group_name: numpy.array(point_indexes, dtype=numpy.int64)
+        for group_name, point_indexes in group_point_indexes.items()
+    }
+
+
+def Are_The_Points_Coincident(latitudes, longitudes):
+    # Check whether there are fewer than 2 distinct points
+    return bool(
+        numpy.all(latitudes == latitudes[0]) and numpy.all(longitudes == longitudes[0])
+    )
+
+
+def Select_The_Coincident_Points(how_many_points_to_find):
+    # Selection of the first points of a group without distinct points (in their order)
+    point_indexes = list(range(how_many_points_to_find))
+    return {
+        "selected_indexes": point_indexes,
+        "route": point_indexes,
+        "initial_route_length": 0.0,
+        "route_length": 0.0,
+    }
+
+
+def Select_The_Groups(
+    latitudes,
+    longitudes,
+    group_point_indexes,
+    how_many_points_per_group,
+    distance_model="ellipsoidal",
+    furthest_pair_method="convex_hull",
+    selection_mode="uniform_spacing",
+    route_time_budget=DEFAULT_ROUTE_TIME_BUDGET,
+    number_of_workers=None,
+):
+    # Selection of the points of every group (see Select_The_Point_Indexes), in the order of the groups
+    group_selections = [None] * len(group_point_indexes)
+    group_arguments = {}
+    for group_number, point_indexes in enumerate(group_point_indexes):
+        group_latitudes = latitudes[point_indexes]
+        group_longitudes = longitudes[point_indexes]
+        how_many_points_to_find = min(how_many_points_per_group, len(point_indexes))
+        if Are_The_Points_Coincident(group_latitudes, group_longitudes):
+            group_selections[group_number] = Select_The_Coincident_Points(
+                how_many_points_to_find
+            )
+            continue
+        group_arguments[group_number] = (
+            group_latitudes,
+            group_longitudes,
+            how_many_points_to_find,
+            distance_model,
+            furthest_pair_method,
+            selection_mode,
+            route_time_budget,
+        )
+    if number_of_workers is None:
+        number_of_workers = os.cpu_count() or 1
+    if number_of_workers <= 1 or len(group_arguments) <= 1:
+        for group_number, arguments in group_arguments.items():
+            group_selections[group_number] = Select_The_Point_Indexes(*arguments)
+        return group_selections
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(number_of_workers, len(group_arguments))
+    ) as executor:
+        # The largest groups are started first, so that no worker ends with a large group alone
+        group_futures = {
+            group_number: executor.submit(
+                Select_The_Point_Indexes, *group_arguments[group_number]
+            )
+            for group_number in sorted(
+                group_arguments,
+                key=lambda group_number: len(group_point_indexes[group_number]),
+                reverse=True,
+            )
+        }
+        for group_number, group_future in group_futures.items():
+            group_selections[group_number] = group_future.result()
+    return group_selections
+
+
+def Select_The_Points_In_Groups(
+    path_to_input_file,
+    how_many_points_per_group,
+    group_column=None,
+    group_pattern=None,
+    distance_model="ellipsoidal",
+    furthest_pair_method="convex_hull",
+    selection_mode="uniform_spacing",
+    route_time_budget=DEFAULT_ROUTE_TIME_BUDGET,
+    number_of_workers=None,
+    dataset=None,
+    return_details=False,
+    create_map=True,
+    open_map_in_browser=True,
+    map_renderer="auto",
+    skip_invalid_points=False,
+):
+    # Select up to the given number of points in every group of the file - the groups are given
+    # either by the named group column or by the pattern matched in the names of the points
+    if (group_column is None) == (group_pattern is None):
+        raise ValueError("Either the group column or the group pattern has to be given.")
+    if dataset is None:
+        dataset = Load_The_Point_Dataset(path_to_input_file)
+    # Group of every point of the file
+    if group_column is not None:
+        group_names = [
+            Find_The_Group_Name(value)
+            for value in Read_The_Group_Column(path_to_input_file, group_column)
+        ]
+        if len(group_names) != dataset.number_of_points:
+            raise ValueError(
+                f"The group column has {len(group_names)} values for"
+                f" {dataset.number_of_points} points."
+            )
+    else:
+        group_names = Find_The_Group_Names_By_Pattern(dataset.names, group_pattern)
+    # Points with invalid coordinates are only left out of the selection if allowed
+    valid_point_indexes = numpy.arange(dataset.number_of_points)
+    if not dataset.are_coordinates_valid:
+        if dataset.validation_report is None:
+            raise ValueError("The coordinate columns were not found.")
+        if not skip_invalid_points:
+            raise ValueError(
+                "The coordinates of some points are not valid.\n"
+                + Describe_The_Validation_Report(dataset.validation_report)
+            )
+        valid_point_indexes = dataset.valid_point_indexes
+    # Indexes of the valid points of each group among all points of the file
+    groups = {
+        group_name: valid_point_indexes[point_indexes]
+        for group_name, point_indexes in Partition_The_Points(
+            [group_names[point_index] for point_index in valid_point_indexes.tolist()]
+        ).items()
+    }
+    if not groups:
+        raise ValueError("None of the points belongs to a group.")
+    group_selections = Select_The_Groups(
+        dataset.latitudes,
+        dataset.longitudes,
+        list(groups.values()),
+        how_many_points_per_group,
+        distance_model,
+        furthest_pair_method,
+        selection_mode,
+        route_time_budget,
+        number_of_workers,
+    )
+
+    # Routes of all groups one after another, each numbered from 1
+    route_file_indexes = []
+    route_numbers = []
+    route_group_names = []
+    group_details = []
+    for (group_name, point_indexes), group_selection in zip(
+        groups.items(), group_selections
+    ):
+        group_route = point_indexes[group_selection["route"]].tolist()
+        route_file_indexes += group_route
+        route_numbers += range(1, len(group_route) + 1)
+        route_group_names += [group_name] * len(group_route)
+        group_details.append(
+            {
+                "group": group_name,
+                "number_of_points": len(point_indexes),
+                "number_of_selected_points": len(group_route),
+                "route": group_route,
+                "initial_route_length": group_selection["initial_route_length"],
+                "route_length": group_selection["route_length"],
+            }
+        )
+    selected_latitudes = dataset.latitudes[route_file_indexes]
+    selected_longitudes = dataset.longitudes[route_file_indexes]
+
+    # Write the selections of all groups into one marked copy of the original file
+    folder_path, file_name, marked_file_name, is_excel_file = Find_The_Output_Names(
+        path_to_input_file
+    )
+
+    def Write_The_Marked_File(path_to_temporary_file):
+        if is_excel_file:
+            Write_The_Marked_Excel_File(
+                path_to_input_file,
+                path_to_temporary_file,
+                route_file_indexes,
+                dataset.names[route_file_indexes].tolist(),
+                selected_latitudes.tolist(),
+                selected_longitudes.tolist(),
+                route_numbers,
+                route_group_names,
+            )
+        else:
+            Write_The_Marked_Csv_File(
+                path_to_temporary_file,
+                dataset.names,
+                dataset.latitudes,
+                dataset.longitudes,
+                route_file_indexes,
+                route_numbers,
+                group_names,
+                Read_The_Other_Columns(path_to_input_file),
+            )
+
+    Replace_The_Marked_File(
+        path_to_input_file,
+        os.path.join(folder_path, marked_file_name),
+        Write_The_Marked_File,
+    )
+
+    # Draw all valid points with the selected points of each group in its own colour
+    if create_map:
+        path_to_map = os.path.join(folder_path, file_name + "_MAP.html")
+        middle_point_index = route_file_indexes[2 if len(route_file_indexes) > 2 else 0]
+        Draw_The_Selection_Map(
+            path_to_map,
+            map_renderer,
+            dataset.latitudes[valid_point_indexes],
+            dataset.longitudes[valid_point_indexes],
+            dataset.latitudes[middle_point_index],
+            dataset.longitudes[middle_point_index],
+            selected_latitudes.tolist(),
+            selected_longitudes.tolist(),
+            [str(route_number) for route_number in route_numbers],
+            route_group_names,
+        )
+        if open_map_in_browser:
+            Open_The_Map_In_Browser(path_to_map)
+
+    # Return the name of the new file (optionally with the routes of all groups)
+    if return_details:
+        return marked_file_name, {
+            "route": route_file_indexes,
+            "initial_route_length": sum(
+                group["initial_route_length"] for group in group_details
+            ),
+            "route_length": sum(group["route_length"] for group in group_details),
+            "groups": group_details,
+            "number_of_ungrouped_points": len(valid_point_indexes)
+            - sum(len(point_indexes) for point_indexes in groups.values()),
+        }
+    return marked_file_name
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Functions storing the coordinates and working arrays in memory-mapped files.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import os  # Working with file paths
+import numpy  # Memory-mapped .npy files
+
+# The arrays are ordinary .npy files mapped to memory, so the operating system keeps only
+# the recently used parts of them in RAM (and can always drop them again). Arrays that are
+# already mapped from a file are used as they are, others are copied block by block.
+
+# Names of the stored coordinate files
+LATITUDES_FILE_NAME = "latitudes.npy"
+LONGITUDES_FILE_NAME = "longitudes.npy"
+
+
+def Create_The_Stored_Array(
+    store_folder, file_name, shape, dtype=numpy.float64, fill_value=None
+):
+    # New array mapped from the file of the store folder (optionally filled with the value)
+    stored_array = numpy.lib.format.open_memmap(
+        os.path.join(store_folder, file_name), mode="w+", dtype=dtype, shape=shape
+    )
+    if fill_value is not None:
+        stored_array[...] = fill_value
+    return stored_array
+
+
+def Store_The_Array(store_folder, file_name, values, block_size):
+    # Copy of the values mapped from the file of the store folder (mapped values are kept)
+    if isinstance(values, numpy.memmap) and values.dtype == numpy.float64:
+        return values
+    stored_array = Create_The_Stored_Array(
+        store_folder, file_name, (len(values),), numpy.float64
+    )
+    for block_start in range(0, len(values), block_size):
+        stored_array[block_start : block_start + block_size] = values[
+            block_start : block_start + block_size
+        ]
+    stored_array.flush()
+    return stored_array
+
+
+def Store_The_Coordinates(store_folder, latitudes, longitudes, block_size):
+    # Latitudes and longitudes mapped from the files of the store folder
+    os.makedirs(store_folder, exist_ok=True)
+    return (
+        Store_The_Array(store_folder, LATITUDES_FILE_NAME, latitudes, block_size),
+        Store_The_Array(store_folder, LONGITUDES_FILE_NAME, longitudes, block_size),
+    )
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 """
-Function validating values of latitude and longitude stored as columns in Excel file.
+Functions validating values of latitude and longitude stored as columns of the input file.
 Copyright (C) 2022  Peter Chmurčiak
 
 This program is free software: you can redistribute it and/or modify
@@ -16,38 +16,187 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see https://www.gnu.org/licenses/.
 """
-import openpyxl  # Working with Excel files
-
-
-def Validate_Coordinate_Values(path_to_excel_file):
-    # Variable for storing the result
-    are_they_valid = True
-    # Open excel file with intention to only read
-    excel_workbook_handle = openpyxl.load_workbook(path_to_excel_file)
-    # Get sheet names and select the first one (assuming that it is the correct one)
-    sheet_names_list = excel_workbook_handle.sheetnames
-    first_sheet_name = sheet_names_list[0]
-    first_sheet_handle = excel_workbook_handle[first_sheet_name]
-    # Extract the sheet properties
-    number_of_rows = first_sheet_handle.max_row
-    # Check if latitude and longitude values are witin their bounds - if they acutally are lat/long numeric values
-    latitude_column = 2
-    longitude_column = 3
-    # Go through all lines
-    for row in range(2, number_of_rows + 1):
-        latitude_reading = first_sheet_handle.cell(row, latitude_column).value
-        longitude_reading = first_sheet_handle.cell(row, longitude_column).value
-        try:
-            latitude_reading = float(latitude_reading)
-            longitude_reading = float(longitude_reading)
-        except ValueError:
-            are_they_valid = False
-            break
-        else:
-            if (latitude_reading < -90 or latitude_reading > 90) or (
-                longitude_reading < -180 or longitude_reading > 180
-            ):
-                are_they_valid = False
-                break
-    # Return result
-    return are_they_valid
+import numpy  # Validating whole coordinate arrays
+
+# The coordinate columns are converted to float arrays at once (text and empty cells only
+# fall back to converting value by value) and every point is checked by array masks, so one
+# pass finds all offending rows. Missing, non-numeric and out of range coordinates make the
+# point unusable, swapped coordinates and repeated points are only reported as suspicious.
+# A valid point is considered swapped if it lies far from the others, but its swapped
+# coordinates would place it among them (it is measured from the median point by the
+# median distance of all points, so a minority of swapped points does not shift them).
+
+# Issues making a point unusable and issues only reported as suspicious
+INVALID_COORDINATE_ISSUES = ("missing", "not_numeric", "out_of_range")
+SUSPICIOUS_COORDINATE_ISSUES = ("swapped", "duplicate")
+COORDINATE_ISSUE_DESCRIPTIONS = {
+    "missing": "missing coordinates",
+    "not_numeric": "coordinates that are not numbers",
+    "out_of_range": "coordinates out of the latitude/longitude range",
+    "swapped": "latitude and longitude possibly swapped",
+    "duplicate": "same coordinates as an earlier point",
+}
+# Row of the first point in the file (the first row is the header)
+FIRST_POINT_ROW_NUMBER = 2
+# Distance from the median point (in median distances) beyond which a point may be swapped
+SWAPPED_POINT_DISTANCE_FACTOR = 10
+# Smallest median distance considered [°] (points of a single place are not all outliers)
+MINIMAL_MEDIAN_DISTANCE = 0.01
+
+
+def Convert_The_Value(value):
+    # Value as a float (NaN if it is empty), None if it is not a number
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return numpy.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def Convert_To_Coordinate_Array(values):
+    # Values as a float64 array (NaN if missing or not a number) with the masks of both cases
+    try:
+        # Numbers, numeric texts and None (converted to NaN) are converted all at once
+        coordinates = numpy.array(values, dtype=numpy.float64)
+        # Nested values (e.g. malformed GeoJSON positions) are not coordinates
+        if coordinates.ndim != 1:
+            raise ValueError
+        is_not_numeric = numpy.zeros(len(coordinates), dtype=bool)
+    except (TypeError, ValueError):
+        converted_values = numpy.frompyfunc(Convert_The_Value, 1, 1)(
+            numpy.fromiter(values, dtype=object, count=len(values))
+        )
+        is_not_numeric = numpy.equal(converted_values, None)
+        converted_values[is_not_numeric] = numpy.nan
+        coordinates = converted_values.astype(numpy.float64)
+    return coordinates, numpy.isnan(coordinates) & ~is_not_numeric, is_not_numeric
+
+
+def Convert_The_Coordinate_Columns(latitude_values, longitude_values):
+    # Latitudes and longitudes as float64 arrays with the masks of points missing a coordinate
+    # and of points with a coordinate that is not a number
+    latitudes, is_latitude_missing, is_latitude_not_numeric = (
+        Convert_To_Coordinate_Array(latitude_values)
+    )
+    longitudes, is_longitude_missing, is_longitude_not_numeric = (
+        Convert_To_Coordinate_Array(longitude_values)
+    )
+    is_missing = is_latitude_missing | is_longitude_missing
+    is_not_numeric = (is_latitude_not_numeric | is_longitude_not_numeric) & ~is_missing
+    return latitudes, longitudes, is_missing, is_not_numeric
+
+
+def Find_The_Coordinate_Issues(latitudes, longitudes, is_missing, is_not_numeric):
+    # Report of the points of every issue (as indexes of the points) and of all unusable points
+    is_usable = ~(is_missing | is_not_numeric)
+    with numpy.errstate(invalid="ignore"):
+        is_out_of_range = is_usable & (
+            (numpy.abs(latitudes) > 90) | (numpy.abs(longitudes) > 180)
+        )
+        # Latitudes out of range that would be valid longitudes (and the other way round)
+        is_swapped = (
+            is_out_of_range
+            & (numpy.abs(latitudes) <= 180)
+            & (numpy.abs(longitudes) <= 90)
+        )
+    is_valid = is_usable & ~is_out_of_range
+    valid_indexes = numpy.flatnonzero(is_valid)
+    valid_latitudes = latitudes[valid_indexes]
+    valid_longitudes = longitudes[valid_indexes]
+    if len(valid_indexes) >= 3:
+        # Valid points far from the others that would lie among them with swapped coordinates
+        median_latitude = numpy.median(valid_latitudes)
+        median_longitude = numpy.median(valid_longitudes)
+        distances = numpy.abs(valid_latitudes - median_latitude) + numpy.abs(
+            valid_longitudes - median_longitude
+        )
+        swapped_distances = numpy.abs(valid_longitudes - median_latitude) + numpy.abs(
+            valid_latitudes - median_longitude
+        )
+        largest_usual_distance = SWAPPED_POINT_DISTANCE_FACTOR * max(
+            numpy.median(distances), MINIMAL_MEDIAN_DISTANCE
+        )
+        is_swapped[
+            valid_indexes[
+                (distances > largest_usual_distance)
+                & (swapped_distances <= largest_usual_distance)
+            ]
+        ] = True
+    # Valid points repeating an earlier one - after a stable sort by the coordinates, the
+    # repeated points follow the first one of the same coordinates
+    point_order = numpy.lexsort((valid_longitudes, valid_latitudes))
+    is_repeated = (
+        numpy.diff(valid_latitudes[point_order]) == 0
+    ) & (numpy.diff(valid_longitudes[point_order]) == 0)
+    duplicate_indexes = numpy.sort(valid_indexes[point_order[1:][is_repeated]])
+    return {
+        "number_of_points": len(latitudes),
+        "issues": {
+            "missing": numpy.flatnonzero(is_missing),
+            "not_numeric": numpy.flatnonzero(is_not_numeric),
+            "out_of_range": numpy.flatnonzero(is_out_of_range),
+            "swapped": numpy.flatnonzero(is_swapped),
+            "duplicate": duplicate_indexes,
+        },
+        "invalid_indexes": numpy.flatnonzero(~is_valid),
+    }
+
+
+def Validate_Coordinate_Columns(latitude_values, longitude_values):
+    # Convert both columns and check every point at once - the coordinates (NaN where they
+    # are missing or not numbers) with the report of all issues found
+    latitudes, longitudes, is_missing, is_not_numeric = Convert_The_Coordinate_Columns(
+        latitude_values, longitude_values
+    )
+    return (
+        latitudes,
+        longitudes,
+        Find_The_Coordinate_Issues(latitudes, longitudes, is_missing, is_not_numeric),
+    )
+
+
+def Describe_The_Validation_Report(validation_report, largest_number_of_rows=10):
+    # Summary of the report listing the rows of each issue found (the first ones of them)
+    summary_lines = []
+    is_suspicious_heading_written = False
+    number_of_invalid_points = len(validation_report["invalid_indexes"])
+    if number_of_invalid_points:
+        summary_lines.append(
+            f"{number_of_invalid_points} of {validation_report['number_of_points']}"
+            f" points can not be used:"
+        )
+    for issue in INVALID_COORDINATE_ISSUES + SUSPICIOUS_COORDINATE_ISSUES:
+        point_indexes = validation_report["issues"][issue]
+        if not len(point_indexes):
+            continue
+        # The suspicious points are listed under their own heading
+        if issue in SUSPICIOUS_COORDINATE_ISSUES and not is_suspicious_heading_written:
+            summary_lines.append("Suspicious points:")
+            is_suspicious_heading_written = True
+        listed_rows = ", ".join(
+            str(point_index + FIRST_POINT_ROW_NUMBER)
+            for point_index in point_indexes[:largest_number_of_rows]
+        )
+        remaining_rows = len(point_indexes) - largest_number_of_rows
+        summary_lines.append(
+            f"  {COORDINATE_ISSUE_DESCRIPTIONS[issue]} - "
+            + ("row " if len(point_indexes) == 1 else "rows ")
+            + listed_rows
+            + (f" and {remaining_rows} more" if remaining_rows > 0 else "")
+        )
+    return "\n".join(summary_lines)
+
+
+def Summarize_The_Validation_Report(validation_report, largest_number_of_rows=100):
+    # Number of points of each issue found with their first rows (plain values, e.g. for JSON)
+    return {
+        issue: {
+            "count": len(point_indexes),
+            "rows": (
+                point_indexes[:largest_number_of_rows] + FIRST_POINT_ROW_NUMBER
+            ).tolist(),
+        }
+        for issue, point_indexes in validation_report["issues"].items()
+        if len(point_indexes)
+    }
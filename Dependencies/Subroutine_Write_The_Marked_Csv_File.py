@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Function writing the points with the order of the selected ones into a CSV file.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import csv  # Writing CSV files
+import numpy  # Working with the coordinate arrays
+
+from Dependencies.Class_Implementing_Selection_Metrics import Count_The_Event
+
+
+def Write_The_Marked_Csv_File(
+    path_to_marked_file,
+    names,
+    latitudes,
+    longitudes,
+    ordered_points_indexes,
+    route_numbers=None,
+    group_names=None,
+    other_columns=None,
+):
+    # Number of each selected point within the route (empty for the points that were not selected)
+    # The numbers of the ordered points can be given (the selection of each group has its own
+    # route), the optional group names of all points are written into a fifth column
+    # The other columns of the input file (their names and the values of every point, as
+    # returned by Read_The_Other_Columns) are written after them
+    if route_numbers is None:
+        route_numbers = numpy.arange(1, len(ordered_points_indexes) + 1)
+    point_route_numbers = numpy.zeros(len(names), dtype=numpy.int64)
+    point_route_numbers[numpy.asarray(ordered_points_indexes, dtype=numpy.int64)] = (
+        route_numbers
+    )
+    point_rows = (
+        (
+            "" if name is None else name,
+            repr(float(latitude)),
+            repr(float(longitude)),
+            route_number or "",
+        )
+        for name, latitude, longitude, route_number in zip(
+            names, latitudes, longitudes, point_route_numbers.tolist()
+        )
+    )
+    header = ("Name", "Latitude", "Longitude", "Number")
+    if group_names is not None:
+        header += ("Group",)
+        point_rows = (
+            point_row + ("" if group_name is None else group_name,)
+            for point_row, group_name in zip(point_rows, group_names)
+        )
+    if other_columns is not None:
+        other_column_names, other_rows = other_columns
+        header += tuple(other_column_names)
+        point_rows = (
+            point_row + tuple("" if value is None else value for value in other_row)
+            for point_row, other_row in zip(point_rows, other_rows)
+        )
+    with open(path_to_marked_file, "w", newline="", encoding="utf-8") as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(header)
+        # Coordinates are written with all their digits (repr of the float values)
+        csv_writer.writerows(point_rows)
+    # Cells of the header and of every point
+    Count_The_Event("cells_written", len(header) * (len(names) + 1))
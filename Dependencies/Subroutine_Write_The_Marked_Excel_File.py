@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Function writing the selected points into a marked copy of the original Excel file.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import openpyxl  # Working with Excel files
+from openpyxl.styles import PatternFill, Font  # Excel cell formatting
+from openpyxl.worksheet.table import Table  # Excel table management
+from openpyxl.styles.borders import Border, Side  # Excel cell border formatting
+import shutil  # Making a backup copy of a file
+
+from Dependencies.Class_Implementing_Selection_Metrics import Count_The_Event
+
+# The fills, fonts and borders are created once and shared by all cells instead of new
+# objects built for every cell. Only the given parts of a cell's format are replaced, so the
+# other parts (e.g. the date format or the alignment of the original cells) are kept.
+# Note: Named styles can not be used, a cell with a named style loses all its own format.
+THIN_SIDE = Side(style="thin")
+THIN_BORDER = Border(left=THIN_SIDE, right=THIN_SIDE, top=THIN_SIDE, bottom=THIN_SIDE)
+HEADER_FONT = Font(bold=True)
+SELECTED_FILL = PatternFill(fgColor="FFCCCC", fill_type="solid")
+SELECTED_FONT = Font(color="9C0006")
+COORDINATE_FORMAT = "0.00000"
+NUMBER_FORMAT = "0"
+
+
+def Format_The_Cell(cell, fill=None, font=None, border=None, number_format=None):
+    # Replace the given parts of the format of the cell
+    if fill is not None:
+        cell.fill = fill
+    if font is not None:
+        cell.font = font
+    if border is not None:
+        cell.border = border
+    if number_format is not None:
+        cell.number_format = number_format
+
+
+def Write_The_Marked_Excel_File(
+    path_to_excel_file,
+    path_to_copied_file,
+    selected_points_indexes,
+    names_to_write_to_excel,
+    latitudes_to_write_to_excel,
+    longitudes_to_write_to_excel,
+    route_numbers=None,
+    group_names_to_write_to_excel=None,
+):
+    # The selected points are numbered along the route unless their numbers are given
+    # (the selection of each group has its own route), the group of each one is optional
+    # Make a copy of the original file with the intention to modify only the copy
+    shutil.copy(path_to_excel_file, path_to_copied_file)
+    # Open the copy of the original file
+    excel_workbook_handle = openpyxl.load_workbook(path_to_copied_file)
+
+    # Get sheet names and select the first one (assuming that it is the correct one)
+    sheet_names = excel_workbook_handle.sheetnames
+    first_sheet_name = sheet_names[0]
+    first_sheet = excel_workbook_handle[first_sheet_name]
+
+    # Define assumed constants
+    header_row_number = 1
+    x_column_number = 2
+    y_column_number = 3
+    ordering_column_number = 5
+    ordered_names_column_number = ordering_column_number + 1
+    x_selected_column_number = ordered_names_column_number + 1
+    y_selected_column_number = x_selected_column_number + 1
+    group_column_number = y_selected_column_number + 1
+    last_selected_column = "H" if group_names_to_write_to_excel is None else "I"
+    # Dimensions of the original data range (before the selected points are added)
+    original_max_row = first_sheet.max_row
+    original_max_column = first_sheet.max_column
+    selected_rows = {row + header_row_number + 1 for row in selected_points_indexes}
+
+    # Format the original data range in one pass - the name and coordinate columns get a
+    # border (and the coordinates their number format), selected rows are filled with red colour
+    for cell in first_sheet[header_row_number][:y_column_number]:
+        Format_The_Cell(cell, font=HEADER_FONT, border=THIN_BORDER)
+    for row_cells in first_sheet.iter_rows(
+        min_row=header_row_number + 1,
+        max_row=original_max_row,
+        max_col=original_max_column,
+    ):
+        if row_cells[0].row in selected_rows:
+            fill, font = SELECTED_FILL, SELECTED_FONT
+            for cell in row_cells[y_column_number:]:
+                Format_The_Cell(cell, fill, font)
+        else:
+            fill, font = None, None
+        Format_The_Cell(row_cells[0], fill, font, THIN_BORDER)
+        # Note: This step is valid only if the Excel decimal delimiter in your language is colon
+        # Coordinates stored as text with dot delimiters are converted to numbers
+        for cell in row_cells[x_column_number - 1 : y_column_number]:
+            cell_value = cell.value
+            if isinstance(cell_value, str) and "." in cell_value:
+                cell.value = float(cell_value)
+            Format_The_Cell(cell, fill, font, THIN_BORDER, COORDINATE_FORMAT)
+
+    # Add headers for selected points
+    selected_headers = [
+        (ordering_column_number, "Number"),
+        (ordered_names_column_number, "Description"),
+        (x_selected_column_number, "Latitude [°]"),
+        (y_selected_column_number, "Longitude [°]"),
+    ]
+    if group_names_to_write_to_excel is not None:
+        selected_headers.append((group_column_number, "Group"))
+    for column, header in selected_headers:
+        header_cell = first_sheet.cell(header_row_number, column)
+        header_cell.value = header
+        Format_The_Cell(header_cell, font=HEADER_FONT, border=THIN_BORDER)
+
+    # Write the selected points in separate columns into the excel file
+    n_of_selected_points = len(names_to_write_to_excel)
+    if route_numbers is None:
+        route_numbers = range(1, n_of_selected_points + 1)
+    for row in range(n_of_selected_points):
+        selected_cells = [
+            (ordering_column_number, route_numbers[row], NUMBER_FORMAT),
+            (ordered_names_column_number, names_to_write_to_excel[row], None),
+            (
+                x_selected_column_number,
+                latitudes_to_write_to_excel[row],
+                COORDINATE_FORMAT,
+            ),
+            (
+                y_selected_column_number,
+                longitudes_to_write_to_excel[row],
+                COORDINATE_FORMAT,
+            ),
+        ]
+        if group_names_to_write_to_excel is not None:
+            selected_cells.append(
+                (group_column_number, group_names_to_write_to_excel[row], None)
+            )
+        for column, value, number_format in selected_cells:
+            selected_cell = first_sheet.cell(row + header_row_number + 1, column)
+            selected_cell.value = value
+            Format_The_Cell(selected_cell, border=THIN_BORDER, number_format=number_format)
+
+    # In case the original data range was not contained in a table, contain it in a table
+    if not first_sheet.tables:
+        main_data_table = Table(
+            displayName="Main_Data_Table", ref="A1:C" + str(first_sheet.max_row)
+        )
+        first_sheet.add_table(main_data_table)
+    # Contain the selected data in a table
+    selected_data_table = Table(
+        displayName="Selected_Data_Table",
+        ref="E1:"
+        + last_selected_column
+        + str(n_of_selected_points + header_row_number),
+    )
+    first_sheet.add_table(selected_data_table)
+
+    # Modify the width of new columns to better accomodate their contents
+    # For unknown reason bestFit does not work as intended
+    # first_sheet.column_dimensions['E'].bestFit = True
+    # first_sheet.column_dimensions['F'].bestFit = True
+    # first_sheet.column_dimensions['G'].bestFit = True
+    # first_sheet.column_dimensions['H'].bestFit = True
+
+    first_sheet.column_dimensions["E"].width = 10
+    first_sheet.column_dimensions["F"].width = 20
+    first_sheet.column_dimensions["G"].width = 20
+    first_sheet.column_dimensions["H"].width = 20
+    if group_names_to_write_to_excel is not None:
+        first_sheet.column_dimensions["I"].width = 20
+
+    # Save the changes performed on the file
+    excel_workbook_handle.save(path_to_copied_file)
+    # Styled cells of the original data range (all cells of the selected rows, name and
+    # coordinates of the others) and the cells of the selected points with their headers
+    Count_The_Event(
+        "cells_written",
+        min(y_column_number, original_max_column)
+        * (original_max_row - header_row_number + 1)
+        + max(original_max_column - y_column_number, 0) * len(selected_rows)
+        + len(selected_headers) * (n_of_selected_points + 1),
+    )
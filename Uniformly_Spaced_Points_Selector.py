@@ -18,11 +18,48 @@ along with this program.  If not, see https://www.gnu.org/licenses/.
 """
 import tkinter as tk  # Running the app
 from tkinter import messagebox, filedialog  # Interacting with user, displaying messages
+import threading  # Running the selection in the background
+import queue  # Passing the progress from the background thread to the app
+import importlib  # Importing the selection modules in the background
 
 from Dependencies.Abstract_Class_Implementing_Selector_GUI import Uniformly_Spaced_Points_Selector_GUI
-from Dependencies.Subroutine_Select_The_Points import Select_The_Points
-from Dependencies.Subroutine_Get_Rows_And_Columns_Of_An_Excel_File import Get_Rows_And_Columns_Of_An_Excel_File
-from Dependencies.Subroutine_Validate_Coordinate_Values import Validate_Coordinate_Values
+from Dependencies.Subroutine_Find_The_Input_File_Type import INPUT_FILE_TYPES
+from Dependencies.Class_Implementing_Selection_Cancelled import Selection_Cancelled
+
+# The window only needs tkinter, so it appears before the numerical, Excel and map libraries
+# are imported. The modules using them are imported where they are needed, and already
+# in the background right after the window is shown - usually before the first click.
+
+# Interval of checking the messages of the background selection [ms]
+SELECTION_QUEUE_POLLING_INTERVAL = 100
+# Delay of importing the selection modules in the background after the start [ms]
+SELECTION_MODULES_IMPORT_DELAY = 100
+# Number of selection states kept (one per file and selection mode, the least recently used
+# one is dropped first, as the datasets of Class_Implementing_Point_Dataset are)
+MAXIMAL_NUMBER_OF_SELECTION_STATES = 4
+# Modules of loading and selecting the points (slow to import)
+SELECTION_MODULES = (
+    "Dependencies.Class_Implementing_Point_Dataset",
+    "Dependencies.Subroutine_Select_The_Points",
+)
+
+
+def Import_The_Selection_Modules():
+    # Import the modules of loading and selecting the points (each one is imported only once)
+    for module_name in SELECTION_MODULES:
+        importlib.import_module(module_name)
+
+
+# Part of the progress bar covered by each stage of the selection [%] and its description
+PROGRESS_STAGES = {
+    "loading": (0, 2, "Loading the points"),
+    "distance_matrix": (2, 20, "Calculating distances {percent} %"),
+    "seed": (2, 20, "Searching for the furthest pair {percent} %"),
+    "selection": (20, 85, "Selected {finished} of {total} points"),
+    "ordering": (85, 90, "Ordering the route"),
+    "writing": (90, 98, "Writing the output file"),
+    "map": (98, 100, "Drawing the map"),
+}
 
 
 class Uniformly_Spaced_Points_Selector(Uniformly_Spaced_Points_Selector_GUI):
@@ -30,20 +67,52 @@ class Uniformly_Spaced_Points_Selector(Uniformly_Spaced_Points_Selector_GUI):
         super().__init__(master)
         # Create a reference to the master (root window)
         self.master = master
+        # Import the selection modules once the window is shown
+        self.after(SELECTION_MODULES_IMPORT_DELAY, self.start_importing_selection_modules)
+
+    # Import the selection modules on a background thread (a later import waits for it to finish)
+    @staticmethod
+    def start_importing_selection_modules():
+        threading.Thread(target=Import_The_Selection_Modules, daemon=True).start()
 
     # Modify the state of execute and input fields
     def set_execution_button_state(self, state):
-        self.input_menu_label.config(state=state)
-        self.input_menu.config(state=state)
+        self.mode_menu_label.config(state=state)
+        self.mode_menu.config(state=state)
+        self.count_label.config(state=state)
+        self.count_spinbox.config(state=state)
         self.execute_button.config(state=state)
 
+    # Limit the count to the chosen mode and the loaded file
+    def update_count_range(self):
+        selection_mode = self.selection_mode_names[self.mode_menu_control_variable.get()]
+        maximal_allowed_value = self.maximal_acceptable_values[selection_mode]
+        if self.number_of_loaded_points is not None:
+            maximal_allowed_value = min(
+                maximal_allowed_value, self.number_of_loaded_points
+            )
+        self.count_spinbox.config(to=maximal_allowed_value)
+        # In case the new range is smaller than the previous one, edit the count to be within range
+        self.count_control_variable.set(str(self.get_number_of_points_to_select()))
+
+    # Read the count from the input field (typed values are clamped into the allowed range)
+    def get_number_of_points_to_select(self):
+        try:
+            number_of_points_to_select = int(self.count_control_variable.get())
+        except ValueError:
+            number_of_points_to_select = 2
+        return min(
+            max(number_of_points_to_select, 2),
+            int(float(self.count_spinbox.cget("to"))),
+        )
+
     # Reset the help window position
     def reset_info_window_position(self):
         x_coordinate_of_main_window = self.master.winfo_x()
         y_coordinate_of_main_window = self.master.winfo_y()
         width_of_main_window = self.master.winfo_width()
         self.info_window.geometry(
-            f"550x508+{x_coordinate_of_main_window + width_of_main_window + 10}+{y_coordinate_of_main_window}"
+            f"550x600+{x_coordinate_of_main_window + width_of_main_window + 10}+{y_coordinate_of_main_window}"
         )
         self.info_window.deiconify()
 
@@ -89,7 +158,12 @@ class Uniformly_Spaced_Points_Selector(Uniformly_Spaced_Points_Selector_GUI):
                 + "\n\tnot matter, but it is necessary to maintain the order of the columns, namely:"
                 + "\n\tColumn A - Auxiliary name/description"
                 + "\n\tColumn B - Latitude [°]"
-                + "\n\tColumn C - Longitude [°]",
+                + "\n\tColumn C - Longitude [°]"
+                + "\n\tCSV, Parquet (GeoParquet) and GeoJSON point files are accepted as well. Their"
+                + '\n\tcolumns are found by the header names ("name", "latitude"/"lat", "longitude"/"lon")'
+                + "\n\tor taken in the order above. Parquet files require the pyarrow package."
+                + "\n\tRows with missing or invalid coordinates are all listed on loading and can be"
+                + "\n\tskipped, suspicious rows (duplicates, swapped coordinates) are listed as well.",
                 "normal",
             )
 
@@ -97,9 +171,10 @@ class Uniformly_Spaced_Points_Selector(Uniformly_Spaced_Points_Selector_GUI):
             self.info_text.insert(tk.END, "Order:\t", "bold")
             self.info_text.insert(
                 tk.END,
-                '1. Select the Excel file using "Load Excel File"'
-                + '\n\t2. Specify number of sought points in the field "Count"'
-                + '\n\t3. Begin the selection process with "Select Points"',
+                '1. Select the input file using "Load Input File"'
+                + '\n\t2. Choose the "Mode" and specify number of sought points in the field "Count"'
+                + '\n\t3. Begin the selection process with "Select Points"'
+                + '\n\t4. (Optional) Stop a running selection with "Cancel"',
                 "normal",
             )
 
@@ -109,7 +184,10 @@ class Uniformly_Spaced_Points_Selector(Uniformly_Spaced_Points_Selector_GUI):
                 tk.END,
                 "The output of the program is a modified Excel file containing marked points"
                 + '\n\twith extension "_MARKED" and HTML file with extension "_MAP" displaying'
-                + "\n\tpoints graphically. Both outputs are stored in the input file folder.",
+                + "\n\tpoints graphically. Both outputs are stored in the input file folder. For other"
+                + '\n\tthan Excel inputs, the "_MARKED" file is a CSV file with the order of the points'
+                + "\n\tand all columns of the input, its name keeps the input extension (e.g."
+                + '\n\t"points_geojson_MARKED.csv").',
                 "normal",
             )
 
@@ -121,7 +199,9 @@ class Uniformly_Spaced_Points_Selector(Uniformly_Spaced_Points_Selector_GUI):
                 + "\n\tpicking large number of points relative to the original set size - points will begin"
                 + "\n\tto cluster. Additionally, with increasing size of the original set or increasing"
                 + "\n\tnumber of selected points, the time and computing power demands rise. For"
-                + '\n\tthis reason, the "Count" input field is atrificially costrained.',
+                + '\n\tthis reason, the "Count" input field is atrificially costrained to 15 points.'
+                + '\n\tThe "Furthest point" mode picks each next point as far as possible from the'
+                + "\n\talready selected ones. It is much faster and allows up to 2000 points.",
                 "normal",
             )
 
@@ -138,6 +218,9 @@ class Uniformly_Spaced_Points_Selector(Uniformly_Spaced_Points_Selector_GUI):
 
     # Define exit button actions
     def exit_button_event(self):
+        # Stop the running selection (the background thread does not keep the app alive)
+        if self.cancel_event is not None:
+            self.cancel_event.set()
         self.master.destroy()
 
     # Define load button actions
@@ -146,45 +229,53 @@ class Uniformly_Spaced_Points_Selector(Uniformly_Spaced_Points_Selector_GUI):
         self.set_execution_button_state("disabled")
         # Assume invalid file by default
         self.is_chosen_file_valid = False
-        # Prompt user to choose a excel file
-        self.path_to_excel_file = filedialog.askopenfilename(
-            filetypes=(("Excel files (*.xlsx)", ("*.xls", "*.xlsx")),)
-        )
+        self.dataset = None
+        self.skip_invalid_points = False
+        # Prompt user to choose an input file (the reader is chosen by the file extension)
+        self.path_to_excel_file = filedialog.askopenfilename(filetypes=INPUT_FILE_TYPES)
         # If file was chosen
         if self.path_to_excel_file:
-            # Extract number of rows/columns from the file
-            (
-                chosen_file_number_of_rows,
-                chosen_file_number_of_columns,
-            ) = Get_Rows_And_Columns_Of_An_Excel_File(self.path_to_excel_file)
+            # Extract number of rows/columns, validity of coordinates and the points from the file in one pass
+            # (an unchanged file that was loaded before is not parsed again)
+            from Dependencies.Class_Implementing_Point_Dataset import Load_The_Point_Dataset
+            from Dependencies.Subroutine_Validate_Coordinate_Values import (
+                Describe_The_Validation_Report,
+            )
+
+            try:
+                dataset = Load_The_Point_Dataset(self.path_to_excel_file)
+            except ImportError as error:
+                messagebox.showerror("Error", str(error))
+                return
+            chosen_file_number_of_rows = dataset.number_of_rows
+            chosen_file_number_of_columns = dataset.number_of_columns
             # Validate the file based on the rows/columns and show error messages based on specific situations
             if chosen_file_number_of_columns == 3 and chosen_file_number_of_rows > 3:
-                if Validate_Coordinate_Values(self.path_to_excel_file):
+                if dataset.validation_report is not None and (
+                    dataset.are_coordinates_valid
+                    or self.confirm_skipping_invalid_points(dataset)
+                ):
                     self.is_chosen_file_valid = True
-                    # Edit the menu bar options based on the number of points within the file
-                    # Remove all the original options
-                    self.input_menu["menu"].delete(0, "end")
-                    # Define and add one by one the new options
-                    maximal_allowed_value = min(
-                        self.maximal_acceptable_value, chosen_file_number_of_rows - 1
-                    )
-                    new_choices = [
-                        str(number) for number in range(2, maximal_allowed_value + 1)
-                    ]
-                    for choice in new_choices:
-                        self.input_menu["menu"].add_command(
-                            label=choice,
-                            command=tk._setit(self.input_menu_control_variable, choice),
-                        )
-                    # In case the new range of options is smaller than the previous one, edit the selected option to be within range
-                    if self.input_menu_control_variable.get() not in new_choices:
-                        self.input_menu_control_variable.set(new_choices[-1])
+                    # Keep the loaded points, so that the selection does not read the file again
+                    self.dataset = dataset
+                    self.skip_invalid_points = not dataset.are_coordinates_valid
+                    # Limit the count based on the number of (valid) points within the file
+                    self.number_of_loaded_points = len(dataset.valid_point_indexes)
+                    self.update_count_range()
                     # Enable the execution button
                     self.set_execution_button_state("normal")
+                    # Suspicious points (e.g. duplicates) are only described
+                    validation_summary = Describe_The_Validation_Report(
+                        dataset.validation_report
+                    )
                     messagebox.showinfo(
                         "Info",
-                        f"Loading operation was succesful. Loaded file contains {chosen_file_number_of_rows-1} points.",
+                        f"Loading operation was succesful. Loaded file contains {chosen_file_number_of_rows-1} points."
+                        + (f"\n\n{validation_summary}" if validation_summary else ""),
                     )
+                elif dataset.validation_report is not None:
+                    # The user chose not to skip the invalid points (or there are too few valid ones)
+                    return
                 else:
                     messagebox.showerror(
                         "Error",
@@ -209,29 +300,181 @@ class Uniformly_Spaced_Points_Selector(Uniformly_Spaced_Points_Selector_GUI):
         else:
             messagebox.showerror("Error", "No file was selected.")
 
+    # Describe the invalid points and ask whether they should be left out of the selection
+    @staticmethod
+    def confirm_skipping_invalid_points(dataset):
+        from Dependencies.Subroutine_Validate_Coordinate_Values import (
+            Describe_The_Validation_Report,
+        )
+
+        validation_summary = Describe_The_Validation_Report(dataset.validation_report)
+        number_of_valid_points = len(dataset.valid_point_indexes)
+        if number_of_valid_points < 3:
+            messagebox.showerror(
+                "Error",
+                f"Invalid data format. Only {number_of_valid_points} points have valid GPS coordinates, application expects at least 3.\n\n{validation_summary}",
+            )
+            return False
+        return messagebox.askyesno(
+            "Invalid coordinates",
+            f"{validation_summary}\n\nDo you want to skip the invalid points and select from the remaining {number_of_valid_points} points?",
+        )
+
     # Define execute button actions
     def execute_button_event(self):
         # If path and file it leads to is valid
         if self.path_to_excel_file and self.is_chosen_file_valid:
-            # Get input from input field
-            number_of_points_to_select = int(self.input_menu_control_variable.get())
+            # Get input from input fields
+            number_of_points_to_select = self.get_number_of_points_to_select()
+            self.count_control_variable.set(str(number_of_points_to_select))
+            selection_mode = self.selection_mode_names[
+                self.mode_menu_control_variable.get()
+            ]
+            # Nothing but cancelling is possible while the selection is running
+            self.set_execution_button_state("disabled")
+            self.load_button.config(state="disabled")
+            self.cancel_button.config(state="normal")
+            self.progress_bar["value"] = 0
+            self.progress_label.config(text="")
+            # Run the selection in the background, so that the window keeps responding
+            self.selection_queue = queue.Queue()
+            self.cancel_event = threading.Event()
+            self.selection_thread = threading.Thread(
+                target=self.run_selection,
+                args=(
+                    self.path_to_excel_file,
+                    number_of_points_to_select,
+                    self.get_selection_state(self.path_to_excel_file, selection_mode),
+                    self.dataset,
+                    selection_mode,
+                    self.skip_invalid_points,
+                    self.selection_queue,
+                    self.cancel_event,
+                ),
+                daemon=True,
+            )
+            self.selection_thread.start()
+            self.after(SELECTION_QUEUE_POLLING_INTERVAL, self.poll_selection_queue)
+
+    # Selection state of the file and mode (a new one unless it was selected recently)
+    def get_selection_state(self, path_to_excel_file, selection_mode):
+        state_key = (path_to_excel_file, selection_mode)
+        selection_state = self.selection_states.setdefault(state_key, {})
+        self.selection_states.move_to_end(state_key)
+        while len(self.selection_states) > MAXIMAL_NUMBER_OF_SELECTION_STATES:
+            self.selection_states.popitem(last=False)
+        return selection_state
+
+    # Define cancel button actions
+    def cancel_button_event(self):
+        # The selection stops at the end of its current step
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_button.config(state="disabled")
+            self.progress_label.config(text="Cancelling...")
+
+    # Select the points on the background thread - the app is informed only through the queue
+    @staticmethod
+    def run_selection(
+        path_to_excel_file,
+        number_of_points_to_select,
+        selection_state,
+        dataset,
+        selection_mode,
+        skip_invalid_points,
+        selection_queue,
+        cancel_event,
+    ):
+        from Dependencies.Subroutine_Select_The_Points import Select_The_Points
+
+        try:
+            save_file_name, selection_details = Select_The_Points(
+                path_to_excel_file,
+                number_of_points_to_select,
+                selection_state=selection_state,
+                dataset=dataset,
+                return_details=True,
+                progress_callback=lambda stage, finished, total: selection_queue.put(
+                    ("progress", stage, finished, total)
+                ),
+                cancel_event=cancel_event,
+                selection_mode=selection_mode,
+                skip_invalid_points=skip_invalid_points,
+            )
+        except Selection_Cancelled:
+            selection_queue.put(("cancelled",))
+        except Exception as error:
+            selection_queue.put(("error", error))
+        else:
+            selection_queue.put(
+                ("done", number_of_points_to_select, save_file_name, selection_details)
+            )
+
+    # Show the messages of the background selection until it ends
+    def poll_selection_queue(self):
+        final_message = None
+        while final_message is None:
             try:
-                save_file_name = Select_The_Points(
-                    self.path_to_excel_file, number_of_points_to_select
-                )
-            except PermissionError:
-                messagebox.showerror(
-                    "Error",
-                    'Access to the selected file was denied. Make sure that the corresponding Excel file marked with "MARKED" is closed and repeat the operation.',
-                )
+                message = self.selection_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "progress":
+                self.show_selection_progress(*message[1:])
             else:
-                self.path_to_excel_file = None
-                self.is_chosen_file_valid = False
-                self.set_execution_button_state("disabled")
-                messagebox.showinfo(
-                    "Info",
-                    f'Points ({number_of_points_to_select}) were sucessfully selected. Output was stored in the file "{save_file_name}" within the original folder.',
+                final_message = message
+        if final_message is None:
+            self.after(SELECTION_QUEUE_POLLING_INTERVAL, self.poll_selection_queue)
+        else:
+            self.finish_selection(final_message)
+
+    # Move the progress bar within the part of the stage and describe the stage
+    def show_selection_progress(self, stage, finished, total):
+        stage_start, stage_end, stage_description = PROGRESS_STAGES[stage]
+        stage_fraction = finished / total if total else 1
+        self.progress_bar["value"] = stage_start + (stage_end - stage_start) * stage_fraction
+        if not self.cancel_event.is_set():
+            self.progress_label.config(
+                text=stage_description.format(
+                    finished=finished, total=total, percent=int(100 * stage_fraction)
                 )
+            )
+
+    # Restore the app after the background selection ended and show its result
+    def finish_selection(self, final_message):
+        self.selection_thread = None
+        self.selection_queue = None
+        self.cancel_event = None
+        self.load_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+        self.progress_label.config(text="")
+        if final_message[0] == "done":
+            _, number_of_points_to_select, save_file_name, selection_details = final_message
+            self.progress_bar["value"] = 100
+            self.path_to_excel_file = None
+            self.is_chosen_file_valid = False
+            self.dataset = None
+            messagebox.showinfo(
+                "Info",
+                f'Points ({number_of_points_to_select}) were sucessfully selected. Output was stored in the file "{save_file_name}" within the original folder.'
+                + f"\n\nRoute length: {selection_details['route_length']:.2f} km (nearest neighbour route: {selection_details['initial_route_length']:.2f} km).",
+            )
+            return
+        # The file stays loaded, so that the selection can be started again
+        self.progress_bar["value"] = 0
+        self.set_execution_button_state("normal")
+        if final_message[0] == "cancelled":
+            messagebox.showinfo(
+                "Info", "The selection was cancelled. No output file was written."
+            )
+        elif isinstance(final_message[1], PermissionError):
+            messagebox.showerror(
+                "Error",
+                'Access to the selected file was denied. Make sure that the corresponding Excel file marked with "MARKED" is closed and repeat the operation.',
+            )
+        else:
+            messagebox.showerror(
+                "Error", f"The selection failed: {final_message[1]}"
+            )
 
 
 if __name__ == "__main__":
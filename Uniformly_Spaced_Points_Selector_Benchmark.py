@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+"""
+Uniformly Spaced Points Selector benchmark of the pipeline stages on synthetic point sets.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import os  # Working with file paths
+import sys  # Exit code
+import time  # Measuring the stages
+import json  # Writing the results
+import argparse  # Parsing the command line arguments
+import platform  # Describing the machine
+import datetime  # Time of the run
+import tempfile  # Folder for the generated files
+import subprocess  # Reading the version of the code
+import numpy  # Version of the numerical library
+
+from Dependencies.Subroutine_Calculate_Distances import DISTANCE_MODELS
+from Dependencies.Subroutine_Draw_The_Offline_Map import (
+    MAP_RENDERERS,
+    Choose_The_Map_Renderer,
+    Draw_The_Offline_Map,
+)
+from Dependencies.Subroutine_Extend_The_Selection import SELECTION_MODES
+from Dependencies.Subroutine_Find_The_Furthest_Pair import FURTHEST_PAIR_METHODS
+from Dependencies.Subroutine_Find_The_Selection_Order_In_Blocks import (
+    DEFAULT_MEMORY_LIMIT,
+    Find_The_Selection_Order_In_Blocks,
+)
+from Dependencies.Subroutine_Generate_Synthetic_Datasets import (
+    SYNTHETIC_DATASET_KINDS,
+    Generate_Synthetic_Points,
+    Write_The_Synthetic_File,
+)
+from Dependencies.Subroutine_Optimize_The_Route import DEFAULT_ROUTE_TIME_BUDGET
+from Dependencies.Subroutine_Load_The_Excel_File import Read_The_Excel_Columns
+from Dependencies.Subroutine_Read_The_Input_File import Read_The_Csv_Columns
+from Dependencies.Subroutine_Validate_Coordinate_Values import (
+    Validate_Coordinate_Columns,
+)
+from Dependencies.Subroutine_Select_The_Points import (
+    Draw_The_Map,
+    Find_The_Selection_Order,
+    Order_The_Selected_Points,
+)
+from Dependencies.Subroutine_Write_The_Marked_Csv_File import (
+    Write_The_Marked_Csv_File,
+)
+from Dependencies.Subroutine_Write_The_Marked_Excel_File import (
+    Write_The_Marked_Excel_File,
+)
+
+# Every stage of the pipeline is measured on its own, in the order used by the application
+# (the seed pair and the selection are told apart by the progress reported at the seed end).
+# The results (seconds of each stage of each run) are written as JSON together with the
+# description of the code version and the machine, so that two versions can be compared.
+
+BENCHMARK_STAGES = (
+    "load",
+    "validation",
+    "seed_pair",
+    "selection",
+    "ordering",
+    "write",
+    "map",
+)
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+# Module of the app whose import (before the window appears) is measured, and its target [s]
+STARTUP_MODULE_NAME = "Uniformly_Spaced_Points_Selector"
+STARTUP_IMPORT_TIME_TARGET = 0.15
+# Libraries the app must not import before the window appears (they are imported later)
+DEFERRED_STARTUP_MODULES = ("numpy", "openpyxl", "gmplot")
+
+
+def Parse_The_Arguments(arguments=None):
+    # Define the command line interface
+    parser = argparse.ArgumentParser(
+        description="Measure the stages of the point selection on synthetic point sets."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda text: [int(size) for size in text.split(",")],
+        default=list(DEFAULT_SIZES),
+        help="comma separated numbers of points (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--kinds",
+        type=lambda text: text.split(","),
+        default=list(SYNTHETIC_DATASET_KINDS),
+        help="comma separated kinds of the point sets (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-n", "--count", type=int, default=15, help="number of points to select"
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=1, help="runs of each point set (default: 1)"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the point sets")
+    parser.add_argument(
+        "--format",
+        choices=(".xlsx", ".csv"),
+        default=".xlsx",
+        help="file format of the generated point sets (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--selection-mode", choices=SELECTION_MODES, default="uniform_spacing"
+    )
+    parser.add_argument(
+        "--distance-model", choices=DISTANCE_MODELS, default="ellipsoidal"
+    )
+    parser.add_argument(
+        "--furthest-pair-method", choices=FURTHEST_PAIR_METHODS, default="convex_hull"
+    )
+    parser.add_argument(
+        "--route-time-budget",
+        type=float,
+        default=DEFAULT_ROUTE_TIME_BUDGET,
+        help="seconds spent improving each route (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--out-of-core",
+        action="store_true",
+        help="measure the out-of-core selection (block by block from temporary files)",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=float,
+        default=DEFAULT_MEMORY_LIMIT / 1024**2,
+        help="MB of memory used by the blocks of the out-of-core selection"
+        " (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-map", action="store_true", help="do not measure the map rendering"
+    )
+    parser.add_argument("--map-renderer", choices=MAP_RENDERERS, default="auto")
+    parser.add_argument(
+        "--startup-target",
+        type=float,
+        default=STARTUP_IMPORT_TIME_TARGET,
+        help="largest accepted import time of the app in seconds, a longer one fails"
+        " the benchmark (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--data-folder",
+        default=None,
+        help="keep the generated files in this folder (default: a temporary folder)",
+    )
+    parser.add_argument(
+        "--output",
+        default="Benchmark_Results.json",
+        help="path of the JSON results (default: %(default)s)",
+    )
+    parsed_arguments = parser.parse_args(arguments)
+    for kind in parsed_arguments.kinds:
+        if kind not in SYNTHETIC_DATASET_KINDS:
+            parser.error(
+                f"unknown kind '{kind}', expected some of {SYNTHETIC_DATASET_KINDS}"
+            )
+    if parsed_arguments.count < 2:
+        parser.error("at least 2 points have to be selected")
+    if parsed_arguments.memory_limit <= 0:
+        parser.error("the memory limit has to be positive")
+    return parsed_arguments
+
+
+def Get_The_Code_Version():
+    # Commit of the code being measured (None outside of a git repository)
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def Measure_The_Import_Time(module_name):
+    # Seconds of importing the module (with everything it imports) in a fresh interpreter,
+    # read from the report of -X importtime (None if the module is not in the report)
+    completed_process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines of the report are "import time: self [us] | cumulative [us] | module name"
+    for report_line in completed_process.stderr.splitlines():
+        report_fields = report_line.split("|")
+        if len(report_fields) == 3 and report_fields[2].strip() == module_name:
+            return int(report_fields[1]) / 1e6
+    return None
+
+
+def Find_The_Deferred_Modules_Imported_At_Startup(module_name):
+    # Libraries of DEFERRED_STARTUP_MODULES imported by the module in a fresh interpreter
+    completed_process = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys, {module_name}\n"
+            f"print(*sorted(set({DEFERRED_STARTUP_MODULES!r}) & set(sys.modules)))",
+        ],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return completed_process.stdout.split()
+
+
+def Describe_The_Environment():
+    # Versions and machine the results belong to
+    return {
+        "code_version": Get_The_Code_Version(),
+        "python_version": platform.python_version(),
+        "numpy_version": numpy.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "number_of_processors": os.cpu_count(),
+        "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def Measure_The_Pipeline(path_to_input_file, path_to_marked_file, path_to_map, options):
+    # Run the stages of the selection one after another and return the seconds of each one
+    stage_seconds = {}
+    # Loading of the unconverted columns of the input file
+    start_time = time.perf_counter()
+    if path_to_input_file.endswith(".xlsx"):
+        input_columns = Read_The_Excel_Columns(path_to_input_file)
+    else:
+        input_columns = Read_The_Csv_Columns(path_to_input_file)
+    _, _, names, latitude_values, longitude_values = input_columns
+    stage_seconds["load"] = time.perf_counter() - start_time
+    # Conversion and validation of the coordinates (as done by the readers of the app)
+    start_time = time.perf_counter()
+    latitudes, longitudes, validation_report = Validate_Coordinate_Columns(
+        latitude_values, longitude_values
+    )
+    if len(validation_report["invalid_indexes"]):
+        raise ValueError(f"Invalid coordinates in {path_to_input_file}.")
+    stage_seconds["validation"] = time.perf_counter() - start_time
+
+    # Seed pair and selection (the end of the seed is reported by the selection itself)
+    def Remember_The_Seed_End(stage, finished_work, total_work):
+        if stage == "seed" and finished_work == total_work:
+            seed_end_times.append(time.perf_counter())
+
+    seed_end_times = []
+    start_time = time.perf_counter()
+    if options["out_of_core"]:
+        # Storing the coordinates into the temporary files is a part of the seed pair stage
+        with tempfile.TemporaryDirectory(prefix="out_of_core.") as store_folder:
+            selected_points_indexes = Find_The_Selection_Order_In_Blocks(
+                latitudes,
+                longitudes,
+                options["count"],
+                store_folder,
+                options["distance_model"],
+                options["furthest_pair_method"],
+                options["selection_mode"],
+                options["memory_limit"],
+                Remember_The_Seed_End,
+            )
+    else:
+        selected_points_indexes = Find_The_Selection_Order(
+            latitudes,
+            longitudes,
+            options["count"],
+            options["distance_model"],
+            options["furthest_pair_method"],
+            progress_callback=Remember_The_Seed_End,
+            selection_mode=options["selection_mode"],
+        )["selected_indexes"]
+    end_time = time.perf_counter()
+    stage_seconds["seed_pair"] = seed_end_times[-1] - start_time
+    stage_seconds["selection"] = end_time - seed_end_times[-1]
+    selected_points_indexes = selected_points_indexes[: options["count"]]
+    # Ordering of the selected points into a route
+    start_time = time.perf_counter()
+    selected_route, _, route_length = Order_The_Selected_Points(
+        latitudes[selected_points_indexes],
+        longitudes[selected_points_indexes],
+        options["distance_model"],
+        options["route_time_budget"],
+    )
+    ordered_points_indexes = [selected_points_indexes[i] for i in selected_route]
+    stage_seconds["ordering"] = time.perf_counter() - start_time
+    # Writing of the marked file
+    start_time = time.perf_counter()
+    if path_to_marked_file.endswith(".xlsx"):
+        Write_The_Marked_Excel_File(
+            path_to_input_file,
+            path_to_marked_file,
+            selected_points_indexes,
+            [names[i] for i in ordered_points_indexes],
+            latitudes[ordered_points_indexes].tolist(),
+            longitudes[ordered_points_indexes].tolist(),
+        )
+    else:
+        Write_The_Marked_Csv_File(
+            path_to_marked_file, names, latitudes, longitudes, ordered_points_indexes
+        )
+    stage_seconds["write"] = time.perf_counter() - start_time
+    # Rendering of the map
+    if options["create_map"]:
+        start_time = time.perf_counter()
+        if Choose_The_Map_Renderer(options["map_renderer"], len(latitudes)) == "canvas":
+            Draw_The_Offline_Map(
+                path_to_map,
+                latitudes,
+                longitudes,
+                latitudes[ordered_points_indexes],
+                longitudes[ordered_points_indexes],
+            )
+        else:
+            Draw_The_Map(
+                path_to_map,
+                latitudes[ordered_points_indexes[0]],
+                longitudes[ordered_points_indexes[0]],
+                latitudes,
+                longitudes,
+                latitudes[ordered_points_indexes].tolist(),
+                longitudes[ordered_points_indexes].tolist(),
+            )
+        stage_seconds["map"] = time.perf_counter() - start_time
+    return stage_seconds, route_length
+
+
+def Run_The_Benchmark(parsed_arguments, data_folder):
+    # Measure every kind and size of the point sets, the given number of times each
+    options = {
+        "count": parsed_arguments.count,
+        "selection_mode": parsed_arguments.selection_mode,
+        "distance_model": parsed_arguments.distance_model,
+        "furthest_pair_method": parsed_arguments.furthest_pair_method,
+        "route_time_budget": parsed_arguments.route_time_budget,
+        "create_map": not parsed_arguments.no_map,
+        "map_renderer": parsed_arguments.map_renderer,
+        "out_of_core": parsed_arguments.out_of_core,
+        "memory_limit": int(parsed_arguments.memory_limit * 1024**2),
+    }
+    dataset_results = []
+    for kind in parsed_arguments.kinds:
+        for n_of_points in parsed_arguments.sizes:
+            file_name = f"Synthetic_{kind}_{n_of_points}"
+            path_to_input_file = os.path.join(
+                data_folder, file_name + parsed_arguments.format
+            )
+            # Generated files are reused (the same kind, size and seed give the same points)
+            generation_seconds = None
+            if not os.path.isfile(path_to_input_file):
+                start_time = time.perf_counter()
+                Write_The_Synthetic_File(
+                    path_to_input_file,
+                    *Generate_Synthetic_Points(kind, n_of_points, parsed_arguments.seed),
+                )
+                generation_seconds = time.perf_counter() - start_time
+            runs = []
+            for _ in range(parsed_arguments.repeats):
+                stage_seconds, route_length = Measure_The_Pipeline(
+                    path_to_input_file,
+                    os.path.join(
+                        data_folder, file_name + "_MARKED" + parsed_arguments.format
+                    ),
+                    os.path.join(data_folder, file_name + "_MAP.html"),
+                    options,
+                )
+                runs.append(stage_seconds)
+                print(
+                    f"{kind:>9} {n_of_points:>8}  "
+                    + "  ".join(
+                        f"{stage} {seconds:7.3f}"
+                        for stage, seconds in stage_seconds.items()
+                    ),
+                    flush=True,
+                )
+            dataset_results.append(
+                {
+                    "kind": kind,
+                    "number_of_points": n_of_points,
+                    "seed": parsed_arguments.seed,
+                    "generation_seconds": generation_seconds,
+                    "route_length": route_length,
+                    "runs": runs,
+                    # The fastest run of each stage is the least disturbed by other processes
+                    "best_seconds": {
+                        stage: min(run[stage] for run in runs)
+                        for stage in BENCHMARK_STAGES
+                        if stage in runs[0]
+                    },
+                }
+            )
+    return dataset_results
+
+
+def main(arguments=None):
+    # Run the benchmark and store the results as JSON
+    parsed_arguments = Parse_The_Arguments(arguments)
+    results = {
+        "environment": Describe_The_Environment(),
+        "options": {
+            key: value for key, value in vars(parsed_arguments).items() if key != "output"
+        },
+    }
+    # Cold start of the app (the fastest of the repeated imports)
+    startup_import_seconds = min(
+        Measure_The_Import_Time(STARTUP_MODULE_NAME)
+        for _ in range(parsed_arguments.repeats)
+    )
+    # The libraries imported later must not be imported at the start (whatever the timing)
+    deferred_startup_imports = Find_The_Deferred_Modules_Imported_At_Startup(
+        STARTUP_MODULE_NAME
+    )
+    results["startup"] = {
+        "module": STARTUP_MODULE_NAME,
+        "import_seconds": startup_import_seconds,
+        "target_seconds": parsed_arguments.startup_target,
+        "deferred_modules_imported": deferred_startup_imports,
+    }
+    print(
+        f"Startup import of {STARTUP_MODULE_NAME}: {startup_import_seconds:.3f} s"
+        f" (target {parsed_arguments.startup_target:.3f} s)",
+        flush=True,
+    )
+    if parsed_arguments.data_folder is not None:
+        os.makedirs(parsed_arguments.data_folder, exist_ok=True)
+        results["datasets"] = Run_The_Benchmark(
+            parsed_arguments, parsed_arguments.data_folder
+        )
+    else:
+        with tempfile.TemporaryDirectory() as data_folder:
+            results["datasets"] = Run_The_Benchmark(parsed_arguments, data_folder)
+    with open(parsed_arguments.output, "w", encoding="utf-8") as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"Results stored in {parsed_arguments.output}")
+    # The benchmark fails if the app imports the deferred libraries or starts too slowly
+    if deferred_startup_imports:
+        print(
+            f"The startup imports {', '.join(deferred_startup_imports)}, which should only"
+            f" be imported after the window appears.",
+            file=sys.stderr,
+        )
+        return 1
+    if startup_import_seconds > parsed_arguments.startup_target:
+        print(
+            f"The startup import is slower than the target of"
+            f" {parsed_arguments.startup_target:.3f} s.",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Uniformly Spaced Points Selector command line (batch) app.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import argparse  # Parsing the command line arguments
+import sys  # Exit code
+import time  # Measuring the total time
+
+from Dependencies.Subroutine_Calculate_Distances import DISTANCE_MODELS
+from Dependencies.Subroutine_Extend_The_Selection import SELECTION_MODES
+from Dependencies.Subroutine_Find_The_Furthest_Pair import FURTHEST_PAIR_METHODS
+from Dependencies.Subroutine_Optimize_The_Route import DEFAULT_ROUTE_TIME_BUDGET
+from Dependencies.Subroutine_Draw_The_Offline_Map import MAP_RENDERERS
+from Dependencies.Subroutine_Find_The_Selection_Order_In_Blocks import (
+    DEFAULT_MEMORY_LIMIT,
+)
+from Dependencies.Subroutine_Select_The_Points_In_Batch import (
+    STATUS_DONE,
+    Find_The_Input_Files,
+    Select_The_Points_In_Batch,
+    Write_The_Batch_Summary,
+)
+
+
+def Parse_The_Arguments(arguments=None):
+    # Define the command line interface
+    parser = argparse.ArgumentParser(
+        description="Select uniformly spaced points of many input files (Excel, CSV, Parquet, GeoJSON)."
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="input files, glob patterns (quoted, ** is recursive) or directories",
+    )
+    parser.add_argument(
+        "-n",
+        "--count",
+        type=int,
+        required=True,
+        help="number of points to select (in every group if the points are grouped)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: number of processors)",
+    )
+    parser.add_argument(
+        "--summary",
+        default="Selection_Summary.json",
+        help="path of the JSON summary (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-map", action="store_true", help="do not create the _MAP.html files"
+    )
+    parser.add_argument(
+        "--map-renderer",
+        choices=MAP_RENDERERS,
+        default="auto",
+        help="canvas is an offline map meant for large point sets, auto uses it for"
+        " files of more than a few thousand points (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--selection-mode",
+        choices=SELECTION_MODES,
+        default="uniform_spacing",
+        help="furthest_point is meant for large counts (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--distance-model", choices=DISTANCE_MODELS, default="ellipsoidal"
+    )
+    parser.add_argument(
+        "--furthest-pair-method", choices=FURTHEST_PAIR_METHODS, default="convex_hull"
+    )
+    parser.add_argument(
+        "--route-time-budget",
+        type=float,
+        default=DEFAULT_ROUTE_TIME_BUDGET,
+        help="seconds spent improving each route (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--use-distance-cache",
+        action="store_true",
+        help="keep the distance matrices of the files in the on-disk cache",
+    )
+    parser.add_argument(
+        "--out-of-core",
+        action="store_true",
+        help="select block by block from temporary files, for point sets larger than"
+        " the memory (the same points as in memory)",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=float,
+        default=DEFAULT_MEMORY_LIMIT / 1024**2,
+        help="MB of memory used by the blocks of each out-of-core selection"
+        " (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--out-of-core-folder",
+        default=None,
+        help="folder of the temporary out-of-core files (default: system temporary folder)",
+    )
+    group_arguments = parser.add_mutually_exclusive_group()
+    group_arguments.add_argument(
+        "--group-column",
+        default=None,
+        help="select the points of every group given by this column (its header name)"
+        " separately, all groups are written into one _MARKED file and one map",
+    )
+    group_arguments.add_argument(
+        "--group-pattern",
+        default=None,
+        help="the same with the groups given by the part of the names matched by this"
+        r" regular expression (its first capture group if it has one), e.g. '^(\w+)-'",
+    )
+    parser.add_argument(
+        "--skip-invalid-points",
+        action="store_true",
+        help="select from the valid points of files with invalid coordinates (all issues"
+        " found are listed in the summary)",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="store the stage timers and counters in a _METRICS.json file next to each"
+        " _MARKED file (and in the summary)",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="add the peak memory of each stage to the metrics (slows the selection down)",
+    )
+    parsed_arguments = parser.parse_args(arguments)
+    if parsed_arguments.count < 2:
+        parser.error("at least 2 points have to be selected")
+    if parsed_arguments.memory_limit <= 0:
+        parser.error("the memory limit has to be positive")
+    if parsed_arguments.out_of_core and parsed_arguments.use_distance_cache:
+        parser.error("the distance cache can not be used with --out-of-core")
+    if (
+        parsed_arguments.distance_model == "approximate"
+        and parsed_arguments.use_distance_cache
+    ):
+        parser.error("the distance cache can not be used with the approximate model")
+    if parsed_arguments.trace_memory and not parsed_arguments.metrics:
+        parser.error("--trace-memory can only be used with --metrics")
+    if (
+        parsed_arguments.group_column is not None
+        or parsed_arguments.group_pattern is not None
+    ) and (
+        parsed_arguments.use_distance_cache
+        or parsed_arguments.out_of_core
+        or parsed_arguments.metrics
+    ):
+        parser.error(
+            "--use-distance-cache, --out-of-core and --metrics can not be used with groups"
+        )
+    return parsed_arguments
+
+
+def main(arguments=None):
+    # Process all given files and write the summary, return the exit code
+    parsed_arguments = Parse_The_Arguments(arguments)
+    start_time = time.perf_counter()
+    # The summary of a previous run is not an input even if it is in a processed folder
+    input_files = Find_The_Input_Files(
+        parsed_arguments.inputs, excluded_paths=[parsed_arguments.summary]
+    )
+    if not input_files:
+        print("No input files were found.", file=sys.stderr)
+        return 2
+    options = {
+        "selection_mode": parsed_arguments.selection_mode,
+        "distance_model": parsed_arguments.distance_model,
+        "furthest_pair_method": parsed_arguments.furthest_pair_method,
+        "route_time_budget": parsed_arguments.route_time_budget,
+        "create_map": not parsed_arguments.no_map,
+        "map_renderer": parsed_arguments.map_renderer,
+        "skip_invalid_points": parsed_arguments.skip_invalid_points,
+    }
+    # Grouped files are selected group by group, the others as a whole
+    if (
+        parsed_arguments.group_column is not None
+        or parsed_arguments.group_pattern is not None
+    ):
+        options.update(
+            group_column=parsed_arguments.group_column,
+            group_pattern=parsed_arguments.group_pattern,
+        )
+    else:
+        options.update(
+            use_distance_cache=parsed_arguments.use_distance_cache,
+            write_metrics_file=parsed_arguments.metrics,
+            trace_memory=parsed_arguments.trace_memory,
+            out_of_core=parsed_arguments.out_of_core,
+            memory_limit=int(parsed_arguments.memory_limit * 1024**2),
+            out_of_core_folder=parsed_arguments.out_of_core_folder,
+        )
+    file_results = Select_The_Points_In_Batch(
+        input_files, parsed_arguments.count, parsed_arguments.workers, options
+    )
+    summary = Write_The_Batch_Summary(
+        parsed_arguments.summary, file_results, time.perf_counter() - start_time
+    )
+    # Short report of each file
+    for file_result in file_results:
+        print(
+            f"{file_result['status']:>8}  {file_result['seconds']:8.2f} s  {file_result['path']}"
+            + (f"  ({file_result['error']})" if "error" in file_result else "")
+        )
+    print(
+        f"{summary['status_counts'][STATUS_DONE]} of {summary['number_of_files']} files done"
+        f" in {summary['total_seconds']:.2f} s, summary stored in {parsed_arguments.summary}"
+    )
+    return 0 if summary["status_counts"][STATUS_DONE] == len(file_results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Uniformly Spaced Points Selector local HTTP/JSON service.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import argparse  # Parsing the command line arguments
+import sys  # Exit code
+
+from Dependencies.Class_Implementing_Selection_Service import (
+    DEFAULT_CACHE_SIZE,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_REQUEST_TIMEOUT,
+    Create_The_Selection_Server,
+    Selection_Service,
+)
+
+
+def Parse_The_Arguments(arguments=None):
+    # Define the command line interface
+    parser = argparse.ArgumentParser(
+        description="Serve the selection of uniformly spaced points over HTTP/JSON"
+        " (POST /select, GET /health)."
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="address to listen on (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--port", type=int, default=8765, help="port to listen on (default: %(default)s)"
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: number of processors)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help="number of cached results, 0 disables the cache (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help="number of requests waiting for a worker before further ones are rejected"
+        " (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        default=DEFAULT_REQUEST_TIMEOUT,
+        help="seconds to wait for a selection (default: %(default)s)",
+    )
+    parsed_arguments = parser.parse_args(arguments)
+    if parsed_arguments.workers is not None and parsed_arguments.workers < 1:
+        parser.error("at least 1 worker is needed")
+    if parsed_arguments.queue_size < 0:
+        parser.error("the queue size can not be negative")
+    return parsed_arguments
+
+
+def main(arguments=None):
+    # Serve the requests until interrupted, return the exit code
+    parsed_arguments = Parse_The_Arguments(arguments)
+    selection_service = Selection_Service(
+        parsed_arguments.workers,
+        parsed_arguments.cache_size,
+        parsed_arguments.queue_size,
+        parsed_arguments.request_timeout,
+    )
+    selection_server = Create_The_Selection_Server(
+        parsed_arguments.host, parsed_arguments.port, selection_service
+    )
+    print(
+        f"Serving on http://{parsed_arguments.host}:{selection_server.server_port}"
+        f" with {selection_service.number_of_workers} workers (Ctrl+C to stop)"
+    )
+    try:
+        selection_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        selection_server.server_close()
+        selection_service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
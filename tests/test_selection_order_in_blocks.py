@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Tests comparing the out-of-core selection with the selection in memory.
+Copyright (C) 2022  Peter Chmurčiak
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see https://www.gnu.org/licenses/.
+"""
+import numpy  # Generating the point sets
+import pytest  # Parametrizing the tests
+
+from Dependencies import Subroutine_Find_The_Selection_Order_In_Blocks
+from Dependencies.Subroutine_Calculate_Distances import DISTANCE_MODELS
+from Dependencies.Subroutine_Extend_The_Selection import SELECTION_MODES
+from Dependencies.Subroutine_Find_The_Furthest_Pair import FURTHEST_PAIR_METHODS
+from Dependencies.Subroutine_Find_The_Selection_Order_In_Blocks import (
+    BYTES_PER_BLOCK_POINT,
+    Find_The_Selection_Order_In_Blocks,
+    Sum_In_Blocks,
+)
+from Dependencies.Subroutine_Select_The_Points import Find_The_Selection_Order
+
+# The blocks are made small (but still larger than the 128 values numpy sums without
+# splitting), so the point sets are split into several blocks with an incomplete last one
+# and the sums by blocks have to reproduce numpy's pairwise summation exactly.
+BLOCK_SIZE = 256
+NUMBER_OF_POINTS = 1500
+NUMBER_OF_SELECTED_POINTS = 20
+
+
+def Generate_The_Points(kind):
+    # Points of one city (projectable area) or of the whole globe (pairs compared by blocks)
+    random_generator = numpy.random.default_rng(0)
+    if kind == "local":
+        return (
+            48.1 + 0.1 * random_generator.random(NUMBER_OF_POINTS),
+            17.1 + 0.1 * random_generator.random(NUMBER_OF_POINTS),
+        )
+    return (
+        numpy.degrees(numpy.arcsin(random_generator.uniform(-1, 1, NUMBER_OF_POINTS))),
+        random_generator.uniform(-180, 180, NUMBER_OF_POINTS),
+    )
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Memory limit giving blocks of BLOCK_SIZE points
+    monkeypatch.setattr(
+        Subroutine_Find_The_Selection_Order_In_Blocks, "MINIMAL_BLOCK_SIZE", BLOCK_SIZE
+    )
+    return BLOCK_SIZE * BYTES_PER_BLOCK_POINT
+
+
+@pytest.mark.parametrize("number_of_values", (1037, 1500, 5000, 12345))
+def test_sums_in_blocks_match_the_pairwise_summation(number_of_values):
+    values = numpy.sin(7 * numpy.random.default_rng(1).random(number_of_values))
+    assert Sum_In_Blocks(
+        lambda start, end: values[start:end], 0, number_of_values, BLOCK_SIZE
+    ) == numpy.sum(values)
+
+
+# The approximate distances fall back to the ellipsoidal ones for the global points
+@pytest.mark.filterwarnings("ignore:The points are too far apart")
+@pytest.mark.parametrize("kind", ("local", "global"))
+@pytest.mark.parametrize("distance_model", DISTANCE_MODELS)
+@pytest.mark.parametrize("selection_mode", SELECTION_MODES)
+@pytest.mark.parametrize("furthest_pair_method", FURTHEST_PAIR_METHODS)
+def test_blocks_select_the_same_points_as_memory(
+    small_blocks, tmp_path, kind, distance_model, selection_mode, furthest_pair_method
+):
+    latitudes, longitudes = Generate_The_Points(kind)
+    selected_in_memory = Find_The_Selection_Order(
+        latitudes,
+        longitudes,
+        NUMBER_OF_SELECTED_POINTS,
+        distance_model,
+        furthest_pair_method,
+        selection_mode=selection_mode,
+    )["selected_indexes"][:NUMBER_OF_SELECTED_POINTS]
+    selected_in_blocks = Find_The_Selection_Order_In_Blocks(
+        latitudes,
+        longitudes,
+        NUMBER_OF_SELECTED_POINTS,
+        str(tmp_path),
+        distance_model,
+        furthest_pair_method,
+        selection_mode,
+        memory_limit=small_blocks,
+    )
+    assert list(selected_in_blocks) == list(selected_in_memory)